@@ -0,0 +1,71 @@
+# Stock holds: reserve throughput and reclaiming expired holds
+#
+#   python benchmarks/bench_holds.py                  # 100k items, 100k holds
+#   python benchmarks/bench_holds.py --items 1000000 --holds 200000
+#
+# Places --holds holds on random items with a fake clock, then moves the clock
+# past half of them and times expire_holds(), for the memory Reservations
+# (heap) and the SQLite holds table. Reclaiming should cost per expired hold,
+# not per item in the store.
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from ims.holds import Reservations
+from ims.sqlite_store import SQLiteItemStore
+from ims.store import ItemStore
+
+
+class _Clock:
+    now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _fill(store, n):
+    for start in range(0, n, 10_000):
+        store.create_many([{"product_name": f"Item {i}", "barcode": f"{6000000000000 + i}",
+                            "product_quantity": 1_000_000} for i in range(start, min(start + 10_000, n))])
+
+
+def _run(name, holds, clock, items, n):
+    rng = random.Random(1)
+    start = time.perf_counter()
+    for i in range(n):
+        holds.reserve(rng.randint(1, items), 1, ttl=60 if i % 2 else 30)
+    reserve = time.perf_counter() - start
+
+    clock.now += 30
+    start = time.perf_counter()
+    expired = holds.expire_holds()
+    reclaim = time.perf_counter() - start
+    print(f"{name:<8}{n / reserve:>14,.0f}{expired / reclaim:>20,.0f}{holds.hold_stats()['active']:>10,}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--holds", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"{args.items:,} items, {args.holds:,} holds, half of them expiring")
+    print(f"{'store':<8}{'reserves/s':>14}{'expired reclaimed/s':>20}{'left':>10}")
+
+    clock = _Clock()
+    store = ItemStore()
+    _fill(store, args.items)
+    _run("memory", Reservations(clock).attach(store), clock, args.items, args.holds)
+
+    clock = _Clock()
+    store = SQLiteItemStore(os.path.join(tempfile.mkdtemp(prefix="ims-holds-"), "ims.sqlite3"), clock=clock)
+    _fill(store, args.items)
+    _run("sqlite", store, clock, args.items, args.holds)
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
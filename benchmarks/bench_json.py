@@ -0,0 +1,68 @@
+# GET /api/items serialization: stdlib vs orjson, with and without the
+# per-item byte cache (see jsonout.py)
+#
+#   python benchmarks/bench_json.py                  # 100k items
+#   python benchmarks/bench_json.py --items 10000 --repeat 20
+#
+# Runs through the Flask test client (no network), reading the whole streamed
+# body. "cold" is the first listing after the cache was emptied, "warm" the
+# ones after it.
+
+import argparse
+import statistics
+import time
+
+from ims import jsonout, server
+from ims.jsonout import ItemJSONCache, JSONProvider
+
+
+def _fill(store, n):
+    for i in range(n):
+        store.create({"product_name": f"Item {i} Crème", "barcode": f"{3000000000000 + i}",
+                      "brand": f"Brand {i % 50}", "product_quantity": i % 100,
+                      "product_quantity_unit": "g"})
+
+
+def _list_ms(client):
+    start = time.perf_counter()
+    resp = client.get("/api/items")
+    body = resp.get_data()
+    elapsed = (time.perf_counter() - start) * 1e3
+    assert resp.status_code == 200 and body.endswith(b"]")
+    return elapsed
+
+
+def _configure(encoder, cached):
+    server.app.json = JSONProvider(server.app, encoder)
+    server._ITEM_JSON = ItemJSONCache(server.app.json.dumps_bytes) if cached else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5, help="listings timed per setup")
+    args = parser.parse_args()
+
+    server._STORE.clear()
+    _fill(server._STORE, args.items)
+    client = server.app.test_client()
+    encoders = ["stdlib"] + (["orjson"] if jsonout.orjson is not None else [])
+    if jsonout.orjson is None:
+        print("orjson not installed, stdlib only")
+
+    print(f"GET /api/items, {args.items:,} items (ms per listing, median of {args.repeat})")
+    for encoder in encoders:
+        _configure(encoder, cached=False)
+        uncached = statistics.median(_list_ms(client) for _ in range(args.repeat))
+        print(f"  {encoder:<7} no cache    {uncached:9.1f}")
+
+        _configure(encoder, cached=True)
+        cold = _list_ms(client)
+        warm = statistics.median(_list_ms(client) for _ in range(args.repeat))
+        print(f"  {encoder:<7} cache cold  {cold:9.1f}")
+        print(f"  {encoder:<7} cache warm  {warm:9.1f}")
+    server._STORE.clear()
+
+
+if __name__ == "__main__":
+    main()
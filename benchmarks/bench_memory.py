@@ -0,0 +1,71 @@
+# Memory per item: dict-per-item ItemStore vs columnar CompactItemStore
+#
+#   python benchmarks/bench_memory.py                 # 1M items
+#   python benchmarks/bench_memory.py --items 200000
+#
+# Items look like lookup results (brand + unit from a small set, reorder
+# level on some). Memory is measured with tracemalloc, so it counts what the
+# store allocates (item dicts, strings, indexes), not interpreter overhead.
+# Also times a full iteration, since the compact store builds dicts on the fly.
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from ims.compact_store import CompactItemStore
+from ims.store import ItemStore
+
+_BRANDS = ["Ferrero", "Goya", "Heinz", "Barilla", "Danone", "Nestle", "Kellogg's", "Carrefour", None]
+_UNITS = ["g", "kg", "ml", "l", "cl", None]
+
+
+def _rows(n):
+    rng = random.Random(0)
+    for i in range(n):
+        row = {
+            "barcode": f"{3000000000000 + i}",
+            "product_name": f"Product {i}",
+            "brand": rng.choice(_BRANDS),
+            "product_quantity": rng.randint(0, 500),
+            "product_quantity_unit": rng.choice(_UNITS),
+        }
+        if i % 4 == 0:
+            row["reorder_level"] = rng.randint(0, 20)
+        yield row
+
+
+def measure(factory, n):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    store = factory()
+    # fresh strings per item, like JSON decoding gives us
+    for row in _rows(n):
+        store.create({k: ((v + ".")[:-1] if isinstance(v, str) else v) for k, v in row.items()})
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    count = sum(1 for _ in store.iter_after(0))
+    walk = time.perf_counter() - start
+    assert count == n
+    return used, walk
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print(f"{args.items:,} items")
+    print(f"{'store':<20}{'MB':>10}{'bytes/item':>12}{'full walk s':>13}")
+    for name, factory in (("ItemStore", ItemStore), ("CompactItemStore", CompactItemStore)):
+        used, walk = measure(factory, args.items)
+        print(f"{name:<20}{used / 2**20:>10.1f}{used / args.items:>12.0f}{walk:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
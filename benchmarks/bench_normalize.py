@@ -0,0 +1,109 @@
+# OpenFoodFacts product normalization: old per-route functions vs normalize.py
+#
+#   python benchmarks/bench_normalize.py
+#   python benchmarks/bench_normalize.py --products 500000 --fixture off-products.jsonl
+#
+# --fixture takes a file of raw OFF products, one JSON object per line (e.g.
+# saved /api/v2/search "products" entries). Without it a synthetic set is
+# generated with the shapes OFF returns: product_quantity as int, string or
+# missing, and "quantity" texts drawn from a few hundred common values.
+
+import argparse
+import json
+import random
+import re
+import time
+
+from ims.normalize import _parse_quantity, normalize_products
+
+_UNITS = ("g", "kg", "ml", "cl", "l", "L", "G", "oz", "")
+
+
+def _synthetic(n):
+    rng = random.Random(0)
+    quantities = [f"{rng.choice((1, 6, 33, 50, 250, 400, 500, 750, 1000))}{rng.choice(('', ' '))}{u}"
+                  for u in _UNITS for _ in range(40)]
+    quantities += ["6 x 33 cl", "1.5 L", "", "approx. 1 kg"]
+    products = []
+    for i in range(n):
+        product = {
+            "code": f"{3000000000000 + i}",
+            "product_name": f" Product {i} ",
+            "brands": rng.choice(("Ferrero", "Ferrero, Nutella", "", "Carrefour,Bio")),
+            "quantity": rng.choice(quantities),
+        }
+        roll = rng.random()
+        if roll < 0.4:
+            product["product_quantity"] = rng.choice((400, 500, 1000))
+        elif roll < 0.6:
+            product["product_quantity"] = str(rng.choice((400, 500, 1000)))
+        products.append(product)
+    return products
+
+
+# the two normalizers as they were in server.py, for comparison
+def _legacy(prod):
+    barcode = prod.get("barcode") or prod.get("_id")
+    name = (prod.get("product_name") or "").strip()
+    brands = (prod.get("brands") or "").strip()
+    brand = brands.split(",")[0].strip() if brands else None
+    qty_raw = prod.get("product_quantity")
+    try:
+        qty = int(qty_raw) if qty_raw is not None and str(qty_raw).strip() != "" else None
+    except (TypeError, ValueError):
+        qty = None
+    unit = None
+    if qty is None:
+        qtext = prod.get("quantity") or ""
+        m = re.match(r"\s*(\d+)\s*([A-Za-z]+)?", qtext)
+        if m:
+            qty = int(m.group(1))
+            unit = (m.group(2) or "").lower() or None
+    else:
+        qtext = prod.get("quantity") or ""
+        m = re.search(r"[A-Za-z]+", qtext)
+        unit = (m.group(0).lower() if m else None) or None
+    return {
+        "barcode": barcode,
+        "product_name": name,
+        "brand": brand,
+        "product_quantity": qty if qty is not None else 0,
+        "product_quantity_unit": unit,
+    }
+
+
+def _time(fn, products, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(products)
+        best = min(best, time.perf_counter() - start)
+    return len(products) / best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=200_000)
+    parser.add_argument("--fixture", help="raw OFF products, one JSON object per line")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.fixture:
+        with open(args.fixture, encoding="utf-8") as f:
+            products = [json.loads(line) for line in f if line.strip()]
+    else:
+        products = _synthetic(args.products)
+
+    legacy = _time(lambda ps: [_legacy(p) for p in ps], products, args.repeat)
+    _parse_quantity.cache_clear()
+    pipeline = _time(lambda ps: list(normalize_products(ps)), products, args.repeat)
+    info = _parse_quantity.cache_info()
+
+    print(f"{len(products):,} products (products/s, best of {args.repeat})")
+    print(f"  legacy per-product functions {legacy:>12,.0f}")
+    print(f"  normalize_products           {pipeline:>12,.0f}  ({pipeline / legacy:.2f}x)")
+    print(f"  quantity memo: {info.hits:,} hits, {info.misses:,} misses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# Write-ahead log throughput and startup (replay) time
+#
+#   python benchmarks/bench_persistence.py                # 1M items
+#   python benchmarks/bench_persistence.py --items 100000 --threads 1,8,32
+#
+# write: creates --items items through the store with the WAL attached, in
+#        sync="batch" mode and in sync="commit" mode with several writer
+#        threads (group commit shares each fsync between waiting writers)
+# startup: replays the same data from the log only, then from a snapshot
+
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from ims.persistence import WriteAheadLog
+from ims.store import ItemStore
+
+
+def _item(n):
+    return {"product_name": f"Item {n}", "barcode": f"BC-{n:08d}", "product_quantity": n % 100}
+
+
+def bench_writes(directory, items, sync, threads):
+    store = ItemStore()
+    wal = WriteAheadLog(directory, sync=sync, snapshot_every=10**12)
+    wal.attach(store)
+
+    per_thread = items // threads
+
+    def worker(offset):
+        for n in range(offset, offset + per_thread):
+            store.create(_item(n))
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(t * per_thread,)) for t in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    wal.close()
+    elapsed = time.perf_counter() - start
+    return per_thread * threads / elapsed
+
+
+def bench_startup(directory):
+    store = ItemStore()
+    start = time.perf_counter()
+    WriteAheadLog(directory).replay(store)
+    return time.perf_counter() - start, len(store)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=1_000_000)
+    parser.add_argument("--commit-items", type=int, default=20_000,
+                        help="items written per sync=commit run (one fsync per batch)")
+    parser.add_argument("--threads", default="1,8,32", help="writer threads for sync=commit")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="ims-wal-bench-")
+    try:
+        print("write throughput (records/s)")
+        log_dir = os.path.join(root, "batch")
+        rate = bench_writes(log_dir, args.items, "batch", 1)
+        print(f"  sync=batch   threads=1   {rate:>12,.0f}")
+        for threads in (int(t) for t in args.threads.split(",")):
+            path = os.path.join(root, f"commit-{threads}")
+            rate = bench_writes(path, args.commit_items, "commit", threads)
+            print(f"  sync=commit  threads={threads:<3} {rate:>12,.0f}")
+
+        print(f"\nstartup with {args.items:,} items")
+        elapsed, n = bench_startup(log_dir)
+        print(f"  log replay only      {elapsed:8.2f}s ({n:,} items)")
+
+        # compact the same data into a snapshot and time again
+        store = ItemStore()
+        wal = WriteAheadLog(log_dir, sync="batch")
+        wal.attach(store)
+        wal.compact()
+        wal.close()
+        elapsed, n = bench_startup(log_dir)
+        print(f"  snapshot             {elapsed:8.2f}s ({n:,} items)")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
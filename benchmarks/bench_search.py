@@ -0,0 +1,90 @@
+# Local item search: SearchIndex (memory backend) vs FTS5 (sqlite backend)
+#
+#   python benchmarks/bench_search.py                 # 1M items
+#   python benchmarks/bench_search.py --items 100000 --queries 2000
+#
+# Items get 2-4 word names from a few thousand words (plus a brand) so common
+# words match many items and rare ones few. Times building the index and
+# query latency for one-word prefixes and two-word queries.
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from ims.search import SearchIndex
+from ims.sqlite_store import SQLiteItemStore
+from ims.store import ItemStore
+
+_SYLLABLES = ("ba", "co", "la", "mi", "nu", "te", "ro", "ch", "pe", "an", "ut", "ol", "sa", "ve", "ke")
+
+
+def _vocabulary(rng, n):
+    words = set()
+    while len(words) < n:
+        words.add("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def _items(rng, n, words, brands):
+    for i in range(n):
+        # skewed word choice: low indexes are common words
+        name = " ".join(words[int(rng.paretovariate(1.2)) % len(words)] for _ in range(rng.randint(2, 4)))
+        yield {"product_name": name.title(), "barcode": f"{3000000000000 + i}",
+               "brand": rng.choice(brands), "product_quantity": 1}
+
+
+def _latencies(search, queries):
+    out = []
+    for q in queries:
+        start = time.perf_counter()
+        search(q, 20)
+        out.append((time.perf_counter() - start) * 1000)
+    out.sort()
+    return statistics.median(out), out[int(len(out) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--skip-sqlite", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    words = _vocabulary(rng, 5000)
+    brands = _vocabulary(rng, 200)
+    prefixes = [rng.choice(words)[:rng.randint(3, 5)] for _ in range(args.queries)]
+    pairs = [f"{rng.choice(words)} {rng.choice(words)[:3]}" for _ in range(args.queries)]
+    barcodes = [f"{3000000000000 + rng.randrange(args.items)}"[:9] for _ in range(args.queries)]
+
+    stores = {"memory": ItemStore()}
+    tmp = tempfile.TemporaryDirectory()
+    if not args.skip_sqlite:
+        stores["sqlite"] = SQLiteItemStore(os.path.join(tmp.name, "bench.sqlite3"))
+
+    print(f"{args.items:,} items, {args.queries:,} queries each (p50 / p99 ms)")
+    for name, store in stores.items():
+        rows = list(_items(random.Random(1), args.items, words, brands))
+        start = time.perf_counter()
+        if name == "memory":
+            # index maintained item by item, as during normal writes
+            search = SearchIndex().attach(store).search
+        else:
+            search = store.search
+        for chunk in range(0, len(rows), 10_000):
+            store.create_many(rows[chunk:chunk + 10_000])
+        build = time.perf_counter() - start
+        print(f"{name}: load + index {build:.1f}s")
+        for label, queries in (("one-word prefix", prefixes), ("two words", pairs), ("barcode prefix", barcodes)):
+            p50, p99 = _latencies(search, queries)
+            print(f"  {label:<18}{p50:>8.2f}{p99:>9.2f}")
+        if name == "sqlite":
+            store.close()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
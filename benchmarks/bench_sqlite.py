@@ -0,0 +1,72 @@
+# In-memory ItemStore vs SQLiteItemStore
+#
+#   python benchmarks/bench_sqlite.py
+#   python benchmarks/bench_sqlite.py --items 200000 --ops 20000 --threads 4
+#
+# Times bulk create, random get/restock/deduct (single thread and with several
+# threads, each using its own pooled connection) and a full cursor walk.
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from ims.sqlite_store import SQLiteItemStore
+from ims.store import ItemStore
+
+
+def _rate(n, fn):
+    start = time.perf_counter()
+    fn()
+    return n / (time.perf_counter() - start)
+
+
+def _threaded(threads, fn, ids):
+    chunks = [ids[i::threads] for i in range(threads)]
+    workers = [threading.Thread(target=lambda c=c: [fn(i) for i in c]) for c in chunks]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+
+def bench(store, items, ops, threads):
+    results = {}
+    results["create"] = _rate(items, lambda: [
+        store.create({"product_name": f"Item {n}", "barcode": f"BC-{n:08d}", "product_quantity": 10})
+        for n in range(items)
+    ])
+    ids = [random.randint(1, items) for _ in range(ops)]
+    results["get"] = _rate(ops, lambda: [store.get(i) for i in ids])
+    results["restock"] = _rate(ops, lambda: [store.restock(i, 1) for i in ids])
+    results["deduct"] = _rate(ops, lambda: [store.deduct(i, 1) for i in ids])
+    results[f"get x{threads} threads"] = _rate(ops, lambda: _threaded(threads, store.get, ids))
+    results[f"restock x{threads} threads"] = _rate(ops, lambda: _threaded(threads, lambda i: store.restock(i, 1), ids))
+    results["list (cursor walk)"] = _rate(items, lambda: sum(1 for _ in store.iter_after(0)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--ops", type=int, default=20_000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+    random.seed(0)
+
+    memory = bench(ItemStore(), args.items, args.ops, args.threads)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteItemStore(os.path.join(tmp, "bench.sqlite3"))
+        sqlite = bench(store, args.items, args.ops, args.threads)
+        store.close()
+
+    print(f"{args.items:,} items, {args.ops:,} ops (ops/s)")
+    print(f"{'op':<24}{'memory':>14}{'sqlite':>14}")
+    for name in memory:
+        print(f"{name:<24}{memory[name]:>14,.0f}{sqlite[name]:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
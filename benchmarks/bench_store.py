@@ -0,0 +1,88 @@
+# Item store latency vs inventory size
+#
+# Preloads the store with N items, then times single-item operations both
+# directly against the store and through the Flask routes. Per-op latency
+# should stay flat from 1k to 1M items.
+#
+#   python benchmarks/bench_store.py
+#   python benchmarks/bench_store.py --sizes 1000,10000 --ops 2000
+
+import argparse
+import random
+import time
+
+from ims import server
+from ims.store import ItemStore
+
+DEFAULT_SIZES = "1000,10000,100000,1000000"
+
+
+def _fill(store, n):
+    for i in range(n):
+        store.create({"product_name": f"Item {i}", "barcode": f"BC-{i:08d}", "product_quantity": 10})
+
+
+def _per_op_us(fn, ids):
+    start = time.perf_counter()
+    for item_id in ids:
+        fn(item_id)
+    return (time.perf_counter() - start) / len(ids) * 1e6
+
+
+def bench_store(n, ops):
+    store = ItemStore()
+    _fill(store, n)
+    ids = [random.randint(1, n) for _ in range(ops)]
+
+    return {
+        "get": _per_op_us(store.get, ids),
+        "update": _per_op_us(lambda i: store.update(i, {"product_quantity": 5}), ids),
+        "restock": _per_op_us(lambda i: store.restock(i, 1), ids),
+        "deduct": _per_op_us(lambda i: store.deduct(i, 1), ids),
+        # distinct ids so every delete actually removes something
+        "delete": _per_op_us(store.delete, random.sample(range(1, n + 1), min(ops, n))),
+    }
+
+
+def bench_routes(n, ops):
+    server._STORE.clear()
+    _fill(server._STORE, n)
+    client = server.app.test_client()
+    ids = [random.randint(1, n) for _ in range(ops)]
+
+    results = {
+        "GET /api/items/<id>": _per_op_us(lambda i: client.get(f"/api/items/{i}"), ids),
+        "PATCH /api/items/<id>": _per_op_us(
+            lambda i: client.patch(f"/api/items/{i}", json={"product_quantity": 5}), ids),
+        "POST .../restock": _per_op_us(
+            lambda i: client.post(f"/api/items/{i}/restock", json={"delta": 1}), ids),
+        "DELETE /api/items/<id>": _per_op_us(
+            lambda i: client.delete(f"/api/items/{i}"), random.sample(range(1, n + 1), min(ops, n))),
+    }
+    server._STORE.clear()
+    return results
+
+
+def _print_table(title, rows, sizes):
+    print(f"\n{title} (us/op)")
+    names = list(rows[sizes[0]])
+    print(f"{'op':<26}" + "".join(f"{n:>12,}" for n in sizes))
+    for name in names:
+        print(f"{name:<26}" + "".join(f"{rows[n][name]:>12.2f}" for n in sizes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma separated inventory sizes")
+    parser.add_argument("--ops", type=int, default=5000, help="operations timed per size")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    random.seed(0)
+
+    _print_table("ItemStore", {n: bench_store(n, args.ops) for n in sizes}, sizes)
+    _print_table("Flask routes", {n: bench_routes(n, args.ops) for n in sizes}, sizes)
+
+
+if __name__ == "__main__":
+    main()
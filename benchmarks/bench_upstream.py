@@ -0,0 +1,94 @@
+# Fresh connection per call vs the pooled UpstreamClient
+#
+#   python benchmarks/bench_upstream.py
+#   python benchmarks/bench_upstream.py --calls 2000 --threads 8 --delay 0.002
+#
+# Runs a local keep-alive HTTP stub that answers like OpenFoodFacts and times
+# module-level requests.get (new TCP connection each call) against
+# UpstreamClient.get (pooled, kept alive). The stub is plain HTTP, so this only
+# shows the TCP setup saved; against the real HTTPS API every call also skips
+# a TLS handshake, which is usually the larger part.
+
+import argparse
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from ims.upstream import UpstreamClient
+
+_BODY = json.dumps({
+    "status": 1,
+    "product": {"product_name": "Nutella", "brands": "Ferrero", "quantity": "400 g"},
+}).encode()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes; without this, Nagle + delayed
+    # ACK stall every kept-alive response by ~40ms
+    disable_nagle_algorithm = True
+    delay = 0.0
+
+    def do_GET(self):
+        if self.delay:
+            time.sleep(self.delay)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(_BODY)))
+        self.end_headers()
+        self.wfile.write(_BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def _run(get, calls, threads):
+    # per-call latencies in ms, and overall calls/s
+    def one(n):
+        start = time.perf_counter()
+        resp = get(f"/api/v2/product/{n}.json")
+        resp.content
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        latencies = sorted(pool.map(one, range(calls)))
+    rate = calls / (time.perf_counter() - start)
+    return latencies, rate
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--delay", type=float, default=0.0, help="stub server think time per request (s)")
+    args = parser.parse_args()
+
+    _Handler.delay = args.delay
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    client = UpstreamClient(base, pool_maxsize=args.threads)
+    runs = {
+        "requests.get (no pool)": lambda path: requests.get(base + path, timeout=5),
+        "UpstreamClient (pooled)": client.get,
+    }
+    print(f"{args.calls:,} calls, {args.threads} threads")
+    print(f"{'client':<26}{'p50 ms':>10}{'p99 ms':>10}{'calls/s':>12}")
+    for name, get in runs.items():
+        latencies, rate = _run(get, args.calls, args.threads)
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+        print(f"{name:<26}{statistics.median(latencies):>10.2f}{p99:>10.2f}{rate:>12,.0f}")
+
+    client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
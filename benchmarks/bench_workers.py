@@ -0,0 +1,126 @@
+# Throughput vs worker processes (python -m ims.wsgi) on read-heavy traffic
+#
+#   python benchmarks/bench_workers.py                       # 1, 2, 4... up to the CPU count
+#   python benchmarks/bench_workers.py --workers 1,2,4,8 --duration 20 --items 100000
+#
+# Preloads a SQLite inventory, then for each worker count starts the launcher
+# on it and drives it from --clients client processes (--threads keep-alive
+# connections each) for --duration seconds: 90% GET /api/items/<id>, 5% list
+# pages, 5% restocks. Prints requests/s and the speedup over one worker.
+# Scaling tops out at the cores left over by the client processes, so on a
+# small box run the clients elsewhere (--url) or expect it to flatten early.
+
+import argparse
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from ims.sqlite_store import SQLiteItemStore
+
+
+def _fill(path, n):
+    store = SQLiteItemStore(path)
+    for start in range(0, n, 10_000):
+        store.create_many([{"product_name": f"Item {i}", "barcode": f"{5000000000000 + i}", "product_quantity": 100}
+                           for i in range(start, min(start + 10_000, n))])
+    store.close()
+
+
+def _client(base, items, threads, duration, out):
+    # one client process: `threads` keep-alive connections, returns requests done
+    done = [0] * threads
+    errors = [0] * threads
+    deadline = time.monotonic() + duration
+
+    def loop(t):
+        session = requests.Session()
+        rng = random.Random(t * 7919 + os.getpid())
+        while time.monotonic() < deadline:
+            roll = rng.random()
+            if roll < 0.90:
+                resp = session.get(f"{base}/api/items/{rng.randint(1, items)}")
+            elif roll < 0.95:
+                resp = session.get(f"{base}/api/items?after={rng.randint(0, max(items - 50, 0))}&limit=50")
+            else:
+                resp = session.post(f"{base}/api/items/{rng.randint(1, items)}/restock", json={"delta": 1})
+            resp.content
+            done[t] += 1
+            errors[t] += resp.status_code >= 400
+
+    pool = [threading.Thread(target=loop, args=(t,)) for t in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    out.put((sum(done), sum(errors)))
+
+
+def _load(base, items, clients, threads, duration):
+    out = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=_client, args=(base, items, threads, duration, out))
+             for _ in range(clients)]
+    start = time.perf_counter()
+    for proc in procs:
+        proc.start()
+    results = [out.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    elapsed = time.perf_counter() - start
+    return sum(r[0] for r in results) / elapsed, sum(r[1] for r in results)
+
+
+def _start(workers, port, db):
+    proc = subprocess.Popen([sys.executable, "-m", "ims.wsgi", "--workers", str(workers), "--port", str(port),
+                             "--store", "sqlite", "--sqlite-path", db], stdout=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            requests.get(base + "/api/health", timeout=1)
+            # give every worker time to import the app
+            time.sleep(1 + workers * 0.2)
+            return proc, base
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    default_workers = sorted({1, 2, 4, cpus} - {n for n in (2, 4) if n > cpus})
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default=",".join(map(str, default_workers)))
+    parser.add_argument("--items", type=int, default=10_000)
+    parser.add_argument("--clients", type=int, default=4, help="client processes")
+    parser.add_argument("--threads", type=int, default=8, help="connections per client process")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--port", type=int, default=5601)
+    args = parser.parse_args()
+
+    db = os.path.join(tempfile.mkdtemp(prefix="ims-workers-"), "ims.sqlite3")
+    _fill(db, args.items)
+    print(f"{args.items:,} items, {args.clients}x{args.threads} connections, {args.duration:.0f}s per run, "
+          f"{cpus} CPU(s)")
+    print(f"{'workers':>8}{'req/s':>10}{'speedup':>10}{'errors':>8}")
+    single = None
+    for workers in (int(w) for w in args.workers.split(",")):
+        proc, base = _start(workers, args.port, db)
+        try:
+            rate, errors = _load(base, args.items, args.clients, args.threads, args.duration)
+        finally:
+            proc.terminate()
+            proc.wait()
+        single = single or rate
+        print(f"{workers:>8}{rate:>10.0f}{rate / single:>9.2f}x{errors:>8}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+# API benchmark + load-test suite with a regression check
+#
+#   python benchmarks/suite.py                                   # 1k -> 1M items
+#   python benchmarks/suite.py --sizes 1000,10000 --out results.json
+#   python benchmarks/suite.py --sizes 1000,10000 --check benchmarks/baseline.json
+#   python benchmarks/suite.py --sizes 1000,10000 --save-baseline benchmarks/baseline.json
+#
+# For every inventory size, preloads the store and measures throughput and
+# p50/p99 latency of create, get, list, restock, deduct, lookup, search
+# (our items) and off_search (OpenFoodFacts search), two ways:
+#   inprocess   Flask test client, one thread: the app's own cost
+#   http        a real WSGI server (werkzeug, threaded) in a child process,
+#               --concurrency client threads with keep-alive sessions
+# OpenFoodFacts is a local stub (--upstream-delay think time per call), and
+# lookups/off_search use a new barcode/name every call so each one goes
+# upstream instead of hitting the cache.
+#
+# Each op gets a short warm-up, then runs --repeat times; the fastest run
+# (lowest p50) is kept, which takes most of the noise out of a shared box.
+#
+# Results are JSON (--out). --check compares them with a stored baseline and
+# exits 1 when an op got slower than the tolerances allow; --save-baseline
+# writes one. Baselines only mean something on the machine that made them,
+# so save and check on the same box (or CI runner type).
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+DEFAULT_SIZES = "1000,10000,100000,1000000"
+OPS = ("create", "get", "list", "restock", "deduct", "lookup", "search", "off_search")
+_WORDS = ("apple", "beans", "cocoa", "dates", "flour", "honey", "lentil", "maple", "olive", "pasta",
+          "quinoa", "rice", "salsa", "tahini", "vanilla", "walnut")
+_BRANDS = ("Acme", "Ferrero", "Heinz", "Barilla", "Kellogg", "Nestle")
+_FILL_BATCH = 10_000
+
+
+# OpenFoodFacts stub
+
+_PRODUCT = json.dumps({
+    "status": 1,
+    "product": {"product_name": "Nutella", "brands": "Ferrero", "quantity": "400 g"},
+}).encode()
+_SEARCH = json.dumps({
+    "products": [{"code": f"301762042200{i}", "product_name": f"Nutella {i}", "brands": "Ferrero"} for i in range(5)],
+}).encode()
+
+
+class _Upstream(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    delay = 0.0
+
+    def do_GET(self):
+        if self.delay:
+            time.sleep(self.delay)
+        body = _SEARCH if self.path.startswith("/api/v2/search") else _PRODUCT
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _start_upstream(delay):
+    _Upstream.delay = delay
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Upstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# store preload (same items in the parent and in the server child)
+
+def _rows(n):
+    rng = random.Random(n)
+    for i in range(n):
+        name = f"{rng.choice(_WORDS).title()} {rng.choice(_WORDS)} {i}"
+        yield {"product_name": name, "barcode": f"{2000000000000 + i}", "brand": rng.choice(_BRANDS),
+               "product_quantity": rng.randint(0, 500)}
+
+
+def _fill(server, n):
+    server._STORE.clear()
+    server._OFF_CACHE.clear()
+    rows = _rows(n)
+    while True:
+        batch = list(itertools.islice(rows, _FILL_BATCH))
+        if not batch:
+            return
+        server._STORE.create_many(batch)
+
+
+# operations: (method, path, json body) for the n-th call
+
+def _requests(op, size, tag):
+    rng = random.Random(f"{op}-{size}")
+    counter = itertools.count()
+
+    def make():
+        n = next(counter)
+        if op == "create":
+            return "POST", "/api/items", {"product_name": f"Bench {n}", "barcode": f"BENCH-{tag}-{size}-{n}"}
+        if op == "get":
+            return "GET", f"/api/items/{rng.randint(1, size)}", None
+        if op == "list":
+            return "GET", f"/api/items?after={rng.randint(0, max(size - 100, 0))}&limit=100", None
+        if op in ("restock", "deduct"):
+            return "POST", f"/api/items/{rng.randint(1, size)}/{op}", {"delta": 1}
+        if op == "lookup":
+            return "GET", f"/api/lookup/{4000000000000 + size * 10 + n}", None
+        if op == "search":
+            return "GET", f"/api/items/search?q={rng.choice(_WORDS)[:3]}", None
+        return "GET", f"/api/search?name=bench{tag}{size}x{n}&limit=5", None
+
+    return make
+
+
+def _summary(latencies, wall, errors):
+    latencies.sort()
+    return {
+        "ops": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / wall, 1),
+        "p50_ms": round(statistics.median(latencies) * 1e3, 4),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e3, 4),
+    }
+
+
+def _run_inprocess(client, make, ops):
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    for _ in range(ops):
+        method, path, body = make()
+        t = time.perf_counter()
+        resp = client.open(path, method=method, json=body)
+        resp.get_data()
+        latencies.append(time.perf_counter() - t)
+        errors += resp.status_code >= 400
+    return _summary(latencies, time.perf_counter() - start, errors)
+
+
+def _run_http(base, make, ops, concurrency):
+    local = threading.local()
+    lock = threading.Lock()
+
+    def one(_):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        with lock:
+            method, path, body = make()
+        t = time.perf_counter()
+        resp = session.request(method, base + path, json=body, timeout=30)
+        resp.content
+        return time.perf_counter() - t, resp.status_code >= 400
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(ops)))
+    wall = time.perf_counter() - start
+    return _summary([r[0] for r in results], wall, sum(r[1] for r in results))
+
+
+# http transport: server child process
+
+def _serve(port, items):
+    # child: preload, then serve until killed
+    from werkzeug.serving import make_server
+
+    from ims import server
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    _fill(server, items)
+    make_server("127.0.0.1", port, server.app, threaded=True).serve_forever()
+
+
+def _free_port():
+    import socket
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_child(items, env):
+    port = _free_port()
+    child = subprocess.Popen([sys.executable, __file__, "--serve", str(port), "--items", str(items)], env=env)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 600
+    while time.monotonic() < deadline:
+        if child.poll() is not None:
+            raise RuntimeError("benchmark server exited")
+        try:
+            requests.get(base + "/api/health", timeout=1)
+            return child, base
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    child.kill()
+    raise RuntimeError("benchmark server did not start")
+
+
+# baseline check
+
+def compare(results, baseline, tolerance, p99_tolerance) -> list:
+    # regressions as readable lines; only ops present in both are compared
+    problems = []
+    for key, base in sorted(baseline["results"].items()):
+        now = results["results"].get(key)
+        if now is None:
+            continue
+        if now["p50_ms"] > base["p50_ms"] * (1 + tolerance):
+            problems.append(f"{key}: p50 {base['p50_ms']:.3f} -> {now['p50_ms']:.3f} ms")
+        if now["p99_ms"] > base["p99_ms"] * (1 + p99_tolerance):
+            problems.append(f"{key}: p99 {base['p99_ms']:.3f} -> {now['p99_ms']:.3f} ms")
+        if now["throughput"] * (1 + tolerance) < base["throughput"]:
+            problems.append(f"{key}: throughput {base['throughput']:.0f} -> {now['throughput']:.0f} ops/s")
+        if now["errors"] > base["errors"]:
+            problems.append(f"{key}: errors {base['errors']} -> {now['errors']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API benchmark suite")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma separated inventory sizes")
+    parser.add_argument("--ops", type=int, default=1000, help="requests per op and size")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per op; the fastest one is kept")
+    parser.add_argument("--only", default=",".join(OPS), help="comma separated ops to run")
+    parser.add_argument("--transports", default="inprocess,http")
+    parser.add_argument("--concurrency", type=int, default=4, help="client threads for the http transport")
+    parser.add_argument("--store", default="memory", choices=["memory", "compact", "sqlite"])
+    parser.add_argument("--upstream-delay", type=float, default=0.002, help="OpenFoodFacts stub think time (s)")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--check", help="baseline JSON to compare with; exit 1 on regressions")
+    parser.add_argument("--save-baseline", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed p50/throughput change (0.5 = 50%%)")
+    parser.add_argument("--p99-tolerance", type=float, default=1.0, help="allowed p99 change")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--items", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return _serve(args.serve, args.items)
+
+    upstream, upstream_url = _start_upstream(args.upstream_delay)
+    workdir = tempfile.mkdtemp(prefix="ims-bench-")
+    # the app reads these at import, in this process and in the server child
+    os.environ.update({
+        "IMS_STORE": args.store,
+        "IMS_SQLITE_PATH": os.path.join(workdir, "parent.sqlite3"),
+        "IMS_OFF_BASE_URL": upstream_url,
+        "IMS_OFF_RETRIES": "0",
+    })
+    child_env = {**os.environ, "IMS_SQLITE_PATH": os.path.join(workdir, "child.sqlite3")}
+    from ims import server
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    ops = [op for op in args.only.split(",") if op]
+    transports = [t for t in args.transports.split(",") if t]
+    results = {
+        "meta": {
+            "python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+            "store": args.store, "ops": args.ops, "repeat": args.repeat, "concurrency": args.concurrency,
+            "upstream_delay": args.upstream_delay, "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": {},
+    }
+
+    print(f"{'transport/size/op':<32}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for size in sizes:
+        for transport in transports:
+            if transport == "inprocess":
+                _fill(server, size)
+                client = server.app.test_client()
+                run = lambda make, n: _run_inprocess(client, make, n)
+                child = None
+            else:
+                child, base = _start_child(size, child_env)
+                run = lambda make, n: _run_http(base, make, n, args.concurrency)
+            try:
+                for op in ops:
+                    key = f"{transport}/{size}/{op}"
+                    make = _requests(op, size, transport)
+                    run(make, max(args.ops // 10, 1))
+                    runs = [run(make, args.ops) for _ in range(args.repeat)]
+                    result = results["results"][key] = min(runs, key=lambda r: r["p50_ms"])
+                    print(f"{key:<32}{result['throughput']:>10.0f}{result['p50_ms']:>10.3f}"
+                          f"{result['p99_ms']:>10.3f}{result['errors']:>8}", flush=True)
+            finally:
+                if child is not None:
+                    child.kill()
+                    child.wait()
+    upstream.shutdown()
+
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+                f.write("\n")
+
+    if args.check:
+        with open(args.check) as f:
+            baseline = json.load(f)
+        problems = compare(results, baseline, args.tolerance, args.p99_tolerance)
+        if problems:
+            print(f"\n{len(problems)} regression(s) vs {args.check}:")
+            for line in problems:
+                print("  " + line)
+            return 1
+        print(f"\nno regressions vs {args.check}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
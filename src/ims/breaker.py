@@ -0,0 +1,122 @@
+# Circuit breaker for upstream calls (OpenFoodFacts, see upstream.py)
+#
+# Tracks the outcome of the last `window` calls. A call counts as failed when
+# it raised, got a 429/5xx, or took longer than `slow_call` seconds (the
+# latency budget). Once at least `min_calls` are recorded and the failure rate
+# reaches `failure_rate`, the breaker opens:
+#
+#   closed     calls go through, outcomes are recorded
+#   open       calls are rejected straight away (CircuitOpenError) for
+#              `open_for` seconds, instead of each one waiting for a timeout
+#   half_open  after that, `probes` trial calls are let through; a success
+#              closes the breaker again, a failure re-opens it
+
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"circuit open, retry in {retry_after:.1f}s")
+        # seconds until the breaker half-opens
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+
+    def __init__(self, failure_rate: float = 0.5, min_calls: int = 10, window: int = 20,
+                 slow_call: float = 2.0, open_for: float = 30.0, probes: int = 1, clock=time.monotonic):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.slow_call = slow_call
+        self.open_for = open_for
+        self.probes = probes
+        self._clock = clock
+        self._lock = threading.Lock()
+        # True for each failed call among the last `window`
+        self._outcomes = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = None
+        self._probing = 0
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == OPEN and self._clock() - self._opened_at >= self.open_for:
+            self._state = HALF_OPEN
+            self._probing = 0
+        return self._state
+
+    def before_call(self):
+        # raises CircuitOpenError if the call must not go out
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and self._probing < self.probes:
+                self._probing += 1
+                return
+            self.rejected += 1
+            if state == OPEN:
+                retry_after = self.open_for - (self._clock() - self._opened_at)
+            else:
+                # waiting on a probe; it'll be decided within one call
+                retry_after = 1.0
+            raise CircuitOpenError(max(retry_after, 0.0))
+
+    def record(self, ok: bool, elapsed: float = 0.0):
+        failed = not ok or elapsed > self.slow_call
+        with self._lock:
+            state = self._current_state()
+            if state == HALF_OPEN:
+                self._probing = max(self._probing - 1, 0)
+                if failed:
+                    self._open()
+                else:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                return
+            if state == OPEN:
+                # a call started before the breaker opened; doesn't change anything
+                return
+            self._outcomes.append(failed)
+            if len(self._outcomes) >= self.min_calls and self._rate() >= self.failure_rate:
+                self._open()
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._outcomes.clear()
+        self.opened += 1
+
+    def _rate(self):
+        return sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0
+
+    def reset(self):
+        with self._lock:
+            self._state = CLOSED
+            self._outcomes.clear()
+            self._probing = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            state = self._current_state()
+            return {
+                "state": state,
+                "failure_rate": self._rate(),
+                "recent_calls": len(self._outcomes),
+                "retry_after": max(self.open_for - (self._clock() - self._opened_at), 0.0) if state == OPEN else 0.0,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,240 @@
+# Bounded TTL + LRU cache
+#
+# Used for OpenFoodFacts lookups (see server.py): values are the normalized
+# product dicts keyed by barcode. None can be cached too, for "product not
+# found" answers (negative caching), usually with a shorter TTL.
+#
+# Entries expire after their TTL; when full, the least recently used entry is
+# evicted. hits/misses/evictions/expirations are counted for /api/cache/stats.
+#
+# With stale_ttl > 0, expired entries are kept that much longer: get() treats
+# them as misses, but get_stale() still returns them, so callers can fall back
+# to old data while the upstream is down.
+#
+# DiskCache is the same idea backed by a SQLite file, so cached OpenFoodFacts
+# answers survive restarts and deploys. Values are stored as JSON with a
+# wall-clock expiry; expired rows are purged by compact(), which also runs
+# every `compact_every` writes (rows still within stale_ttl are kept).
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# returned by get() when the key isn't cached (None is a valid cached value)
+MISS = object()
+
+
+class TTLCache:
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 86_400, negative_ttl: float = 600,
+                 stale_ttl: float = 0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self._clock = clock
+        # key -> (expires_at, value), oldest use first
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        # cached value (possibly None), or MISS
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISS
+            now = self._clock()
+            if entry[0] <= now:
+                if entry[0] + self.stale_ttl <= now:
+                    del self._data[key]
+                    self.expirations += 1
+                self.misses += 1
+                return MISS
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def get_stale(self, key):
+        # like get(), but expired entries still within stale_ttl count too
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] + self.stale_ttl <= self._clock():
+                return MISS
+            self.stale_hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl: float = None):
+        # ttl defaults to negative_ttl for None values, ttl otherwise
+        if ttl is None:
+            ttl = self.negative_ttl if value is None else self.ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (self._clock() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        # drop all entries and reset the counters
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = self.expirations = self.stale_hits = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "negative_ttl": self.negative_ttl,
+                "stale_ttl": self.stale_ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "stale_hits": self.stale_hits,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class DiskCache:
+
+    def __init__(self, path: str, ttl: float = 7 * 86_400, negative_ttl: float = 600,
+                 maxsize: int = 1_000_000, compact_every: int = 10_000, stale_ttl: float = 0, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        # rows kept after a compaction (oldest writes are dropped first)
+        self.maxsize = maxsize
+        self.compact_every = compact_every
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache(expires_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_stored ON cache(stored_at)")
+        self.compact()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def get(self, key, with_ttl: bool = False):
+        # cached value (possibly None), or MISS
+        # with_ttl: (value, seconds it has left) instead, or (MISS, 0)
+        now = self._clock()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return (MISS, 0) if with_ttl else MISS
+            self.hits += 1
+        value = json.loads(row[0])
+        return (value, row[1] - now) if with_ttl else value
+
+    def get_stale(self, key):
+        # like get(), but expired rows still within stale_ttl count too
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, self._clock() - self.stale_ttl)
+            ).fetchone()
+            if row is None:
+                return MISS
+            self.stale_hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl: float = None):
+        if ttl is None:
+            ttl = self.negative_ttl if value is None else self.ttl
+        if ttl <= 0:
+            return
+        now = self._clock()
+        encoded = json.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, stored_at) VALUES (?, ?, ?, ?)",
+                (key, encoded, now + ttl, now),
+            )
+            self._writes += 1
+            due = self.compact_every and self._writes % self.compact_every == 0
+        if due:
+            self.compact()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+            self.hits = self.misses = self.stale_hits = 0
+
+    def compact(self) -> int:
+        # drop expired rows (past stale_ttl) and trim to maxsize; the file is only rewritten
+        # (VACUUM) once a good share of it was freed
+        # returns the number of rows removed
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM cache WHERE expires_at <= ?", (self._clock() - self.stale_ttl,)
+            ).rowcount
+            remaining = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            if remaining > self.maxsize:
+                removed += self._conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY stored_at LIMIT ?)",
+                    (remaining - self.maxsize,),
+                ).rowcount
+                remaining = self.maxsize
+            if removed and removed * 4 >= remaining:
+                self._conn.execute("VACUUM")
+        return removed
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "size": size,
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "negative_ttl": self.negative_ttl,
+                "stale_ttl": self.stale_ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "stale_hits": self.stale_hits,
+            }
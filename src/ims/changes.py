@@ -0,0 +1,82 @@
+# In-process change log (GET /api/changes and /api/changes/stream)
+#
+# Every store write becomes an event {seq, op, id, item, ts}: item is the
+# item after the change (None for delete/clear), seq counts up by one per
+# event. Consumers remember the last seq they saw and ask for what came after
+# it, so they get O(changes) instead of re-reading every item.
+#
+# Events live in a ring buffer (deque with maxlen) so memory stays flat; a
+# consumer that falls further behind than the buffer gets a "gone" answer and
+# has to re-read the items (GET /api/items sends X-Change-Seq, the seq to
+# resume from after that).
+#
+# Recorded as a store listener (like search.py). Waiting readers (long-poll,
+# SSE) sleep on a condition variable that every new event wakes up.
+#
+# The log lives in this process, so seqs start over after a restart (old
+# cursors get "gone"). The SQLite backend keeps the same log in a table
+# filled by triggers instead, with the same methods (sqlite_store.py), so
+# every worker process of wsgi.py hands out the same seqs.
+
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+
+class ChangesGone(Exception):
+    # the requested events were already dropped from the ring buffer
+
+    def __init__(self, oldest: int, latest: int):
+        super().__init__(f"changes before seq {oldest} are gone")
+        self.oldest = oldest
+        self.latest = latest
+
+
+class ChangeLog:
+
+    def __init__(self, maxlen: int = 10_000, clock=time.time):
+        self.maxlen = maxlen
+        self._clock = clock
+        self._events = deque(maxlen=maxlen)
+        self._cond = threading.Condition()
+        self._seq = 0
+
+    def attach(self, store):
+        store.add_listener(self._on_mutation)
+        return self
+
+    def latest_change(self) -> int:
+        # seq of the newest event (0 before the first one)
+        return self._seq
+
+    def _on_mutation(self, op, item_id, item):
+        with self._cond:
+            self._seq += 1
+            self._events.append({"seq": self._seq, "op": op, "id": item_id, "item": item, "ts": self._clock()})
+            self._cond.notify_all()
+
+    def changes_since(self, seq: int, limit: int = 1000) -> list:
+        # up to `limit` events after seq, oldest first; raises ChangesGone if
+        # some of them were already dropped
+        with self._cond:
+            if not self._events or seq >= self._seq:
+                if seq > self._seq:
+                    # a cursor from before a restart
+                    raise ChangesGone(self._seq + 1, self._seq)
+                return []
+            oldest = self._events[0]["seq"]
+            if seq < oldest - 1:
+                raise ChangesGone(oldest, self._seq)
+            start = seq - oldest + 1
+            return list(islice(self._events, start, start + limit))
+
+    def wait_for_change(self, seq: int, timeout: float) -> bool:
+        # block until there is an event after seq (True) or timeout (False)
+        with self._cond:
+            return self._cond.wait_for(lambda: self._seq > seq, timeout)
+
+    def change_stats(self) -> dict:
+        with self._cond:
+            oldest = self._events[0]["seq"] if self._events else self._seq + 1
+            return {"latest": self._seq, "oldest": oldest, "buffered": len(self._events), "maxlen": self.maxlen}
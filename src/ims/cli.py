@@ -1,25 +1,108 @@
+import os
+import sqlite3
+import urllib.parse
+
 import click
 import requests
+from requests.adapters import HTTPAdapter
+
+from ims.cache import MISS, DiskCache
+
+API_ROOT = "http://127.0.0.1:5555/api"
+API_URL = f"{API_ROOT}/items"
+# items fetched per request when listing
+PAGE_SIZE = 200
+# bytes per chunk for streamed import/export
+CHUNK_SIZE = 64 * 1024
+# barcodes per /api/lookup/batch request (the server's default maximum)
+LOOKUP_BATCH = 100
+
+# one keep-alive session for every API call, so paging through the inventory
+# or warming the cache reuses the same connection instead of reconnecting
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
 
-API_URL = "http://127.0.0.1:5555/api/items"
+# listing pages are kept on disk with their ETag and revalidated with
+# If-None-Match, so an unchanged inventory answers 304 instead of being
+# downloaded again
+#   IMS_CLI_CACHE   cache file (default ~/.cache/ims/responses.sqlite3, "off" to disable)
+RESPONSE_CACHE_TTL = 30 * 86_400
+_RESPONSE_CACHE = None
+
+def _response_cache():
+    global _RESPONSE_CACHE
+    if _RESPONSE_CACHE is None:
+        path = os.environ.get("IMS_CLI_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "ims", "responses.sqlite3"))
+        _RESPONSE_CACHE = False
+        if path.strip().lower() not in ("", "off"):
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                _RESPONSE_CACHE = DiskCache(path, ttl=RESPONSE_CACHE_TTL)
+            except (OSError, sqlite3.Error):
+                # no usable cache dir, just don't cache
+                pass
+    return _RESPONSE_CACHE if _RESPONSE_CACHE is not False else None
+
+def _get_json(url, params):
+    # GET a JSON resource, reusing the cached copy when the server says it's
+    # unchanged; returns (body, X-Next-After header or None)
+    cache = _response_cache()
+    key = f"{url}?{urllib.parse.urlencode(sorted(params.items()))}"
+    cached = cache.get(key) if cache is not None else MISS
+    headers = {} if cached is MISS else {"If-None-Match": cached["etag"]}
+    resp = _SESSION.get(url, params=params, headers=headers, timeout=5)
+    if resp.status_code == 304 and cached is not MISS:
+        return cached["body"], cached["next_after"]
+    resp.raise_for_status()
+    body, next_after = resp.json(), resp.headers.get("X-Next-After")
+    if cache is not None and resp.headers.get("ETag"):
+        cache.set(key, {"etag": resp.headers["ETag"], "body": body, "next_after": next_after})
+    return body, next_after
 
 @click.group()
 def cli():
     # Inventory CLI for interacting with the API
     pass
 
+def _iter_items(page_size=PAGE_SIZE):
+    # lazily page through the inventory using the API's keyset cursor,
+    # so only one page is held in memory at a time
+    after = 0
+    while True:
+        items, next_after = _get_json(API_URL, {"after": after, "limit": page_size})
+        yield from items
+        if next_after is None:
+            return
+        after = int(next_after)
+
 # View inventory
 @cli.command("list")
-def list_items():
+@click.option("--page-size", default=PAGE_SIZE, show_default=True, help="Items fetched per request")
+def list_items(page_size):
     # List all inventory items
     try:
-        resp = requests.get(API_URL, timeout=5)
+        found = False
+        for item in _iter_items(page_size):
+            found = True
+            click.echo(f"{item['id']}: {item['product_name']} (qty={item['product_quantity']})")
+        if not found:
+            click.echo("No items found.")
+    except Exception as e:
+        click.echo(f"Error: {e}")
+
+# Items at or below their reorder level
+@cli.command("low-stock")
+@click.option("--limit", default=50, show_default=True, help="Max items to show")
+def low_stock(limit):
+    # List items that need reordering, furthest below their level first
+    try:
+        resp = _SESSION.get(f"{API_URL}/low_stock", params={"limit": limit}, timeout=5)
         resp.raise_for_status()
         items = resp.json()
-        if not items:
-            click.echo("No items found.")
         for item in items:
-            click.echo(f"{item['id']}: {item['product_name']} (qty={item['product_quantity']})")
+            click.echo(f"{item['id']}: {item['product_name']} (qty={item['product_quantity']}, reorder at {item['reorder_level']})")
+        if not items:
+            click.echo("Nothing below its reorder level.")
     except Exception as e:
         click.echo(f"Error: {e}")
 
@@ -28,12 +111,15 @@ def list_items():
 @click.option("--name", prompt=True, help="Product name")
 @click.option("--barcode", prompt=True, help="Barcode")
 @click.option("--quantity", default=1, help="Quantity")
-def add_item(name, barcode, quantity):
+@click.option("--reorder-level", type=int, help="Show up in low-stock at or below this quantity")
+def add_item(name, barcode, quantity, reorder_level):
     # Add a new item manually    
     payload = {"product_name": name, "barcode": barcode, "product_quantity": quantity}
+    if reorder_level is not None:
+        payload["reorder_level"] = reorder_level
 
     try:
-        resp = requests.post(API_URL, json=payload, timeout=5)
+        resp = _SESSION.post(API_URL, json=payload, timeout=5)
         resp.raise_for_status()
         click.echo(f"Added item: {resp.json()}")
     except Exception as e:
@@ -45,7 +131,7 @@ def add_item(name, barcode, quantity):
 def lookup_item(barcode):
     # Fetch item from external API and add it locally
     try:
-        resp = requests.post(f"{API_URL}/from_lookup?barcode={barcode}", timeout=5)
+        resp = _SESSION.post(f"{API_URL}/from_lookup?barcode={barcode}", timeout=5)
         if resp.status_code == 201:
             click.echo(f"Added item: {resp.json()}")
         else:
@@ -64,7 +150,7 @@ def update_item(item_id, quantity):
         payload["product_quantity"] = quantity 
 
     try:
-        resp = requests.patch(f"{API_URL}/{item_id}", json=payload, timeout=5)
+        resp = _SESSION.patch(f"{API_URL}/{item_id}", json=payload, timeout=5)
         if resp.ok:
             click.echo(f"Updated item: {resp.json()}")
         else:
@@ -78,7 +164,7 @@ def update_item(item_id, quantity):
 def delete_item(item_id):
     # Delete an item by id
     try:
-        resp = requests.delete(f"{API_URL}/{item_id}", timeout=5)
+        resp = _SESSION.delete(f"{API_URL}/{item_id}", timeout=5)
         if resp.status_code == 200:
             click.echo("Item deleted.")
         else:
@@ -86,5 +172,98 @@ def delete_item(item_id):
     except Exception as e:
         click.echo(f"Error: {e}")
 
+def _file_format(path, fmt):
+    # explicit --format wins, otherwise go by the file extension
+    if fmt:
+        return fmt
+    return "csv" if path.lower().endswith(".csv") else "ndjson"
+
+# Bulk import from an NDJSON/CSV file
+@cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(["ndjson", "csv"]), help="File format (default: from extension)")
+@click.option("--upsert", is_flag=True, help="Update items whose barcode already exists")
+def import_items(path, fmt, upsert):
+    # Stream a file to the API in chunks (chunked upload, constant memory)
+    fmt = _file_format(path, fmt)
+    content_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    params = {"format": fmt}
+    if upsert:
+        params["upsert"] = "true"
+
+    try:
+        with open(path, "rb") as f, click.progressbar(length=os.path.getsize(path), label="Uploading") as bar:
+            def chunks():
+                while True:
+                    chunk = f.read(CHUNK_SIZE)
+                    if not chunk:
+                        return
+                    bar.update(len(chunk))
+                    yield chunk
+
+            # a generator body makes requests send it with chunked transfer encoding
+            # no read timeout: the server answers only after processing the whole file
+            resp = _SESSION.post(f"{API_URL}/import", params=params, data=chunks(),
+                                 headers={"Content-Type": content_type}, timeout=(5, None))
+        if not resp.ok:
+            click.echo(f"Import failed: {resp.status_code} {resp.text}")
+            return
+        summary = resp.json()
+        click.echo(f"Created {summary['created']}, updated {summary['updated']}, failed {summary['failed']}")
+        for err in summary["errors"]:
+            click.echo(f"  line {err['line']}: {err['error']}")
+    except Exception as e:
+        click.echo(f"Error: {e}")
+
+# Bulk export to an NDJSON/CSV file
+@cli.command("export")
+@click.argument("path", type=click.Path(dir_okay=False, writable=True))
+@click.option("--format", "fmt", type=click.Choice(["ndjson", "csv"]), help="File format (default: from extension)")
+def export_items(path, fmt):
+    # Stream the inventory to a file chunk by chunk
+    fmt = _file_format(path, fmt)
+    try:
+        with _SESSION.get(f"{API_URL}/export", params={"format": fmt}, stream=True, timeout=5) as resp:
+            resp.raise_for_status()
+            total = int(resp.headers.get("X-Item-Count", 0))
+            # progress counted in lines; the csv header is one extra
+            if fmt == "csv":
+                total += 1
+            with open(path, "wb") as f, click.progressbar(length=total, label="Downloading") as bar:
+                for chunk in resp.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    bar.update(chunk.count(b"\n"))
+        click.echo(f"Exported to {path}")
+    except Exception as e:
+        click.echo(f"Error: {e}")
+
+# Pre-fetch OpenFoodFacts data for every barcode in inventory
+@cli.command("warm-cache")
+def warm_cache():
+    # Look up each inventory barcode once so the server's (disk) cache is warm
+    try:
+        # only digit barcodes can be looked up on OpenFoodFacts
+        barcodes = sorted({str(item["barcode"]) for item in _iter_items() if str(item.get("barcode") or "").isdigit()})
+        counts = {"found": 0, "not found": 0, "failed": 0}
+        with click.progressbar(length=len(barcodes), label="Warming cache") as bar:
+            # the server fetches each batch's cache misses concurrently
+            for start in range(0, len(barcodes), LOOKUP_BATCH):
+                chunk = barcodes[start:start + LOOKUP_BATCH]
+                resp = _SESSION.post(f"{API_ROOT}/lookup/batch", json={"barcodes": chunk}, timeout=60)
+                if resp.status_code in (503, 504):
+                    # server or upstream overloaded: skip this batch, keep going
+                    counts["failed"] += len(chunk)
+                    bar.update(len(chunk))
+                    continue
+                resp.raise_for_status()
+                body = resp.json()
+                counts["found"] += body["found"]
+                counts["not found"] += body["not_found"]
+                counts["failed"] += body["failed"]
+                bar.update(len(chunk))
+        click.echo(", ".join(f"{n} {label}" for label, n in counts.items()))
+    except Exception as e:
+        click.echo(f"Error: {e}")
+
 if __name__ == "__main__":
     cli()
\ No newline at end of file
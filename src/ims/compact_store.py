@@ -0,0 +1,208 @@
+# Compact in-memory item store
+#
+# Same API and behaviour as store.ItemStore (selected with IMS_STORE=compact),
+# but items are not kept as one dict each. A dict per item costs a few hundred
+# bytes before counting its strings; here every field is a column indexed by
+# id instead:
+#
+#   product_quantity, reorder_level   int64 arrays (8 bytes per item)
+#   product_name, barcode             lists of str (8 bytes per item + the str)
+#   brand, product_quantity_unit      lists of interned str; lookups repeat a
+#                                     small set of brands/units, so each
+#                                     distinct value is stored once
+#   anything else                     a dict per item, only for items that
+#                                     have such fields
+#
+# Columns tell "field missing" apart from "field is None" (lookups often have
+# no brand or unit), so neither needs the per-item dict.
+#
+# Item dicts are built on demand by get()/iteration, i.e. right before they are
+# serialized, and thrown away after. The id list used for cursor pagination is
+# an int64 array too.
+#
+# Ids index the columns directly, so memory grows with the highest id, not the
+# number of live items; deleted ids leave an empty row behind.
+#
+# Thread safety: a row is several column writes, so readers take the item's
+# stripe lock (ItemStore's writers already hold it) to never see half an
+# update. Returned items are fresh dicts.
+
+import sys
+from array import array
+from bisect import bisect_right
+
+from ims.store import ItemStore, _barcode_key
+
+# int column values for "field missing" and "field is None"; ints that don't
+# fit between those and the int64 maximum go to the per-item dict instead
+_NONE = -(2 ** 63)
+_NULL_INT = _NONE + 1
+_MAX_INT = 2 ** 63 - 1
+# str column value for "field is None" (missing is None in the list)
+_NULL = object()
+_MISSING = object()
+_INT_COLUMNS = ("product_quantity", "reorder_level")
+_STR_COLUMNS = ("product_name", "barcode")
+_INTERNED_COLUMNS = ("brand", "product_quantity_unit")
+_COLUMNS = frozenset(_INT_COLUMNS + _STR_COLUMNS + _INTERNED_COLUMNS)
+
+
+def _id_array(ids=()):
+    return array("q", ids)
+
+
+class _Columns:
+    # the subset of the dict interface ItemStore uses on its _items
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._alive = bytearray()
+        self._ints = {name: array("q") for name in _INT_COLUMNS}
+        self._strs = {name: [] for name in _STR_COLUMNS + _INTERNED_COLUMNS}
+        # item id -> {field: value} for fields that don't fit a column
+        self._other = {}
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, item_id):
+        return 0 < item_id < len(self._alive) and self._alive[item_id] == 1
+
+    def _grow(self, size):
+        missing = size - len(self._alive)
+        if missing <= 0:
+            return
+        self._alive.extend(bytes(missing))
+        for column in self._ints.values():
+            column.extend([_NONE] * missing)
+        for column in self._strs.values():
+            column.extend([None] * missing)
+
+    def get(self, item_id, default=None):
+        if item_id not in self:
+            return default
+        item = {"id": item_id}
+        for name in _STR_COLUMNS:
+            value = self._strs[name][item_id]
+            if value is not None:
+                item[name] = None if value is _NULL else value
+        for name in _INT_COLUMNS:
+            value = self._ints[name][item_id]
+            if value != _NONE:
+                item[name] = None if value == _NULL_INT else value
+        for name in _INTERNED_COLUMNS:
+            value = self._strs[name][item_id]
+            if value is not None:
+                item[name] = None if value is _NULL else value
+        other = self._other.get(item_id)
+        if other:
+            item.update(other)
+        return item
+
+    def __setitem__(self, item_id, item):
+        self._grow(item_id + 1)
+        other = {}
+        for name, column in self._ints.items():
+            value = item.get(name, _MISSING)
+            if type(value) is int and _NULL_INT < value <= _MAX_INT:
+                column[item_id] = value
+            elif value is None:
+                column[item_id] = _NULL_INT
+            else:
+                column[item_id] = _NONE
+                if value is not _MISSING:
+                    other[name] = value
+        for name, column in self._strs.items():
+            value = item.get(name, _MISSING)
+            if type(value) is str:
+                column[item_id] = sys.intern(value) if name in _INTERNED_COLUMNS else value
+            elif value is None:
+                column[item_id] = _NULL
+            else:
+                column[item_id] = None
+                if value is not _MISSING:
+                    other[name] = value
+        for name, value in item.items():
+            if name not in _COLUMNS and name != "id":
+                other[name] = value
+        if other:
+            self._other[item_id] = other
+        else:
+            self._other.pop(item_id, None)
+        # counted once the row is complete
+        if not self._alive[item_id]:
+            self._count += 1
+        self._alive[item_id] = 1
+
+    def quantity(self, item_id) -> int:
+        qty = self._ints["product_quantity"][item_id]
+        if qty != _NONE and qty != _NULL_INT:
+            return qty
+        # missing, or kept as something else than an int
+        return int(self.get(item_id).get("product_quantity", 0) or 0)
+
+    def set_quantity(self, item_id, qty):
+        # in-place update of the quantity column (restock/deduct)
+        other = self._other.get(item_id)
+        if qty > _MAX_INT:
+            self._ints["product_quantity"][item_id] = _NONE
+            self._other.setdefault(item_id, {})["product_quantity"] = qty
+            return
+        self._ints["product_quantity"][item_id] = qty
+        if other and "product_quantity" in other:
+            del other["product_quantity"]
+            if not other:
+                del self._other[item_id]
+
+    def pop(self, item_id, default=None):
+        item = self.get(item_id)
+        if item is None:
+            return default
+        self._alive[item_id] = 0
+        self._count -= 1
+        for column in self._ints.values():
+            column[item_id] = _NONE
+        for column in self._strs.values():
+            column[item_id] = None
+        self._other.pop(item_id, None)
+        return item
+
+
+class CompactItemStore(ItemStore):
+
+    _order_type = staticmethod(_id_array)
+
+    def __init__(self):
+        super().__init__()
+        self._items = _Columns()
+
+    def get(self, item_id: int):
+        with self._stripe(item_id):
+            return self._items.get(item_id)
+
+    def get_by_barcode(self, barcode):
+        item_id = self._by_barcode.get(_barcode_key(barcode))
+        return None if item_id is None else self.get(item_id)
+
+    def iter_after(self, after: int = 0):
+        order = self._order
+        i = bisect_right(order, after)
+        while i < len(order):
+            item = self.get(order[i])
+            i += 1
+            if item is not None:
+                yield item
+
+    def _adjust(self, op, item_id, delta):
+        # only the quantity column changes; no need to rebuild the whole row
+        with self._stripe(item_id):
+            if item_id not in self._items:
+                return None, []
+            new_qty = self._items.quantity(item_id) + delta
+            # clamp at 0 so quantity is never negative
+            self._items.set_quantity(item_id, new_qty if new_qty > 0 else 0)
+            item = self._items.get(item_id)
+            return item, self._notify(op, item_id, item)
@@ -0,0 +1,192 @@
+# Stock reservations (POST /api/items/<id>/reserve, /api/holds/...)
+#
+# A hold sets `quantity` units of an item aside for a while (checkout), so
+#   available = product_quantity - sum of the item's active holds
+# and a new hold is only granted while enough is available. A hold ends by
+#   commit    the units are deducted from the item (one store deduct)
+#   release   the units go back to available
+#   expiry    same as release, once expires_at has passed
+# product_quantity itself only changes on commit, so holds don't touch the
+# item, its ETag or the change feed.
+#
+# Expiry uses a min-heap of (expires_at, hold id): reclaiming the due holds
+# pops them off the top, O(log n) each, without looking at any other hold or
+# item. Holds that were committed/released first leave their heap entry
+# behind; it is skipped when popped. Expiry is lazy: every call reclaims what
+# is due before doing anything else, so reads never count an expired hold.
+#
+# Plain deduct/stock_movements don't know about holds: they may still take
+# stock that is held (a commit then clamps at 0 like any deduct).
+#
+# Kept next to the store as a listener (like lowstock.py) so holds go away
+# with their item. The SQLite backend keeps holds in a table instead, shared
+# by every worker process (sqlite_store.py), with the same methods.
+
+import heapq
+import threading
+import time
+
+
+class InsufficientStockError(ValueError):
+    # raised when a hold asks for more than is available
+
+    def __init__(self, item_id, requested, available):
+        super().__init__(f"item {item_id}: {requested} requested, {available} available")
+        self.item_id = item_id
+        self.requested = requested
+        self.available = available
+
+
+def availability(item, reserved):
+    # {"id", "product_quantity", "reserved", "available"} for one item
+    quantity = int(item.get("product_quantity", 0) or 0)
+    return {"id": item["id"], "product_quantity": quantity, "reserved": reserved,
+            "available": max(quantity - reserved, 0)}
+
+
+class Reservations:
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._lock = threading.Lock()
+        # hold id -> {"id", "item_id", "quantity", "expires_at"}
+        self._holds = {}
+        # item id -> units held / ids of its holds
+        self._reserved = {}
+        self._by_item = {}
+        # (expires_at, hold id), may hold entries of holds already gone
+        self._expiry = []
+        self._next_id = 1
+        self.expired = 0
+        self._store = None
+
+    def __len__(self):
+        # active holds (expired ones not reclaimed yet included)
+        return len(self._holds)
+
+    def attach(self, store):
+        self._store = store
+        store.add_listener(self._on_mutation)
+        return self
+
+    def _on_mutation(self, op, item_id, item):
+        # _lock is taken before store locks (reserve reads the item under it,
+        # and the compact store's reads lock the item's stripe), so it can't
+        # be taken here under delete's stripe lock: drop the holds in the
+        # follow-up, once the store's locks are released. Meanwhile reserve
+        # sees the item is gone. clear() holds no stripe lock and must be done
+        # before ids restart at 1, so it runs right away.
+        if op == "clear":
+            with self._lock:
+                self._holds.clear()
+                self._reserved.clear()
+                self._by_item.clear()
+                self._expiry = []
+        elif op == "delete":
+            return lambda: self._drop_item(item_id)
+
+    def _drop_item(self, item_id):
+        with self._lock:
+            for hold_id in self._by_item.pop(item_id, ()):
+                self._holds.pop(hold_id, None)
+            self._reserved.pop(item_id, None)
+
+    def _drop(self, hold):
+        # caller holds _lock; the hold's units are no longer set aside
+        item_id = hold["item_id"]
+        left = self._reserved.get(item_id, 0) - hold["quantity"]
+        if left > 0:
+            self._reserved[item_id] = left
+        else:
+            self._reserved.pop(item_id, None)
+
+    def _forget(self, hold):
+        # caller holds _lock; remove the hold itself (not its units)
+        del self._holds[hold["id"]]
+        ids = self._by_item.get(hold["item_id"])
+        if ids is not None:
+            ids.discard(hold["id"])
+            if not ids:
+                del self._by_item[hold["item_id"]]
+
+    def _expire(self, now):
+        # caller holds _lock; returns the number of holds reclaimed
+        count = 0
+        while self._expiry and self._expiry[0][0] <= now:
+            _, hold_id = heapq.heappop(self._expiry)
+            hold = self._holds.get(hold_id)
+            if hold is not None:
+                self._forget(hold)
+                self._drop(hold)
+                count += 1
+        self.expired += count
+        return count
+
+    def expire_holds(self) -> int:
+        with self._lock:
+            return self._expire(self._clock())
+
+    def reserve(self, item_id: int, quantity: int, ttl: float):
+        # new hold, or None if there is no such item;
+        # raises InsufficientStockError when not enough is available
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            item = self._store.get(item_id)
+            if item is None:
+                return None
+            available = availability(item, self._reserved.get(item_id, 0))["available"]
+            if quantity > available:
+                raise InsufficientStockError(item_id, quantity, available)
+            hold = {"id": self._next_id, "item_id": item_id, "quantity": quantity, "expires_at": now + ttl}
+            self._next_id += 1
+            self._holds[hold["id"]] = hold
+            self._reserved[item_id] = self._reserved.get(item_id, 0) + quantity
+            self._by_item.setdefault(item_id, set()).add(hold["id"])
+            heapq.heappush(self._expiry, (hold["expires_at"], hold["id"]))
+            return hold
+
+    def get_hold(self, hold_id: int):
+        # None once committed, released or expired
+        with self._lock:
+            self._expire(self._clock())
+            return self._holds.get(hold_id)
+
+    def availability(self, item_id: int):
+        # None if there is no such item
+        with self._lock:
+            self._expire(self._clock())
+            item = self._store.get(item_id)
+            return None if item is None else availability(item, self._reserved.get(item_id, 0))
+
+    def commit_hold(self, hold_id: int):
+        # deduct the held units; returns (hold, item), or None if the hold is
+        # gone (or its item was deleted)
+        with self._lock:
+            self._expire(self._clock())
+            hold = self._holds.get(hold_id)
+            if hold is None:
+                return None
+            # the units stay counted as reserved until the deduct is done, so
+            # nobody else can reserve them in between
+            self._forget(hold)
+        # outside _lock: the deduct notifies listeners, this one included
+        item = self._store.deduct(hold["item_id"], hold["quantity"])
+        with self._lock:
+            self._drop(hold)
+        return None if item is None else (hold, item)
+
+    def release_hold(self, hold_id: int):
+        # returns the released hold, or None if it was already gone
+        with self._lock:
+            self._expire(self._clock())
+            hold = self._holds.get(hold_id)
+            if hold is not None:
+                self._forget(hold)
+                self._drop(hold)
+            return hold
+
+    def hold_stats(self) -> dict:
+        with self._lock:
+            self._expire(self._clock())
+            return {"active": len(self._holds), "reserved": sum(self._reserved.values()), "expired": self.expired}
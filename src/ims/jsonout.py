@@ -0,0 +1,172 @@
+# JSON output: Flask JSON provider + per-item byte cache
+#
+# JSONProvider is Flask's default provider with a faster encoder plugged in:
+# orjson when it's installed (pip install orjson), else the stdlib json module
+# as before. Output is the same JSON either way (sorted keys, compact); orjson
+# just doesn't \u-escape non-ASCII text. Anything orjson can't encode (ints
+# beyond 64 bits, ...) falls back to the stdlib encoder.
+#
+# ItemJSONCache keeps the encoded bytes of each item, so listings are mostly
+# joining bytes the first listing already produced. Entries are dropped by a
+# store listener on every write to the item. A listing may have read an item
+# right before a write to it, so it only fills the cache for items nobody wrote
+# since it started (encoder() remembers a write counter); otherwise a stale
+# copy could land in the cache after the write dropped it.
+#
+# The cache is an LRU of at most maxsize entries (items and write markers
+# alike, so memory stays bounded however many ids get written); deletes drop
+# their entry. Evicting a write marker would let an older listing fill a
+# stale copy again, so it raises the "cleared" floor instead: listings that
+# started before that write don't fill the cache anymore.
+#
+# With several processes on one SQLite database (wsgi.py), writes from the
+# other processes don't reach our listener. Given version= (the store's
+# version()), a listing that finds the version moved drops the whole cache
+# first, so it can only reuse bytes encoded since the last write anywhere.
+
+import json
+import threading
+from collections import OrderedDict
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+class JSONProvider(DefaultJSONProvider):
+
+    def __init__(self, app, encoder: str = "auto"):
+        # encoder: "auto" (orjson if installed), "orjson" or "stdlib"
+        super().__init__(app)
+        if encoder not in ("auto", "orjson", "stdlib"):
+            raise ValueError(f"unknown JSON encoder {encoder!r} (expected auto, orjson or stdlib)")
+        if encoder == "orjson" and orjson is None:
+            raise RuntimeError("orjson is not installed")
+        self.use_orjson = orjson is not None and encoder != "stdlib"
+        if self.use_orjson:
+            # dates go through Flask's default() (HTTP date strings) like with the stdlib
+            self._options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            if self.sort_keys:
+                self._options |= orjson.OPT_SORT_KEYS
+
+    @property
+    def encoder(self) -> str:
+        return "orjson" if self.use_orjson else "stdlib"
+
+    def dumps_bytes(self, obj) -> bytes:
+        # compact UTF-8 JSON
+        if self.use_orjson:
+            try:
+                return orjson.dumps(obj, default=self.default, option=self._options)
+            except TypeError:
+                pass
+        return json.dumps(obj, default=self.default, ensure_ascii=self.ensure_ascii,
+                          sort_keys=self.sort_keys, separators=(",", ":")).encode()
+
+    def dumps(self, obj, **kwargs) -> str:
+        # extra json.dumps options (indent, cls, ...) need the stdlib encoder
+        if self.use_orjson and not kwargs:
+            return self.dumps_bytes(obj).decode()
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        # pretty-printed in debug mode, like Flask does
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b"\n", mimetype=self.mimetype)
+
+
+class ItemJSONCache:
+
+    def __init__(self, dumps, maxsize: int = 100_000, version=None):
+        # dumps: item -> bytes; at most maxsize items are kept
+        self._dumps = dumps
+        self.maxsize = maxsize
+        self._version = version
+        self._seen_version = None
+        self._lock = threading.Lock()
+        # item id -> encoded item, or the write number that dropped it;
+        # least recently used first
+        self._entries = OrderedDict()
+        self._cached = 0
+        self._writes = 0
+        self._cleared_at = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return self._cached
+
+    def attach(self, store):
+        store.add_listener(self._on_mutation)
+        return self
+
+    def _on_mutation(self, op, item_id, item):
+        with self._lock:
+            self._writes += 1
+            if op == "clear":
+                self._drop_all()
+                return
+            if type(self._entries.pop(item_id, None)) is bytes:
+                self._cached -= 1
+            if op != "delete":
+                self._entries[item_id] = self._writes
+                self._evict()
+
+    def _evict(self):
+        # caller holds _lock; drop least recently used entries past maxsize
+        while len(self._entries) > self.maxsize:
+            _, entry = self._entries.popitem(last=False)
+            if type(entry) is bytes:
+                self._cached -= 1
+            elif entry > self._cleared_at:
+                self._cleared_at = entry
+
+    def _drop_all(self):
+        # caller holds _lock; listings started before this won't fill the cache
+        self._entries.clear()
+        self._cached = 0
+        self._cleared_at = self._writes
+
+    def encoder(self):
+        # item -> bytes function for one listing; call it before reading the
+        # items from the store
+        if self._version is not None:
+            version = self._version()
+            if version != self._seen_version:
+                with self._lock:
+                    self._writes += 1
+                    self._drop_all()
+                    self._seen_version = version
+        started = self._writes
+
+        def encode(item):
+            item_id = item.get("id")
+            data = self._entries.get(item_id)
+            if type(data) is bytes:
+                self.hits += 1
+                try:
+                    self._entries.move_to_end(item_id)
+                except KeyError:
+                    # dropped by a write meanwhile
+                    pass
+                return data
+            self.misses += 1
+            data = self._dumps(item)
+            with self._lock:
+                entry = self._entries.get(item_id)
+                if started >= self._cleared_at and (entry is None or (type(entry) is int and entry <= started)):
+                    self._entries[item_id] = data
+                    self._entries.move_to_end(item_id)
+                    self._cached += 1
+                    self._evict()
+            return data
+
+        return encode
+
+    def stats(self) -> dict:
+        return {"size": self._cached, "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
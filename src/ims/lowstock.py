@@ -0,0 +1,103 @@
+# Low-stock index: which items are at or below their reorder level
+#
+# Items with a reorder_level are keyed by shortfall = product_quantity -
+# reorder_level; an item is low on stock when shortfall <= 0. The keys live in
+# a min-heap kept up to date as a store listener (like search.py), so
+# restock/deduct/update only push the item's new key, O(log n).
+#
+# The heap is lazy: old entries for an item are not removed when its key
+# changes, they are skipped when popped (their key no longer matches the
+# item's current one). low_stock(k) pops until it has k live entries below
+# the line and pushes them back, O(k log n) instead of scanning every item.
+# The heap is rebuilt once stale entries outnumber live ones.
+#
+# The SQLite backend answers the same query from a partial expression index
+# (sqlite_store.py).
+
+import heapq
+import threading
+
+
+def shortfall(item):
+    # product_quantity - reorder_level, or None when the item has no reorder level
+    level = item.get("reorder_level")
+    if level is None:
+        return None
+    return int(item.get("product_quantity", 0) or 0) - int(level)
+
+
+class LowStockIndex:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (shortfall, item id), may hold stale entries
+        self._heap = []
+        # item id -> current shortfall
+        self._keys = {}
+        self._store = None
+
+    def __len__(self):
+        # items with a reorder level
+        return len(self._keys)
+
+    def attach(self, store):
+        # index everything already in the store, then follow its changes
+        self._store = store
+        with self._lock:
+            for item in store.iter_after(0):
+                key = shortfall(item)
+                if key is not None:
+                    self._keys[item["id"]] = key
+            self._rebuild()
+        store.add_listener(self._on_mutation)
+        return self
+
+    def _on_mutation(self, op, item_id, item):
+        with self._lock:
+            if op == "clear":
+                self._keys.clear()
+                self._heap = []
+                return
+            key = None if item is None else shortfall(item)
+            if key is None:
+                self._keys.pop(item_id, None)
+            elif self._keys.get(item_id) != key:
+                self._keys[item_id] = key
+                heapq.heappush(self._heap, (key, item_id))
+            if len(self._heap) > 2 * len(self._keys) + 1024:
+                self._rebuild()
+
+    def _rebuild(self):
+        # caller holds _lock
+        self._heap = [(key, item_id) for item_id, key in self._keys.items()]
+        heapq.heapify(self._heap)
+
+    def low_stock_ids(self, limit: int = 50) -> list:
+        # ids of up to `limit` items at or below their reorder level, furthest
+        # below first (ties by id)
+        found = []
+        with self._lock:
+            popped = []
+            while self._heap and len(found) < limit:
+                key, item_id = self._heap[0]
+                if key > 0:
+                    break
+                heapq.heappop(self._heap)
+                # stale entries are dropped for good, and so are duplicates
+                # (an item deducted and restocked back to an earlier key is in
+                # the heap twice; equal entries pop one after the other)
+                if self._keys.get(item_id) != key or (found and found[-1] == item_id):
+                    continue
+                popped.append((key, item_id))
+                found.append(item_id)
+            for entry in popped:
+                heapq.heappush(self._heap, entry)
+        return found
+
+    def low_stock(self, limit: int = 50) -> list:
+        items = []
+        for item_id in self.low_stock_ids(limit):
+            item = self._store.get(item_id)
+            if item is not None:
+                items.append(item)
+        return items
@@ -0,0 +1,154 @@
+# In-process metrics in Prometheus text format (GET /api/metrics)
+#
+# No client library: three metric kinds cover what the API needs.
+#   Counter     monotonic count per label set (store mutations by op, ...)
+#   Histogram   latency buckets + sum + count per label set; Prometheus
+#               derives throughput from the _count series
+#   callback    value(s) read when scraped (store size, cache hits/misses,
+#               breaker state...), so nothing is tracked on the hot path for them
+#
+# Recording is a dict lookup, a bisect and a few adds under one lock per
+# metric; rendering does the cumulative bucket sums.
+
+import math
+import threading
+from bisect import bisect_left
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds; local routes land in the low buckets, OpenFoodFacts calls in the high ones
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra="") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        # label values -> count
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield self.name + _labels(self.labels, label_values), value
+
+
+class Histogram:
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label values -> [count per bucket (+ one past the last), sum]
+        self._series = {}
+
+    def observe(self, value: float, *label_values):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def count(self, *label_values) -> int:
+        series = self._series.get(label_values)
+        return sum(series[0]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            series = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        for label_values, (counts, total) in series:
+            running = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                running += count
+                yield self.name + "_bucket" + _labels(self.labels, label_values, f'le="{_number(bound)}"'), running
+            yield self.name + "_sum" + _labels(self.labels, label_values), total
+            yield self.name + "_count" + _labels(self.labels, label_values), running
+
+
+class _Callback:
+
+    def __init__(self, kind, name, help, fn, labels=()):
+        # fn() returns a number, or {label values tuple: number}
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._fn = fn
+
+    def samples(self):
+        values = self._fn()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for label_values, value in sorted(values.items()):
+            if value is not None:
+                yield self.name + _labels(self.labels, label_values), value
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def gauge_callback(self, name, help, fn, labels=()):
+        self._add(_Callback("gauge", name, help, fn, labels))
+
+    def counter_callback(self, name, help, fn, labels=()):
+        # for totals something else already counts (cache stats, ...)
+        self._add(_Callback("counter", name, help, fn, labels))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample, value in metric.samples():
+                lines.append(f"{sample} {_number(value)}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,78 @@
+# OpenFoodFacts product normalization
+#
+# One pipeline for every OpenFoodFacts payload we handle: single products from
+# /api/v2/product (lookups) and the `products` array of /api/v2/search.
+# normalize_products() takes an iterable of raw product dicts and yields the
+# simplified internal schema, only the fields we need for prefill:
+#
+#   barcode                str   "code" from OFF (or the barcode we asked for)
+#   product_name           str   "" when missing
+#   brand                  str   first of the comma separated "brands", or None
+#   product_quantity       int   numeric "product_quantity", else the leading
+#                                number of the "quantity" text ("400 g"), else 0
+#   product_quantity_unit  str   unit word from the "quantity" text, or None
+#
+# The regexes are compiled once, and parsed "quantity" strings are memoized:
+# OFF reuses a small set of them ("400 g", "1 l", "6 x 33 cl"...), so search
+# pages and bulk lookups mostly hit the memo.
+
+import re
+from functools import lru_cache
+
+# "400 g" --> ("400", "g"); only the first number and the word right after it
+_LEADING_QUANTITY = re.compile(r"\s*(\d+)\s*([A-Za-z]+)?")
+# first word anywhere, e.g. "g" in "400 g", used when the number comes from product_quantity
+_UNIT_WORD = re.compile(r"[A-Za-z]+")
+
+
+@lru_cache(maxsize=4096)
+def _parse_quantity(text: str):
+    # (leading number or None, its unit or None, first unit word or None)
+    qty = unit = None
+    m = _LEADING_QUANTITY.match(text)
+    if m:
+        qty = int(m.group(1))
+        unit = (m.group(2) or "").lower() or None
+    word = _UNIT_WORD.search(text)
+    return qty, unit, word.group(0).lower() if word else None
+
+
+def _int_or_none(value):
+    if value is None or str(value).strip() == "":
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_product(product: dict, barcode=None) -> dict:
+    # normalize one raw OFF product; barcode overrides the product's own "code"
+    if barcode is None:
+        barcode = product.get("code") or product.get("barcode") or product.get("_id")
+    brands = (product.get("brands") or "").strip()
+
+    # preference for the numeric 'product_quantity' value if present; otherwise
+    # take the number from the "quantity" text
+    qty = _int_or_none(product.get("product_quantity"))
+    leading_qty, leading_unit, unit_word = _parse_quantity(product.get("quantity") or "")
+    if qty is None:
+        qty, unit = leading_qty, leading_unit
+    else:
+        unit = unit_word
+
+    return {
+        "barcode": barcode,
+        "product_name": (product.get("product_name") or "").strip(),
+        "brand": brands.split(",")[0].strip() if brands else None,
+        # default = 0
+        "product_quantity": qty if qty is not None else 0,
+        # unit is optional
+        "product_quantity_unit": unit,
+    }
+
+
+def normalize_products(products):
+    # lazily normalize an iterable of raw OFF products
+    for product in products:
+        yield normalize_product(product)
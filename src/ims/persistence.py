@@ -0,0 +1,306 @@
+# Durable persistence for the item store: write-ahead log + snapshots
+#
+# Every store mutation is appended to the current log segment as one JSON line:
+#   {"op": "restock", "id": 3, "item": {...full item after the change...}}
+#   {"op": "delete", "id": 3}
+# Records carry the whole item rather than the delta, so replaying a record
+# twice is harmless. That lets snapshots be "fuzzy": they are written from the
+# live store in a background thread while requests keep mutating it.
+#
+# Files in the data directory:
+#   wal-00000007.log        log segments, replayed in order
+#   snapshot-00000006.jsonl state covering every segment <= 6
+#                           (first line {"next_id": N}, then one item per line)
+#
+# Group commit: appends only go to a buffered file; a single flusher thread
+# fsyncs whatever has accumulated and wakes every writer it covered. With
+# sync="commit" (default) append() returns once the record is on disk; with
+# sync="batch" it returns immediately and the record is fsynced shortly after.
+
+import json
+import os
+import re
+import threading
+import time
+
+_SEGMENT_RE = re.compile(r"^wal-(\d{8})\.log$")
+_SNAPSHOT_RE = re.compile(r"^snapshot-(\d{8})\.jsonl$")
+
+
+def _segment_name(n: int) -> str:
+    return f"wal-{n:08d}.log"
+
+
+def _snapshot_name(n: int) -> str:
+    return f"snapshot-{n:08d}.jsonl"
+
+
+def _fsync_dir(path):
+    # make renames/creates in the directory durable (not supported on Windows)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _read_records(path):
+    # yield JSON records from a log/snapshot file; a torn last line from a
+    # crash mid-write is ignored
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                return
+            try:
+                yield json.loads(line)
+            except ValueError:
+                return
+
+
+class WriteAheadLog:
+
+    def __init__(self, directory, sync="commit", snapshot_every=100_000, commit_interval=0.0):
+        if sync not in ("commit", "batch"):
+            raise ValueError("sync must be 'commit' or 'batch'")
+        self.directory = directory
+        self.sync = sync
+        # start a compaction after this many records since the last snapshot
+        self.snapshot_every = snapshot_every
+        # optional pause before each fsync to gather bigger batches
+        self.commit_interval = commit_interval
+
+        self._store = None
+        self._file = None
+        self._segment = 0
+        self._cond = threading.Condition()
+        # records written to the buffer / known to be fsynced
+        self._written = 0
+        self._synced = 0
+        self._since_snapshot = 0
+        self._snapshot_thread = None
+        self._snapshot_requested = False
+        self._snapshots_done = 0
+        self._flusher = None
+        self._closing = False
+        self._error = None
+
+        os.makedirs(directory, exist_ok=True)
+
+    # startup
+
+    def _scan(self):
+        segments, snapshots = [], []
+        for name in os.listdir(self.directory):
+            m = _SEGMENT_RE.match(name)
+            if m:
+                segments.append(int(m.group(1)))
+                continue
+            m = _SNAPSHOT_RE.match(name)
+            if m:
+                snapshots.append(int(m.group(1)))
+        return sorted(segments), sorted(snapshots)
+
+    def replay(self, store):
+        # load the newest snapshot, then every log segment after it
+        # returns the number of records replayed from the log
+        segments, snapshots = self._scan()
+        covered = 0
+        if snapshots:
+            covered = snapshots[-1]
+            records = _read_records(os.path.join(self.directory, _snapshot_name(covered)))
+            header = next(records, None) or {}
+            store.bump_next_id(int(header.get("next_id", 1)))
+            for item in records:
+                store.restore(item)
+
+        replayed = 0
+        for n in segments:
+            if n <= covered:
+                continue
+            for rec in _read_records(os.path.join(self.directory, _segment_name(n))):
+                op = rec.get("op")
+                if op == "delete":
+                    store.delete(rec["id"])
+                elif op == "clear":
+                    store.clear()
+                else:
+                    store.restore(rec["item"])
+                replayed += 1
+
+        self._segment = max(segments + snapshots + [0])
+        self._since_snapshot = replayed
+        return replayed
+
+    def attach(self, store):
+        # replay persisted state into store, then log every later mutation
+        # (call before the store is used)
+        self.replay(store)
+        self._store = store
+        self._open_segment(self._segment + 1)
+        self._flusher = threading.Thread(target=self._flush_loop, name="ims-wal-flusher", daemon=True)
+        self._flusher.start()
+        store.add_listener(self._on_mutation)
+
+    # writing
+
+    def _open_segment(self, n):
+        self._segment = n
+        self._file = open(os.path.join(self.directory, _segment_name(n)), "ab", buffering=1 << 16)
+        _fsync_dir(self.directory)
+
+    def _on_mutation(self, op, item_id, item):
+        # store listener: runs under the store's locks, so records for one item
+        # land in the log in the order they were applied. The fsync wait is
+        # handed back to the store to run after it releases those locks.
+        rec = {"op": op, "id": item_id}
+        if item is not None:
+            rec["item"] = item
+        seq = self._write(rec)
+        if self.sync == "commit":
+            return lambda: self._wait(seq)
+        return None
+
+    def _write(self, record: dict) -> int:
+        line = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+        with self._cond:
+            if self._error is not None:
+                raise self._error
+            self._file.write(line)
+            self._written += 1
+            self._since_snapshot += 1
+            self._cond.notify_all()
+            return self._written
+
+    def _wait(self, seq: int):
+        # block until record #seq has been fsynced
+        with self._cond:
+            while self._synced < seq and self._error is None:
+                self._cond.wait()
+            if self._error is not None:
+                raise self._error
+
+    def append(self, record: dict):
+        # write one record; with sync="commit" return once it is on disk
+        seq = self._write(record)
+        if self.sync == "commit":
+            self._wait(seq)
+
+    def _flush_loop(self):
+        # the only thread that fsyncs or rotates segments
+        while True:
+            with self._cond:
+                while (self._written == self._synced and not self._closing
+                       and not (self._snapshot_requested and self._snapshot_thread is None)):
+                    self._cond.wait()
+                if self._closing and self._written == self._synced:
+                    return
+                pending = self._written != self._synced
+            if pending and self.commit_interval:
+                time.sleep(self.commit_interval)
+            try:
+                with self._cond:
+                    self._file.flush()
+                    f = self._file
+                    target = self._written
+                os.fsync(f.fileno())
+                with self._cond:
+                    self._synced = target
+                    self._cond.notify_all()
+                    compact = (
+                        (self._snapshot_requested or self._since_snapshot >= self.snapshot_every)
+                        and self._snapshot_thread is None
+                        and not self._closing
+                    )
+                    if compact:
+                        self._snapshot_requested = False
+                        try:
+                            self._start_snapshot()
+                        except Exception as err:
+                            # set before the lock is let go, so no writer gets
+                            # to a half-rotated (closed) segment first
+                            self._error = err
+                            raise
+            except Exception as err:
+                # without this thread nothing gets fsynced again: fail the
+                # writers waiting on it (and every later write) instead of
+                # leaving them blocked
+                with self._cond:
+                    self._error = err
+                    self._cond.notify_all()
+                return
+
+    # compaction
+
+    def _start_snapshot(self):
+        # (flusher thread, lock held) switch to a fresh segment, then write a
+        # snapshot covering everything up to the old one in the background
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        covered = self._segment
+        self._open_segment(covered + 1)
+        self._since_snapshot = 0
+        self._snapshot_thread = threading.Thread(
+            target=self._write_snapshot, args=(covered,), name="ims-wal-snapshot", daemon=True)
+        self._snapshot_thread.start()
+
+    def _write_snapshot(self, covered):
+        try:
+            self.snapshot(covered)
+        finally:
+            with self._cond:
+                self._snapshot_thread = None
+                self._snapshots_done += 1
+                self._cond.notify_all()
+
+    def snapshot(self, covered):
+        # (snapshot thread) write snapshot-<covered> from the live store, then drop the files it
+        # replaces. next_id is read first; replay fixes it up from ids anyway
+        path = os.path.join(self.directory, _snapshot_name(covered))
+        tmp = path + ".tmp"
+        with open(tmp, "wb", buffering=1 << 20) as f:
+            f.write(json.dumps({"next_id": self._store.next_id}).encode() + b"\n")
+            for item in self._store.snapshot_items():
+                f.write(json.dumps(item, separators=(",", ":")).encode() + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        _fsync_dir(self.directory)
+
+        segments, snapshots = self._scan()
+        for n in segments:
+            if n <= covered:
+                os.remove(os.path.join(self.directory, _segment_name(n)))
+        for n in snapshots:
+            if n < covered:
+                os.remove(os.path.join(self.directory, _snapshot_name(n)))
+
+    def compact(self):
+        # force a snapshot now and wait for it (e.g. before a backup)
+        with self._cond:
+            # a snapshot already running started before this call, wait for the next one
+            target = self._snapshots_done + (2 if self._snapshot_thread is not None else 1)
+            self._snapshot_requested = True
+            self._cond.notify_all()
+            while self._snapshots_done < target and self._error is None:
+                self._cond.wait()
+
+    def close(self):
+        # fsync anything pending and stop the background threads
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+        thread = self._snapshot_thread
+        if thread is not None:
+            thread.join()
+        if self._file is not None and not self._file.closed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
@@ -0,0 +1,221 @@
+# In-process full-text index over inventory items
+#
+# Inverted index token -> set of item ids over product_name, brand and barcode,
+# kept up to date as a store listener (like the WAL in persistence.py), so
+# create/update/delete reindex just the item that changed; restock/deduct
+# don't touch indexed fields and are ignored.
+#
+# Tokens are lowercased runs of letters/digits. Every query token also matches
+# as a prefix ("nut" finds "nutella"), found with bisect over a sorted token
+# list. That list is split into blocks of about _BLOCK tokens, so adding or
+# removing a token shifts one block instead of one huge list.
+#
+# search() needs every query token to match (AND). Items are ranked by how
+# well they match, summed over query tokens: exact token 2, prefix only 1;
+# ties go to the lower (older) id.
+#
+# The SQLite backend has its own FTS5 index (sqlite_store.py) with the same
+# search(query, limit) method.
+
+import heapq
+import re
+import threading
+from bisect import bisect_left
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+# tokens per block of the sorted token list
+_BLOCK = 512
+# at most this many distinct tokens are expanded for one prefix, so a
+# one-letter query doesn't union half the index
+_PREFIX_MAX = 200
+_EXACT = 2
+_PREFIX = 1
+
+
+def tokenize(text) -> list:
+    return _TOKEN_RE.findall(str(text).lower()) if text is not None else []
+
+
+def _item_tokens(item) -> frozenset:
+    tokens = set(tokenize(item.get("product_name")))
+    tokens.update(tokenize(item.get("brand")))
+    barcode = item.get("barcode")
+    if barcode is not None:
+        # the whole barcode is a token too, even if it contains separators
+        tokens.update(tokenize(barcode))
+        tokens.add(str(barcode).lower())
+    return frozenset(tokens)
+
+
+class _SortedTokens:
+    # sorted set of strings stored as a list of sorted blocks
+
+    def __init__(self):
+        self._blocks = []
+        # first token of each block, for bisect
+        self._firsts = []
+
+    def clear(self):
+        self._blocks = []
+        self._firsts = []
+
+    def _find(self, token):
+        # index of the block token belongs in
+        i = max(bisect_left(self._firsts, token) - 1, 0)
+        if i + 1 < len(self._firsts) and self._firsts[i + 1] == token:
+            i += 1
+        return i
+
+    def add(self, token):
+        if not self._blocks:
+            self._blocks.append([token])
+            self._firsts.append(token)
+            return
+        i = self._find(token)
+        block = self._blocks[i]
+        j = bisect_left(block, token)
+        if j < len(block) and block[j] == token:
+            return
+        block.insert(j, token)
+        self._firsts[i] = block[0]
+        if len(block) > _BLOCK * 2:
+            half = len(block) // 2
+            self._blocks[i:i + 1] = [block[:half], block[half:]]
+            self._firsts[i:i + 1] = [block[0], block[half]]
+
+    def discard(self, token):
+        if not self._blocks:
+            return
+        i = self._find(token)
+        block = self._blocks[i]
+        j = bisect_left(block, token)
+        if j < len(block) and block[j] == token:
+            del block[j]
+            if block:
+                self._firsts[i] = block[0]
+            else:
+                del self._blocks[i]
+                del self._firsts[i]
+
+    def prefixed(self, prefix, limit):
+        # up to `limit` tokens starting with prefix, in order
+        out = []
+        i = max(bisect_left(self._firsts, prefix) - 1, 0)
+        while i < len(self._blocks) and len(out) < limit:
+            block = self._blocks[i]
+            j = bisect_left(block, prefix)
+            while j < len(block) and len(out) < limit:
+                if not block[j].startswith(prefix):
+                    return out
+                out.append(block[j])
+                j += 1
+            i += 1
+        return out
+
+
+class SearchIndex:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # token -> set of item ids
+        self._postings = {}
+        # item id -> its tokens, to unindex on update/delete
+        self._docs = {}
+        self._tokens = _SortedTokens()
+        self._store = None
+
+    def __len__(self):
+        return len(self._docs)
+
+    def attach(self, store):
+        # index everything already in the store, then follow its changes
+        # (call before serving requests; writes during the initial build are missed)
+        self._store = store
+        for item in store.iter_after(0):
+            self._index(item["id"], item)
+        store.add_listener(self._on_mutation)
+        return self
+
+    def _on_mutation(self, op, item_id, item):
+        if op in ("create", "update"):
+            self._index(item_id, item)
+        elif op == "delete":
+            self._unindex(item_id)
+        elif op == "clear":
+            with self._lock:
+                self._postings.clear()
+                self._docs.clear()
+                self._tokens.clear()
+
+    def _index(self, item_id, item):
+        tokens = _item_tokens(item)
+        with self._lock:
+            old = self._docs.get(item_id, frozenset())
+            if old == tokens:
+                return
+            self._drop(item_id, old - tokens)
+            for token in tokens - old:
+                ids = self._postings.get(token)
+                if ids is None:
+                    self._postings[token] = {item_id}
+                    self._tokens.add(token)
+                else:
+                    ids.add(item_id)
+            self._docs[item_id] = tokens
+
+    def _unindex(self, item_id):
+        with self._lock:
+            self._drop(item_id, self._docs.pop(item_id, frozenset()))
+
+    def _drop(self, item_id, tokens):
+        # caller holds _lock
+        for token in tokens:
+            ids = self._postings.get(token)
+            if ids is None:
+                continue
+            ids.discard(item_id)
+            if not ids:
+                del self._postings[token]
+                self._tokens.discard(token)
+
+    def search_ids(self, query: str, limit: int = 20) -> list:
+        # best matching item ids, best first
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            # per query term: [(posting set, score)] for the exact token + prefixes
+            matches = []
+            for term in terms:
+                hits = [(self._postings[t], _EXACT if t == term else _PREFIX)
+                        for t in self._tokens.prefixed(term, _PREFIX_MAX)]
+                if not hits:
+                    return []
+                matches.append(hits)
+            # drive from the term with the fewest candidates, check the others
+            matches.sort(key=lambda hits: sum(len(ids) for ids, _ in hits))
+            scores = {}
+            for ids, score in matches[0]:
+                for item_id in ids:
+                    if scores.get(item_id, 0) < score:
+                        scores[item_id] = score
+            for hits in matches[1:]:
+                narrowed = {}
+                for item_id, total in scores.items():
+                    best = max((score for ids, score in hits if item_id in ids), default=0)
+                    if best:
+                        narrowed[item_id] = total + best
+                scores = narrowed
+                if not scores:
+                    return []
+        best = heapq.nsmallest(limit, scores.items(), key=lambda kv: (-kv[1], kv[0]))
+        return [item_id for item_id, _ in best]
+
+    def search(self, query: str, limit: int = 20) -> list:
+        # best matching items from the attached store, best first
+        items = []
+        for item_id in self.search_ids(query, limit):
+            item = self._store.get(item_id)
+            if item is not None:
+                items.append(item)
+        return items
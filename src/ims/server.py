@@ -1,19 +1,145 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, has_request_context, jsonify, request
+from werkzeug.http import http_date
 
-# used for OpenFoodFacts HTTP calls
 import re
-import requests
 
 import urllib.parse
 
+import atexit
+import csv
+from concurrent.futures import ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+import io
+import json
+import math
+import os
+import time
+from types import GeneratorType
+
+from ims.breaker import CircuitBreaker, CircuitOpenError
+from ims.cache import MISS, DiskCache, TTLCache
+from ims.changes import ChangeLog, ChangesGone
+from ims.compact_store import CompactItemStore
+from ims.holds import InsufficientStockError, Reservations
+from ims.jsonout import ItemJSONCache, JSONProvider
+from ims.normalize import normalize_product, normalize_products
+from ims.lowstock import LowStockIndex
+from ims import metrics
+from ims.persistence import WriteAheadLog
+from ims.search import SearchIndex
+from ims.sqlite_store import SQLiteItemStore
+# used for OpenFoodFacts HTTP calls
+from ims.upstream import SingleFlight, UpstreamBusy, UpstreamClient
+from ims.versions import ItemVersions
+from ims.store import DuplicateBarcodeError, ItemNotFoundError, ItemStore
+
 app = Flask(__name__)
+# JSON encoding for every response (see jsonout.py)
+#   IMS_JSON             "auto" (default: orjson if installed), "orjson" or "stdlib"
+app.json = JSONProvider(app, os.environ.get("IMS_JSON", "auto").lower())
+
+# item storage, picked by env vars; all item routes go through _STORE
+#   IMS_STORE            "memory" (default, see store.py), "compact" (same, with
+#                        columnar storage for large inventories, see
+#                        compact_store.py) or "sqlite" (see sqlite_store.py)
+#   IMS_SQLITE_PATH      database file for the sqlite backend (default = ims.sqlite3)
+_BACKEND = os.environ.get("IMS_STORE", "memory").lower()
+if _BACKEND == "sqlite":
+    _STORE = SQLiteItemStore(os.environ.get("IMS_SQLITE_PATH", "ims.sqlite3"),
+                             changes_size=int(os.environ.get("IMS_CHANGES_SIZE", "10000")))
+elif _BACKEND == "memory":
+    # in-memory database: id -> item store
+    _STORE = ItemStore()
+elif _BACKEND == "compact":
+    _STORE = CompactItemStore()
+else:
+    raise RuntimeError(f"unknown IMS_STORE {_BACKEND!r} (expected memory, compact or sqlite)")
+
+# optional durable persistence for the in-memory backends (see persistence.py):
+#   IMS_DATA_DIR         directory for the write-ahead log + snapshots (unset = memory only)
+#   IMS_WAL_SYNC         "commit" (default, wait for fsync) or "batch"
+#   IMS_SNAPSHOT_EVERY   log records between snapshots (default = 100000)
+_WAL = None
+if _BACKEND != "sqlite" and os.environ.get("IMS_DATA_DIR"):
+    _WAL = WriteAheadLog(
+        os.environ["IMS_DATA_DIR"],
+        sync=os.environ.get("IMS_WAL_SYNC", "commit"),
+        snapshot_every=int(os.environ.get("IMS_SNAPSHOT_EVERY", "100000")),
+    )
+    # replays snapshot + log into the store before any request is served
+    _WAL.attach(_STORE)
+    atexit.register(_WAL.close)
+
+# full-text search over our own items (see search.py), built from whatever the
+# store holds at startup and kept up to date on every write; the sqlite backend
+# searches its own FTS5 table instead
+_SEARCH = _STORE if _BACKEND == "sqlite" else SearchIndex().attach(_STORE)
+# same idea for the low-stock query (see lowstock.py)
+_LOW_STOCK = _STORE if _BACKEND == "sqlite" else LowStockIndex().attach(_STORE)
+# change versions behind the ETags of item reads (see versions.py)
+_VERSIONS = _STORE if _BACKEND == "sqlite" else ItemVersions().attach(_STORE)
+# recent writes for /api/changes (see changes.py); the sqlite backend logs
+# them in its own table, shared by every worker process
+#   IMS_CHANGES_SIZE     events kept (default = 10000)
+_CHANGES = _STORE if _BACKEND == "sqlite" else ChangeLog(int(os.environ.get("IMS_CHANGES_SIZE", "10000"))).attach(_STORE)
+# stock holds for checkouts (see holds.py); the sqlite backend keeps them in
+# its own table so every worker process sees them
+_HOLDS = _STORE if _BACKEND == "sqlite" else Reservations().attach(_STORE)
 
-# in-memory database
+# encoded items, reused by listings until the item changes (see jsonout.py)
+#   IMS_JSON_CACHE_SIZE  items kept (default = 100000, 0 = off; off by default
+#                        for the compact store, which is about saving memory)
+_ITEM_JSON_MAX = int(os.environ.get("IMS_JSON_CACHE_SIZE", "0" if _BACKEND == "compact" else "100000"))
+_ITEM_JSON = None
+if _ITEM_JSON_MAX > 0:
+    # other worker processes can write to a sqlite store too, see jsonout.py
+    _ITEM_JSON = ItemJSONCache(app.json.dumps_bytes, _ITEM_JSON_MAX,
+                               version=_VERSIONS.version if _BACKEND == "sqlite" else None).attach(_STORE)
 
-# list of item dicts
-_DB = []
-# auto-increment id for new items
-_NEXT_ID = 1
+# request/upstream/store metrics, served by GET /api/metrics (see metrics.py)
+_METRICS = metrics.Registry()
+_HTTP_LATENCY = _METRICS.histogram(
+    "ims_http_request_duration_seconds", "Request latency by route and status", ("method", "route", "status"))
+_HTTP_UPSTREAM_WAIT = _METRICS.histogram(
+    "ims_http_upstream_wait_seconds", "Part of the request latency spent waiting on OpenFoodFacts", ("route",))
+_UPSTREAM_LATENCY = _METRICS.histogram(
+    "ims_upstream_request_duration_seconds", "OpenFoodFacts call latency by HTTP status", ("status",))
+_STORE_MUTATIONS = _METRICS.counter("ims_store_mutations_total", "Store writes by operation", ("op",))
+_STORE.add_listener(lambda op, item_id, item: _STORE_MUTATIONS.inc(op))
+
+# per-request timing state lives in the WSGI environ (one proxy lookup each
+# instead of several through flask.g)
+@app.before_request
+def _start_timer():
+    request.environ["ims.started"] = time.perf_counter()
+
+@app.after_request
+def _observe_request(response):
+    req = request._get_current_object()
+    # by url rule, not path, so /api/items/<int:item_id> is one series;
+    # unknown paths share "unmatched"
+    route = req.url_rule.rule if req.url_rule is not None else "unmatched"
+    labels = (req.method, route, str(response.status_code))
+    started = req.environ["ims.started"]
+    upstream_wait = req.environ.get("ims.upstream_wait")
+
+    def observe():
+        _HTTP_LATENCY.observe(time.perf_counter() - started, *labels)
+        if upstream_wait:
+            _HTTP_UPSTREAM_WAIT.observe(upstream_wait, route)
+
+    if isinstance(response.response, GeneratorType):
+        # our streamed bodies: count the time to send them too
+        response.call_on_close(observe)
+    else:
+        observe()
+    return response
+
+def _upstream_waited(started):
+    # add the time since started to this request's OpenFoodFacts wait
+    if has_request_context():
+        environ = request.environ
+        environ["ims.upstream_wait"] = environ.get("ims.upstream_wait", 0.0) + time.perf_counter() - started
 
 # API health check: GET /api/health
 @app.get("/api/health")
@@ -26,40 +152,227 @@ def health():
 #   product_name      str (required)
 #   barcode           str (required)
 #   product_quantity  int (default = 0)
+#   reorder_level     int >= 0 (optional); at or below it the item shows up
+#                     in /api/items/low_stock
+
+# conditional GET: ETag/Last-Modified for a version from _VERSIONS, read before
+# the data it describes; returns (headers, 304 response or None). Only
+# If-None-Match is answered, Last-Modified has one second resolution
+def _validators(version, modified):
+    tag = f"{_VERSIONS.epoch}-{version}"
+    headers = {"ETag": f'W/"{tag}"', "Last-Modified": http_date(modified), "Cache-Control": "no-cache"}
+    if request.if_none_match.contains_weak(tag):
+        return headers, Response(status=304, headers=headers)
+    return headers, None
+
+# query flag helper, e.g. ?upsert=true
+def _flag(name: str) -> bool:
+    return (request.args.get(name) or "").strip().lower() in ("1", "true", "yes")
+
+# 409 response when a barcode is already taken by another item
+def _duplicate_barcode(err: DuplicateBarcodeError):
+    return jsonify({"error": "barcode already exists", "id": err.item_id}), 409
+
+# list items
+# Query params (all optional):
+#   after     int  keyset cursor, only items with id > after (default = 0)
+#   limit     int  page size (1-1000); when set, the response carries an
+#                  X-Next-After header with the cursor for the next page
+#   format    str  "json" (default) or "ndjson" (one item per line)
+#
+# X-Change-Seq carries the /api/changes cursor to follow changes from there.
+# Without limit every item is returned; either way the body is streamed item
+# by item instead of being built in memory first. The ETag changes with every
+# write to the store; send it back in If-None-Match to get a 304 while nothing
+# changed
+
+_PAGE_MAX = 1000
+
+def _parse_int_arg(name: str, default: int):
+    raw = request.args.get(name)
+    if raw is None or raw.strip() == "":
+        return default, None
+    try:
+        return int(raw), None
+    except (TypeError, ValueError):
+        return None, (jsonify({"error": f"{name} must be an integer"}), 400)
+
+# item -> JSON bytes for one listing; get it before reading the items
+def _item_encoder():
+    return app.json.dumps_bytes if _ITEM_JSON is None else _ITEM_JSON.encoder()
+
+# items per chunk of a streamed body
+_STREAM_CHUNK = 256
+
+def _stream_chunks(items, encode, sep):
+    chunk = []
+    for item in items:
+        chunk.append(encode(item))
+        if len(chunk) == _STREAM_CHUNK:
+            yield sep.join(chunk)
+            chunk = []
+    if chunk:
+        yield sep.join(chunk)
+
+def _stream_json_array(items, encode):
+    yield b"["
+    first = True
+    for chunk in _stream_chunks(items, encode, b","):
+        yield chunk if first else b"," + chunk
+        first = False
+    yield b"]"
+
+def _stream_ndjson(items, encode):
+    for chunk in _stream_chunks(items, encode, b"\n"):
+        yield chunk + b"\n"
 
-# return all items
 @app.get("/api/items")
 def list_items():
-    return jsonify(_DB), 200
+    after, err = _parse_int_arg("after", 0)
+    if err:
+        return err
+    limit, err = _parse_int_arg("limit", None)
+    if err:
+        return err
+
+    fmt = (request.args.get("format") or "json").lower()
+    if fmt not in ("json", "ndjson"):
+        return jsonify({"error": "format must be json or ndjson"}), 400
+
+    headers, not_modified = _validators(*_VERSIONS.version())
+    if not_modified:
+        return not_modified
+    headers["X-Change-Seq"] = str(_CHANGES.latest_change())
+    encode = _item_encoder()
+    if limit is None:
+        items = _STORE.iter_after(after)
+    else:
+        # clamp like /api/search does
+        limit = min(max(limit, 1), _PAGE_MAX)
+        items, next_after = _STORE.page(after, limit)
+        if next_after is not None:
+            headers["X-Next-After"] = str(next_after)
+
+    if fmt == "ndjson":
+        return Response(_stream_ndjson(items, encode), 200, headers, mimetype="application/x-ndjson")
+    return Response(_stream_json_array(items, encode), 200, headers, mimetype="application/json")
+
+# search our own items: GET /api/items/search?q=<text>&limit=<n>
+# Matches product_name, brand and barcode; every word of q has to match, as a
+# prefix ("nut fer" finds "Nutella" by "Ferrero"). Best matches first.
+#   q       str  (required)
+#   limit   int  (optional, default = 20, max 100)
+
+_SEARCH_MAX = 100
+
+@app.get("/api/items/search")
+def search_items():
+    q = (request.args.get("q") or "").strip()
+    if not q:
+        return jsonify({"error": "q is required"}), 400
+    limit, err = _parse_int_arg("limit", 20)
+    if err:
+        return err
+    return jsonify(_SEARCH.search(q, min(max(limit, 1), _SEARCH_MAX))), 200
+
+# items at or below their reorder level: GET /api/items/low_stock?limit=<n>
+# Furthest below first; answered from an index kept up to date on every
+# write, so it costs O(limit log n) rather than a scan of the inventory.
+#   limit   int  (optional, default = 50, max 1000)
+@app.get("/api/items/low_stock")
+def low_stock_items():
+    limit, err = _parse_int_arg("limit", 50)
+    if err:
+        return err
+    return jsonify(_LOW_STOCK.low_stock(min(max(limit, 1), _PAGE_MAX))), 200
 
 # create a new item
-@app.post("/api/items")
-def create_item():
-    global _NEXT_ID
-    data = request.get_json(silent=True) or {}
+# barcodes are unique: a duplicate returns 409 unless ?upsert=true, in which
+# case the existing item is updated instead (200)
+def _check_new_item(data):
+    # validate a new item payload (shared by create_item and the bulk import)
+    # returns (fields, None) or (None, error message)
+    if not isinstance(data, dict):
+        return None, "item must be an object"
 
     # validation for the call, product_name and barcode required
     if "product_name" not in data or "barcode" not in data:
-        return jsonify({"error": "product_name and barcode are required"}), 400
+        return None, "product_name and barcode are required"
 
-    item = {
-        "id": _NEXT_ID,
+    # Coerce numeric inputs; default to 0 if missing/blank
+    try:
+        quantity = int(data.get("product_quantity", 0) or 0)
+    except (TypeError, ValueError):
+        return None, "product_quantity must be an integer"
+
+    fields = {
         "product_name": data.get("product_name"),
         "barcode": data.get("barcode"),
-        # Coerce numeric inputs; default to 0 if missing/blank
-        "product_quantity": int(data.get("product_quantity", 0) or 0),
+        "product_quantity": quantity,
     }
+    if data.get("reorder_level") not in (None, ""):
+        level, message = _check_reorder_level(data["reorder_level"])
+        if message:
+            return None, message
+        fields["reorder_level"] = level
+    return fields, None
+
+def _check_reorder_level(value):
+    # returns (int, None) or (None, error message); CSV imports send strings
+    try:
+        level = int(value)
+    except (TypeError, ValueError):
+        return None, "reorder_level must be an integer"
+    if level < 0:
+        return None, "reorder_level must be >= 0"
+    return level, None
+
+# fields an upsert must not write over an existing item: the stock count is
+# only replaced when the client actually sent one (a missing or blank
+# product_quantity still means 0 for a new item)
+_STOCK = ("product_quantity",)
+
+def _upsert_keep(data):
+    return () if data.get("product_quantity") not in (None, "") else _STOCK
+
+@app.post("/api/items")
+def create_item():
+    data = request.get_json(silent=True) or {}
+
+    fields, message = _check_new_item(data)
+    if message:
+        return jsonify({"error": message}), 400
+
+    if _flag("upsert"):
+        item, created = _STORE.upsert(fields, keep=_upsert_keep(data))
+        return jsonify(item), 201 if created else 200
 
-    _NEXT_ID += 1
-    _DB.append(item)
+    try:
+        item = _STORE.create(fields)
+    except DuplicateBarcodeError as err:
+        return _duplicate_barcode(err)
     return jsonify(item), 201
 
-# fetch an item by id
+# fetch an item by id (ETag = the item's version, 304 on If-None-Match)
 @app.get("/api/items/<int:item_id>")
 def get_item(item_id: int):
-    for it in _DB:
-        if it["id"] == item_id:
-            return jsonify(it), 200
+    version = _VERSIONS.item_version(item_id)
+    if version is not None:
+        headers, not_modified = _validators(*version)
+        if not_modified:
+            return not_modified
+        item = _STORE.get(item_id)
+        if item is not None:
+            return jsonify(item), 200, headers
+    # returns 404 if not found
+    return jsonify({"error": "Not found"}), 404
+
+# fetch an item by barcode (O(1) via the store's barcode index)
+@app.get("/api/items/by_barcode/<barcode>")
+def get_item_by_barcode(barcode: str):
+    item = _STORE.get_by_barcode(barcode)
+    if item is not None:
+        return jsonify(item), 200
     # returns 404 if not found
     return jsonify({"error": "Not found"}), 404
 
@@ -68,31 +381,38 @@ def get_item(item_id: int):
 def update_item(item_id: int):
     payload = request.get_json(silent=True) or {}
 
-    for item in _DB:
-        if item["id"] == item_id:
-            # only allow updates to known fields
-            for key in ("product_name", "barcode", "product_quantity"):
-                if key in payload:
-                    # Normalize numeric types for consistency
-                    if key == "product_quantity":
-                        item[key] = int(payload[key])
-                    else:
-                        item[key] = payload[key]
-            return jsonify(item), 200
+    # only allow updates to known fields
+    fields = {}
+    for key in ("product_name", "barcode", "product_quantity"):
+        if key in payload:
+            # Normalize numeric types for consistency
+            if key == "product_quantity":
+                fields[key] = int(payload[key])
+            else:
+                fields[key] = payload[key]
+    if "reorder_level" in payload:
+        # null clears it
+        fields["reorder_level"] = None
+        if payload["reorder_level"] is not None:
+            fields["reorder_level"], message = _check_reorder_level(payload["reorder_level"])
+            if message:
+                return jsonify({"error": message}), 400
+
+    try:
+        item = _STORE.update(item_id, fields)
+    except DuplicateBarcodeError as err:
+        # changing the barcode to one another item already has
+        return _duplicate_barcode(err)
+    if item is not None:
+        return jsonify(item), 200
 
-    
     # returns 404 if not found
     return jsonify({"error": "Not found"}), 404
 
 # delete item by id
 @app.delete("/api/items/<int:item_id>")
 def delete_item(item_id: int):
-    global _DB
-    before = len(_DB)
-    
-    _DB = [x for x in _DB if x["id"] != item_id]
-
-    if len(_DB) < before:
+    if _STORE.delete(item_id):
         # return {deleted: <id>} if successful
         return jsonify({"deleted": item_id}), 200
     
@@ -105,24 +425,34 @@ def delete_item(item_id: int):
 # delta           int (required, must be >= 0)
 # deduct          int (never goes below 0 / clamp behavior)
 
-def _parse_delta(payload):
-    
-    # validation that the 'delta' field is present and return the delta_int otherwise return error response or none
-    
+def _check_delta(payload):
+
+    # validation that the 'delta' field is present and return the delta_int otherwise return an error message
+    # (shared by the single-item routes and the batch stock_movements route)
+
     if payload is None:
-        return None, (jsonify({"error": "JSON body required"}), 400)
+        return None, "JSON body required"
     if "delta" not in payload:
-        return None, (jsonify({"error": "delta is required"}), 400)
-    
+        return None, "delta is required"
+
     # Must be an integer (e.g., 5, "5" --> 5; but "abc" --> error)
     try:
         delta = int(payload["delta"])
     except (TypeError, ValueError):
-        return None, (jsonify({"error": "delta must be an integer"}), 400)
-    
+        return None, "delta must be an integer"
+
     # Must be non-negative
     if delta < 0:
-        return None, (jsonify({"error": "delta must be non-negative"}), 400)
+        return None, "delta must be non-negative"
+    return delta, None
+
+def _parse_delta(payload):
+
+    # same as _check_delta but returns the 400 error response or none
+
+    delta, message = _check_delta(payload)
+    if message:
+        return None, (jsonify({"error": message}), 400)
     return delta, None
 
 # restock route
@@ -134,11 +464,10 @@ def restock(item_id: int):
     if err:
         return err
 
-    for item in _DB:
-        if item["id"] == item_id:
-            item["product_quantity"] = int(item.get("product_quantity", 0)) + delta
-            return jsonify(item), 200
-    
+    item = _STORE.restock(item_id, delta)
+    if item is not None:
+        return jsonify(item), 200
+
     # returns 404 if not found
     return jsonify({"error": "Not found"}), 404
 
@@ -151,63 +480,559 @@ def deduct(item_id: int):
     if err:
         return err
 
-    for item in _DB:
-        if item["id"] == item_id:
-            new_qty = int(item.get("product_quantity", 0)) - delta
-            # clamp at 0 so quantity is never negative
-            item["product_quantity"] = new_qty if new_qty > 0 else 0
-            return jsonify(item), 200
+    # store clamps at 0 so quantity is never negative
+    item = _STORE.deduct(item_id, delta)
+    if item is not None:
+        return jsonify(item), 200
 
     # returns 404 if not found
     return jsonify({"error": "Not found"}), 404
 
+# batch stock movements: POST /api/items/stock_movements
+# Body: a JSON array, or {"movements": [...], "atomic": bool}
+#   [{"id": 1, "op": "restock", "delta": 5}, {"id": 2, "op": "deduct", "delta": 1}, ...]
+# Every line is validated first (same delta rules as /restock and /deduct);
+# any invalid line --> 400 and nothing is applied. Then all lines are applied
+# in one pass and per-line results are returned.
+# atomic (?atomic=true or "atomic": true): if any id doesn't exist --> 404 and
+# nothing is applied; otherwise missing ids just get a per-line 404.
+
+_MOVEMENTS_MAX = 50_000
+
+def _check_movement(line):
+    # returns ((op, id, delta), None) or (None, error message)
+    if not isinstance(line, dict):
+        return None, "movement must be an object"
+    op = line.get("op")
+    if op not in ("restock", "deduct"):
+        return None, "op must be restock or deduct"
+    item_id = line.get("id")
+    if not isinstance(item_id, int) or isinstance(item_id, bool):
+        return None, "id must be an integer"
+    delta, message = _check_delta(line)
+    if message:
+        return None, message
+    return (op, item_id, delta), None
+
+@app.post("/api/items/stock_movements")
+def stock_movements():
+    payload = request.get_json(silent=True)
+    atomic = _flag("atomic")
+    if isinstance(payload, dict):
+        atomic = atomic or bool(payload.get("atomic"))
+        payload = payload.get("movements")
+    if not isinstance(payload, list):
+        return jsonify({"error": "movements array required"}), 400
+    if len(payload) > _MOVEMENTS_MAX:
+        return jsonify({"error": f"at most {_MOVEMENTS_MAX} movements per request"}), 400
+
+    movements, errors = [], []
+    for index, line in enumerate(payload):
+        movement, message = _check_movement(line)
+        if message:
+            errors.append({"index": index, "error": message})
+        else:
+            movements.append(movement)
+    if errors:
+        return jsonify({"error": "invalid movements", "errors": errors}), 400
+
+    try:
+        items = _STORE.apply_movements(movements, atomic=atomic)
+    except ItemNotFoundError as err:
+        return jsonify({"error": "Not found", "missing": err.item_ids}), 404
+
+    results = []
+    failed = 0
+    for index, ((op, item_id, delta), item) in enumerate(zip(movements, items)):
+        if item is None:
+            failed += 1
+            results.append({"index": index, "id": item_id, "status": 404, "error": "Not found"})
+        else:
+            results.append({"index": index, "id": item_id, "status": 200, "item": item})
+    return jsonify({"applied": len(results) - failed, "failed": failed, "results": results}), 200
+
+# stock holds for checkout: set units aside now, deduct them at payment
+# POST /api/items/<id>/reserve   body {"quantity": <int>=1+, "ttl": <seconds>}
+#   ttl     float  how long the hold lasts (default = IMS_HOLD_TTL or 900,
+#                  max 1 day); uncommitted holds are released after that
+#   -> 201 {"hold": {"id", "item_id", "quantity", "expires_at"}, "available"}
+#   404 unknown item, 409 (with "available") when not enough is available
+# GET  /api/items/<id>/availability  -> {"id", "product_quantity", "reserved", "available"}
+# GET  /api/holds/<hold_id>          -> the hold
+# POST /api/holds/<hold_id>/commit   deducts the held units -> {"hold", "item"}
+# POST /api/holds/<hold_id>/release  gives them back -> {"released": <hold_id>}
+# A hold that was committed, released or has expired is 404.
+# available = product_quantity - active holds; product_quantity itself only
+# changes on commit.
+
+_HOLD_TTL = float(os.environ.get("IMS_HOLD_TTL", "900"))
+_HOLD_TTL_MAX = 24 * 3600
+
+def _check_hold(payload):
+    # returns ((quantity, ttl), None) or (None, error message)
+    if not isinstance(payload, dict):
+        return None, "JSON body required"
+    try:
+        quantity = int(payload.get("quantity", 1))
+    except (TypeError, ValueError):
+        return None, "quantity must be an integer"
+    if quantity < 1:
+        return None, "quantity must be at least 1"
+    try:
+        ttl = _HOLD_TTL if payload.get("ttl") is None else float(payload["ttl"])
+    except (TypeError, ValueError):
+        return None, "ttl must be a number"
+    if not 0 < ttl <= _HOLD_TTL_MAX:
+        return None, f"ttl must be between 0 and {_HOLD_TTL_MAX} seconds"
+    return (quantity, ttl), None
+
+@app.post("/api/items/<int:item_id>/reserve")
+def reserve_item(item_id: int):
+    request_hold, message = _check_hold(request.get_json(silent=True))
+    if message:
+        return jsonify({"error": message}), 400
+    quantity, ttl = request_hold
+    try:
+        hold = _HOLDS.reserve(item_id, quantity, ttl)
+    except InsufficientStockError as err:
+        return jsonify({"error": "not enough stock available", "available": err.available}), 409
+    if hold is None:
+        return jsonify({"error": "Not found"}), 404
+    stock = _HOLDS.availability(item_id)
+    return jsonify({"hold": hold, "available": stock["available"] if stock else 0}), 201
+
+@app.get("/api/items/<int:item_id>/availability")
+def item_availability(item_id: int):
+    stock = _HOLDS.availability(item_id)
+    if stock is None:
+        return jsonify({"error": "Not found"}), 404
+    return jsonify(stock), 200
+
+@app.get("/api/holds/<int:hold_id>")
+def get_hold(hold_id: int):
+    hold = _HOLDS.get_hold(hold_id)
+    if hold is None:
+        return jsonify({"error": "Not found"}), 404
+    return jsonify(hold), 200
+
+@app.post("/api/holds/<int:hold_id>/commit")
+def commit_hold(hold_id: int):
+    result = _HOLDS.commit_hold(hold_id)
+    if result is None:
+        return jsonify({"error": "Not found"}), 404
+    hold, item = result
+    return jsonify({"hold": hold, "item": item}), 200
+
+@app.post("/api/holds/<int:hold_id>/release")
+def release_hold(hold_id: int):
+    if _HOLDS.release_hold(hold_id) is None:
+        return jsonify({"error": "Not found"}), 404
+    return jsonify({"released": hold_id}), 200
+
+# bulk import/export: POST /api/items/import, GET /api/items/export
+# Formats (?format=, or the request Content-Type for import):
+#   ndjson   one JSON item per line (default)
+#   csv      header row + one item per row, columns as in _CSV_FIELDS
+# Both directions stream: import parses the request body line by line and
+# creates items in batches, export yields items from a generator, so neither
+# ever holds the whole file in memory.
+# Import applies the same validation as POST /api/items (plus the optional
+# lookup fields brand / product_quantity_unit); ids in the file are ignored and
+# new ones assigned. Duplicate barcodes are per-line errors unless ?upsert=true.
+
+_CSV_FIELDS = ("id", "product_name", "barcode", "product_quantity", "reorder_level", "brand", "product_quantity_unit")
+# optional item fields carried over on import when present and non-empty
+_IMPORT_OPTIONAL = ("brand", "product_quantity_unit")
+_IMPORT_BATCH = 1000
+# only the first few bad lines are reported, so the summary stays small
+_IMPORT_MAX_ERRORS = 100
+
+def _bulk_format(default="ndjson"):
+    fmt = (request.args.get("format") or "").lower()
+    if not fmt:
+        mimetype = request.mimetype or ""
+        fmt = "csv" if mimetype in ("text/csv", "application/csv") else default
+    return fmt if fmt in ("ndjson", "csv") else None
+
+def _iter_import_rows(stream, fmt):
+    # yield (line number, parsed row or None, error message or None)
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for line_num, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_num, json.loads(line), None
+        except ValueError:
+            yield line_num, None, "invalid JSON"
+
+@app.post("/api/items/import")
+def import_items():
+    fmt = _bulk_format()
+    if fmt is None:
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+    upsert = _flag("upsert")
+
+    summary = {"created": 0, "updated": 0, "failed": 0, "errors": []}
+
+    def fail(line_num, message):
+        summary["failed"] += 1
+        if len(summary["errors"]) < _IMPORT_MAX_ERRORS:
+            summary["errors"].append({"line": line_num, "error": message})
+
+    def flush(batch):
+        results = _STORE.create_many([fields for _, fields, _ in batch], upsert=upsert,
+                                     keep=[keep for _, _, keep in batch])
+        for (line_num, _, _), result in zip(batch, results):
+            if isinstance(result, DuplicateBarcodeError):
+                fail(line_num, f"barcode already exists (id {result.item_id})")
+            else:
+                summary["created" if result[1] else "updated"] += 1
+
+    batch = []
+    try:
+        for line_num, row, message in _iter_import_rows(request.stream, fmt):
+            if message is None:
+                fields, message = _check_new_item(row)
+            if message:
+                fail(line_num, message)
+                continue
+            for key in _IMPORT_OPTIONAL:
+                if row.get(key) not in (None, ""):
+                    fields[key] = row[key]
+            batch.append((line_num, fields, _upsert_keep(row)))
+            if len(batch) == _IMPORT_BATCH:
+                flush(batch)
+                batch = []
+    except UnicodeDecodeError:
+        fail(None, "file is not valid UTF-8")
+    if batch:
+        flush(batch)
+
+    return jsonify(summary), 200
+
+def _export_csv(items):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=_CSV_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    for item in items:
+        writer.writerow(item)
+        # hand each row over as soon as it's written
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    yield buf.getvalue()
+
+@app.get("/api/items/export")
+def export_items():
+    fmt = _bulk_format()
+    if fmt is None:
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+
+    headers = {
+        "Content-Disposition": f"attachment; filename=items.{fmt}",
+        # lets clients show progress; items changing mid-export can make it approximate
+        "X-Item-Count": str(len(_STORE)),
+    }
+    encode = _item_encoder()
+    items = _STORE.iter_after(0)
+    if fmt == "csv":
+        return Response(_export_csv(items), 200, headers, mimetype="text/csv")
+    return Response(_stream_ndjson(items, encode), 200, headers, mimetype="application/x-ndjson")
+
+# change feed: what changed since a cursor, instead of re-reading every item
+# GET /api/changes?since=<seq>&wait=<seconds>&limit=<n>
+#   since   int    seq of the last change seen; without it the answer only
+#                  carries the current cursor (next)
+#   wait    float  long-poll: hold the request up to this many seconds
+#                  (default = 0, max 60) until there is a change
+#   limit   int    max events (1-1000, default = 1000)
+# -> {"events": [{"seq", "op", "id", "item", "ts"}, ...], "next": <since for the next call>}
+# 410 when changes after since were already dropped: re-read /api/items and
+# continue from its X-Change-Seq header
+
+_CHANGES_WAIT_MAX = 60
+_CHANGES_LIMIT = 1000
+
+def _changes_gone(err: ChangesGone):
+    return jsonify({"error": "changes since that seq are gone, re-read the items",
+                    "oldest": err.oldest, "latest": err.latest}), 410
+
+@app.get("/api/changes")
+def list_changes():
+    since, err = _parse_int_arg("since", None)
+    if err:
+        return err
+    limit, err = _parse_int_arg("limit", _CHANGES_LIMIT)
+    if err:
+        return err
+    limit = min(max(limit, 1), _CHANGES_LIMIT)
+    try:
+        wait_for = float(request.args.get("wait") or 0)
+    except ValueError:
+        return jsonify({"error": "wait must be a number"}), 400
+
+    if since is None:
+        return jsonify({"events": [], "next": _CHANGES.latest_change()}), 200
+    if wait_for > 0:
+        _CHANGES.wait_for_change(since, min(wait_for, _CHANGES_WAIT_MAX))
+    try:
+        events = _CHANGES.changes_since(since, limit)
+    except ChangesGone as err:
+        return _changes_gone(err)
+    return jsonify({"events": events, "next": events[-1]["seq"] if events else since}), 200
+
+# the same feed as Server-Sent Events: GET /api/changes/stream?since=<seq>
+# one SSE event per change (id = seq, event = op, data = the change as JSON)
+# and a comment line every 15 seconds to keep the connection open.
+# Reconnecting EventSource clients resume from Last-Event-ID; without since
+# the stream starts with the next change. A client that fell too far behind
+# gets one "reset" event (re-read the items) and continues with the oldest
+# change still kept
+
+_SSE_KEEPALIVE = 15
+
+def _sse_changes(since):
+    dumps = app.json.dumps
+    yield "retry: 2000\n\n"
+    while True:
+        try:
+            events = _CHANGES.changes_since(since, _CHANGES_LIMIT)
+        except ChangesGone as err:
+            yield f"event: reset\ndata: {dumps({'oldest': err.oldest, 'latest': err.latest})}\n\n"
+            since = err.oldest - 1
+            continue
+        for event in events:
+            yield f"id: {event['seq']}\nevent: {event['op']}\ndata: {dumps(event)}\n\n"
+        if events:
+            since = events[-1]["seq"]
+        elif not _CHANGES.wait_for_change(since, _SSE_KEEPALIVE):
+            yield ": keepalive\n\n"
+
+@app.get("/api/changes/stream")
+def stream_changes():
+    since, err = _parse_int_arg("since", None)
+    if err:
+        return err
+    if since is None:
+        last_id = request.headers.get("Last-Event-ID", "")
+        since = int(last_id) if last_id.isdigit() else _CHANGES.latest_change()
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(_sse_changes(since), 200, headers, mimetype="text/event-stream")
+
 # OpenFoodFacts lookup
 
 # initial regex check to ensure the path param is digits only
 _BARCODE_RE = re.compile(r"^\d+$")
 
-def _normalize_openfoodfacts_product(openfoodfacts_payload: dict) -> dict:
-    
-    # convert OpenFoodFact's raw JSON into the simplified internal schema
-    # and only return fields we actually need for prefill
-    
-    barcode = openfoodfacts_payload.get("barcode")
-    product = openfoodfacts_payload.get("product") or {}
-    name = product.get("product_name") or ""
-    brands = product.get("brands") or ""
-    brand = brands.split(",")[0].strip() if brands else None
-
-    # preference for the numeric 'product_quantity' value if present; otherwise try to parse "quantity" i.e. like from "400 g"
-    qty_raw = product.get("product_quantity")
+# raw OpenFoodFacts products (lookups and search results) are converted to the
+# internal schema by normalize.py
+
+# circuit breaker around the OpenFoodFacts client (see breaker.py): while
+# OpenFoodFacts is failing or too slow, calls fail fast (503) or are answered
+# from stale cache entries instead of each waiting for the timeout
+#   IMS_OFF_BREAKER_FAILURE_RATE  failed share of recent calls that opens it (default = 0.5)
+#   IMS_OFF_BREAKER_MIN_CALLS     calls needed before it can open (default = 10)
+#   IMS_OFF_BREAKER_WINDOW        recent calls looked at (default = 20)
+#   IMS_OFF_BREAKER_SLOW          latency budget; slower calls count as failed (default = 2 seconds)
+#   IMS_OFF_BREAKER_OPEN_FOR      seconds open before a probe call is let through (default = 30)
+_OFF_BREAKER = CircuitBreaker(
+    failure_rate=float(os.environ.get("IMS_OFF_BREAKER_FAILURE_RATE", "0.5")),
+    min_calls=int(os.environ.get("IMS_OFF_BREAKER_MIN_CALLS", "10")),
+    window=int(os.environ.get("IMS_OFF_BREAKER_WINDOW", "20")),
+    slow_call=float(os.environ.get("IMS_OFF_BREAKER_SLOW", "2")),
+    open_for=float(os.environ.get("IMS_OFF_BREAKER_OPEN_FOR", "30")),
+)
+
+# pooled keep-alive client shared by every OpenFoodFacts call (see upstream.py)
+#   IMS_OFF_BASE_URL     default = https://world.openfoodfacts.org
+#   IMS_OFF_TIMEOUT      seconds per attempt (default = 5)
+#   IMS_OFF_POOL_SIZE    connections kept alive per host (default = 10)
+#   IMS_OFF_MAX_PER_HOST hard cap on concurrent requests per host (default = no cap)
+#   IMS_OFF_RETRIES      retries on connection errors / 429 / 5xx (default = 2)
+#   IMS_OFF_BACKOFF      exponential backoff factor in seconds (default = 0.3)
+_OFF_RETRIES = int(os.environ.get("IMS_OFF_RETRIES", "2"))
+_OFF_BACKOFF = float(os.environ.get("IMS_OFF_BACKOFF", "0.3"))
+_OFF = UpstreamClient(
+    os.environ.get("IMS_OFF_BASE_URL", "https://world.openfoodfacts.org"),
+    timeout=float(os.environ.get("IMS_OFF_TIMEOUT", "5")),
+    pool_maxsize=int(os.environ.get("IMS_OFF_MAX_PER_HOST") or os.environ.get("IMS_OFF_POOL_SIZE", "10")),
+    pool_block=bool(os.environ.get("IMS_OFF_MAX_PER_HOST")),
+    retries=_OFF_RETRIES,
+    backoff_factor=_OFF_BACKOFF,
+    breaker=_OFF_BREAKER,
+    on_call=lambda seconds, status: _UPSTREAM_LATENCY.observe(seconds, str(status)),
+)
+
+# cache of normalized OpenFoodFacts products by barcode (see cache.py), shared
+# by lookup_off and create_item_from_lookup; "not found" answers are cached too
+#   IMS_OFF_CACHE_SIZE           max cached barcodes (default = 10000)
+#   IMS_OFF_CACHE_TTL            seconds a product stays cached (default = 86400)
+#   IMS_OFF_CACHE_NEGATIVE_TTL   seconds a "not found" stays cached (default = 600)
+#   IMS_OFF_STALE_TTL            seconds expired entries are kept as a fallback
+#                                for when OpenFoodFacts is down (default = 86400)
+_OFF_STALE_TTL = float(os.environ.get("IMS_OFF_STALE_TTL", "86400"))
+_OFF_CACHE = TTLCache(
+    maxsize=int(os.environ.get("IMS_OFF_CACHE_SIZE", "10000")),
+    ttl=float(os.environ.get("IMS_OFF_CACHE_TTL", "86400")),
+    negative_ttl=float(os.environ.get("IMS_OFF_CACHE_NEGATIVE_TTL", "600")),
+    stale_ttl=_OFF_STALE_TTL,
+)
+
+# optional second tier on disk (SQLite file) that survives restarts; it also
+# holds /api/search results
+#   IMS_OFF_DISK_CACHE           cache file path (unset = no disk cache)
+#   IMS_OFF_DISK_CACHE_TTL       seconds a product stays cached on disk (default = 604800)
+#   IMS_OFF_SEARCH_TTL           seconds a search result stays cached (default = 3600)
+_OFF_DISK_CACHE = None
+if os.environ.get("IMS_OFF_DISK_CACHE"):
+    _OFF_DISK_CACHE = DiskCache(
+        os.environ["IMS_OFF_DISK_CACHE"],
+        ttl=float(os.environ.get("IMS_OFF_DISK_CACHE_TTL", "604800")),
+        negative_ttl=float(os.environ.get("IMS_OFF_CACHE_NEGATIVE_TTL", "600")),
+        stale_ttl=_OFF_STALE_TTL,
+    )
+    atexit.register(_OFF_DISK_CACHE.close)
+_OFF_SEARCH_TTL = float(os.environ.get("IMS_OFF_SEARCH_TTL", "3600"))
+
+def _off_cache_get(key):
+    # memory first, then disk (promoting disk hits into memory); MISS if neither
+    # A promoted entry expires with its disk row, not a full memory TTL later
+    value = _OFF_CACHE.get(key)
+    if value is MISS and _OFF_DISK_CACHE is not None:
+        value, left = _OFF_DISK_CACHE.get(key, with_ttl=True)
+        if value is not MISS:
+            ttl = _OFF_CACHE.negative_ttl if value is None else _OFF_CACHE.ttl
+            _OFF_CACHE.set(key, value, min(left, ttl))
+    return value
+
+def _off_cache_get_stale(key):
+    # expired-but-kept entry from either tier, or MISS
+    value = _OFF_CACHE.get_stale(key)
+    if value is MISS and _OFF_DISK_CACHE is not None:
+        value = _OFF_DISK_CACHE.get_stale(key)
+    return value
+
+def _or_stale(key, result):
+    # on any upstream error, fall back to a stale cache entry if there is one
+    if result[1] is None:
+        return result
+    stale = _off_cache_get_stale(key)
+    return result if stale is MISS else (stale, None)
+
+def _off_cache_set(key, value, ttl=None):
+    _OFF_CACHE.set(key, value, ttl)
+    if _OFF_DISK_CACHE is not None:
+        _OFF_DISK_CACHE.set(key, value, ttl)
+
+# upstream executor: every OpenFoodFacts call (lookups, batch lookups, search)
+# runs on one bounded thread pool behind a SingleFlight (see upstream.py), so
+#   - concurrent lookups of the same barcode share one upstream call
+#   - at most IMS_OFF_CONCURRENCY calls hit OpenFoodFacts at once
+#   - once IMS_OFF_MAX_PENDING calls are queued or running, new ones get a 503
+#     straight away instead of tying up a worker behind a slow upstream
+#   - a request waits at most IMS_OFF_WAIT seconds for its answer (504 after
+#     that; the call carries on in the background and still fills the cache)
+#   - batch lookups wait for free slots within that time instead of getting
+#     "busy" for the barcodes past IMS_OFF_MAX_PENDING
+#   IMS_OFF_CONCURRENCY   default = 8
+#   IMS_OFF_MAX_PENDING   default = 64
+#   IMS_OFF_WAIT          default = IMS_OFF_TIMEOUT, at most _OFF_WAIT_MAX: the
+#                         slowest an upstream call can be (every attempt timing
+#                         out, plus urllib3's backoff between retries). Waiting
+#                         longer can't get an answer, it only holds the thread
+_OFF_POOL = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("IMS_OFF_CONCURRENCY", "8")),
+    thread_name_prefix="off-upstream",
+)
+atexit.register(_OFF_POOL.shutdown, wait=False)
+_OFF_FLIGHTS = SingleFlight(_OFF_POOL, max_pending=int(os.environ.get("IMS_OFF_MAX_PENDING", "64")))
+_OFF_WAIT_MAX = (_OFF_RETRIES + 1) * _OFF.timeout + sum(_OFF_BACKOFF * 2 ** n for n in range(_OFF_RETRIES))
+_OFF_WAIT = min(float(os.environ.get("IMS_OFF_WAIT") or _OFF.timeout), _OFF_WAIT_MAX)
+
+def _submit_off(key, fn, *args, timeout=0):
+    # Future for fn(*args) on the upstream executor, or None when it's
+    # saturated (still, after waiting up to timeout seconds for a slot)
     try:
-        qty = int(qty_raw) if qty_raw is not None and str(qty_raw).strip() != "" else None
-    except (TypeError, ValueError):
-        qty = None
-
-    unit = None
-    if qty is None:
-        # try parsing from textual quantity "400 g"
-        qtext = product.get("quantity") or ""
-        # regex parse logic taking the first int and first trailing word to determine unit
-        m = re.match(r"\s*(\d+)\s*([A-Za-z]+)?", qtext)
-        if m:
-            qty = int(m.group(1))
-            unit = (m.group(2) or "").lower() or None
-    else:
-        # if numeric qty found, try to get unit from "quantity" text using regex
-        qtext = product.get("quantity") or ""
-        m = re.search(r"[A-Za-z]+", qtext)
-        unit = (m.group(0).lower() if m else None) or None
-
-    return {
-        "barcode": barcode,
-        "product_name": name,
-        "brand": brand,
-        # default = 0
-        "product_quantity": qty if qty is not None else 0,
-        # unit is optional
-        "product_quantity_unit": unit,
-    }
+        return _OFF_FLIGHTS.submit(key, fn, *args, timeout=timeout)
+    except UpstreamBusy:
+        return None
+
+def _await_off(key, fn, *args):
+    # run fn(*args) (which returns (value, error)) on the upstream executor and
+    # wait for it; (None, "busy") / (None, "timeout") when that doesn't work out
+    future = _submit_off(key, fn, *args)
+    if future is None:
+        return None, "busy"
+    started = time.perf_counter()
+    try:
+        return future.result(timeout=_OFF_WAIT)
+    except FutureTimeout:
+        return None, "timeout"
+    finally:
+        _upstream_waited(started)
+
+def _off_unavailable(err):
+    # shared 503/504 responses for the executor and breaker errors (None otherwise)
+    if err == "circuit":
+        retry_after = math.ceil(_OFF_BREAKER.stats()["retry_after"]) or 1
+        return jsonify({"error": "upstream unavailable, circuit open"}), 503, {"Retry-After": str(retry_after)}
+    if err == "busy":
+        return jsonify({"error": "upstream busy, retry later"}), 503, {"Retry-After": "1"}
+    if err == "timeout":
+        return jsonify({"error": "upstream timed out"}), 504
+    return None
+
+def _fetch_off_product(barcode: str):
+
+    # fetch + normalize one product from OpenFoodFacts, going through the cache
+    # returns (product, error):
+    #   (dict, None)       found
+    #   (None, None)       OpenFoodFacts says not found (HTTP 404 or status 0)
+    #   (None, "request")  request failed (timeout, network down, DNS...)
+    #   (None, "status")   OpenFoodFacts answered with some other non-200
+    #   (None, "busy")     too many upstream calls pending, not even tried
+    #   (None, "timeout")  no answer within IMS_OFF_WAIT
+    #   (None, "circuit")  circuit breaker open, not tried
+    # only found/not found answers are cached, failures are retried next time;
+    # on failure a stale cache entry is returned instead, if there is one
+
+    cached = _off_cache_get(barcode)
+    if cached is not MISS:
+        return cached, None
+    return _or_stale(barcode, _await_off(barcode, _fetch_off_uncached, barcode))
+
+def _fetch_off_uncached(barcode: str):
+    # the upstream half of _fetch_off_product, run on the upstream executor
+
+    # OpenFoodFacts v2 endpoint
+    try:
+        resp = _OFF.get(f"/api/v2/product/{barcode}.json")
+    except CircuitOpenError:
+        return None, "circuit"
+    except Exception:
+        return None, "request"
+
+    if resp.status_code == 404:
+        # OFF v2 answers unknown barcodes with a 404
+        _off_cache_set(barcode, None)
+        return None, None
+    if resp.status_code != 200:
+        return None, "status"
+
+    data = resp.json() or {}
+    product_data = data.get("product")
+    if not product_data or data.get("status") == 0:
+        _off_cache_set(barcode, None)
+        return None, None
+
+    product = normalize_product(product_data, barcode)
+    _off_cache_set(barcode, product)
+    return product, None
 
 @app.get("/api/lookup/<barcode>")
 def lookup_off(barcode: str):
@@ -217,62 +1042,172 @@ def lookup_off(barcode: str):
         # return 400 if barcode is invalid (non-digits)
         return jsonify({"error": "barcode must be digits only"}), 400
 
-    # OpenFoodFacts v2 endpoint
-    url = f"https://world.openfoodfacts.org/api/v2/product/{barcode}.json"
-    try:
-        resp = requests.get(url, headers={"User-Agent": "ims-lab/0.1"}, timeout=5)
-    except Exception:
+    product, err = _fetch_off_product(barcode)
+    unavailable = _off_unavailable(err)
+    if unavailable:
+        # 503 when too many upstream calls are pending, 504 when it took too long
+        return unavailable
+    if err == "request":
         # return 502 if the external request times out, network is down, or the domain can’t be reached
         return jsonify({"error": "upstream request failed"}), 502
-
-    if resp.status_code != 200:
-        # also return 502 if the request succeeds, but OpenFoodFacts returns something like a 404 or 500 response
+    if err == "status":
+        # also return 502 if the request succeeds, but OpenFoodFacts returns something like a 500 response
         return jsonify({"error": "upstream returned non-200"}), 502
-
-    data = resp.json()
-    if not data or data.get("status") != 1:
-        
+    if product is None:
         # return 404 if OpenFoodFacts says not found
         return jsonify({"error": "product not found"}), 404
 
     # return 200 with normalized JSON if found
-    return jsonify(_normalize_openfoodfacts_product(data)), 200
+    return jsonify(product), 200
 
-def _normalize_off_product_from_list(prod: dict) -> dict:
-    
-    # create function to normalize a single product object from the OpenFoodFacts 'products' array in search results
-    # mirrors the logic in `_normalize_openfoodfacts_product`
-    
-    barcode = prod.get("barcode") or prod.get("_id")
-    name = (prod.get("product_name") or "").strip()
-    brands = (prod.get("brands") or "").strip()
-    brand = brands.split(",")[0].strip() if brands else None
+# batch lookup: POST /api/lookup/batch
+# Body: {"barcodes": ["3017620422003", ...]} (or just the array).
+# Barcodes are validated and deduplicated (first occurrence wins), cache hits
+# are answered straight away and the misses are fetched from OpenFoodFacts
+# concurrently on the upstream executor. Results come back in request
+# order with a per-barcode status (200 / 400 / 404 / 502), like lookup_off.
+#   IMS_OFF_BATCH_MAX            max barcodes per request (default = 100)
 
-    qty_raw = prod.get("product_quantity")
-    try:
-        qty = int(qty_raw) if qty_raw is not None and str(qty_raw).strip() != "" else None
-    except (TypeError, ValueError):
-        qty = None
-
-    unit = None
-    if qty is None:
-        qtext = prod.get("quantity") or ""
-        m = re.match(r"\s*(\d+)\s*([A-Za-z]+)?", qtext)
-        if m:
-            qty = int(m.group(1))
-            unit = (m.group(2) or "").lower() or None
-    else:
-        qtext = prod.get("quantity") or ""
-        m = re.search(r"[A-Za-z]+", qtext)
-        unit = (m.group(0).lower() if m else None) or None
-
-    return {
-        "barcode": barcode,
-        "product_name": name,
-        "brand": brand,
-        "product_quantity": qty if qty is not None else 0,
-        "product_quantity_unit": unit,
-    }
+_OFF_BATCH_MAX = int(os.environ.get("IMS_OFF_BATCH_MAX", "100"))
+
+def _parse_barcodes():
+    # returns (list of unique barcode strings, None) or (None, error response)
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get("barcodes")
+    if not isinstance(payload, list):
+        return None, (jsonify({"error": "barcodes array required"}), 400)
+    barcodes = []
+    seen = set()
+    for raw in payload:
+        # ints are fine too (JSON numbers), anything else is reported as invalid
+        barcode = str(raw).strip() if isinstance(raw, (str, int)) and not isinstance(raw, bool) else repr(raw)
+        if barcode not in seen:
+            seen.add(barcode)
+            barcodes.append(barcode)
+    if len(barcodes) > _OFF_BATCH_MAX:
+        return None, (jsonify({"error": f"at most {_OFF_BATCH_MAX} barcodes per request"}), 400)
+    return barcodes, None
+
+def _fetch_off_products(barcodes):
+    # {barcode: (product, error)} for valid barcodes, same contract as
+    # _fetch_off_product; only cache misses go to the thread pool
+    results = {}
+    pending = {}
+    # one deadline for the whole batch; misses past the executor's free slots
+    # wait for earlier calls to finish
+    started = time.perf_counter()
+    deadline = started + _OFF_WAIT
+    for barcode in barcodes:
+        if not _BARCODE_RE.match(barcode):
+            continue
+        cached = _off_cache_get(barcode)
+        if cached is not MISS:
+            results[barcode] = (cached, None)
+            continue
+        future = _submit_off(barcode, _fetch_off_uncached, barcode,
+                             timeout=max(deadline - time.perf_counter(), 0))
+        if future is None:
+            results[barcode] = _or_stale(barcode, (None, "busy"))
+        else:
+            pending[barcode] = future
+    wait(pending.values(), timeout=max(deadline - time.perf_counter(), 0))
+    _upstream_waited(started)
+    for barcode, future in pending.items():
+        results[barcode] = _or_stale(barcode, future.result() if future.done() else (None, "timeout"))
+    return results
+
+def _lookup_status(barcode, fetched):
+    # (status, error message) for one barcode of a batch
+    if barcode not in fetched:
+        return 400, "barcode must be digits only"
+    product, err = fetched[barcode]
+    if err == "circuit":
+        return 503, "upstream unavailable, circuit open"
+    if err == "busy":
+        return 503, "upstream busy, retry later"
+    if err == "timeout":
+        return 504, "upstream timed out"
+    if err == "request":
+        return 502, "upstream request failed"
+    if err == "status":
+        return 502, "upstream returned non-200"
+    if product is None:
+        return 404, "product not found"
+    return 200, None
+
+@app.post("/api/lookup/batch")
+def lookup_off_batch():
+    barcodes, error = _parse_barcodes()
+    if error:
+        return error
+
+    fetched = _fetch_off_products(barcodes)
+    counts = {"found": 0, "not_found": 0, "failed": 0}
+    results = []
+    for barcode in barcodes:
+        status, message = _lookup_status(barcode, fetched)
+        if status == 200:
+            counts["found"] += 1
+            results.append({"barcode": barcode, "status": 200, "product": fetched[barcode][0]})
+            continue
+        counts["not_found" if status == 404 else "failed"] += 1
+        results.append({"barcode": barcode, "status": status, "error": message})
+    return jsonify({**counts, "results": results}), 200
+
+# OpenFoodFacts cache counters, e.g. for a metrics scraper
+@app.get("/api/cache/stats")
+def cache_stats():
+    stats = {"openfoodfacts": _OFF_CACHE.stats()}
+    if _OFF_DISK_CACHE is not None:
+        stats["openfoodfacts_disk"] = _OFF_DISK_CACHE.stats()
+    # upstream executor: calls in flight, coalesced and rejected (busy) lookups
+    stats["upstream"] = _OFF_FLIGHTS.stats()
+    if _ITEM_JSON is not None:
+        stats["items_json"] = {**_ITEM_JSON.stats(), "encoder": app.json.encoder}
+    return jsonify(stats), 200
+
+# Prometheus scrape target: GET /api/metrics
+# request latency histograms per route/status (throughput = their _count),
+# time spent waiting on OpenFoodFacts, OpenFoodFacts call latency, cache
+# hits/misses, store size and writes; the gauges below are read per scrape
+
+def _cache_counts(field):
+    counts = {("memory",): _OFF_CACHE.stats()[field]}
+    if _OFF_DISK_CACHE is not None:
+        counts[("disk",)] = _OFF_DISK_CACHE.stats()[field]
+    if _ITEM_JSON is not None and field in ("hits", "misses"):
+        counts[("items_json",)] = getattr(_ITEM_JSON, field)
+    return counts
+
+def _cache_hit_ratios():
+    hits, misses = _cache_counts("hits"), _cache_counts("misses")
+    return {cache: hits[cache] / (hits[cache] + misses[cache]) if hits[cache] + misses[cache] else None
+            for cache in hits}
+
+_METRICS.counter_callback("ims_cache_hits_total", "Cache hits", lambda: _cache_counts("hits"), ("cache",))
+_METRICS.counter_callback("ims_cache_misses_total", "Cache misses", lambda: _cache_counts("misses"), ("cache",))
+_METRICS.gauge_callback("ims_cache_hit_ratio", "Cache hits / lookups since start", _cache_hit_ratios, ("cache",))
+_METRICS.gauge_callback("ims_store_items", "Items in the store", lambda: len(_STORE))
+_METRICS.gauge_callback("ims_store_version", "Store version (writes so far)", lambda: _VERSIONS.version()[0])
+_METRICS.gauge_callback("ims_holds_active", "Stock holds not yet committed, released or expired",
+                        lambda: _HOLDS.hold_stats()["active"])
+_METRICS.counter_callback("ims_holds_expired_total", "Stock holds reclaimed after expiring",
+                          lambda: _HOLDS.hold_stats()["expired"])
+_METRICS.gauge_callback("ims_changes_latest_seq", "Seq of the newest /api/changes event", lambda: _CHANGES.latest_change())
+_METRICS.gauge_callback("ims_upstream_in_flight", "OpenFoodFacts calls queued or running",
+                        lambda: _OFF_FLIGHTS.stats()["in_flight"])
+_METRICS.gauge_callback("ims_upstream_breaker_open", "1 while the OpenFoodFacts circuit breaker is not closed",
+                        lambda: int(_OFF_BREAKER.state != "closed"))
+
+@app.get("/api/metrics")
+def metrics_endpoint():
+    return Response(_METRICS.render(), 200, mimetype=None, content_type=metrics.CONTENT_TYPE)
+
+# OpenFoodFacts client health: circuit breaker state + upstream executor load
+@app.get("/api/upstream/status")
+def upstream_status():
+    return jsonify({"breaker": _OFF_BREAKER.stats(), "executor": _OFF_FLIGHTS.stats()}), 200
 
 @app.get("/api/search")
 def search_off_by_name():
@@ -281,6 +1216,9 @@ def search_off_by_name():
     # Query params:
     #   name              str (required)
     #   limit             int (optional, default = 5)
+    #   local             bool (optional): put matching inventory items first
+    #                     (marked "source": "local"), and only ask OpenFoodFacts
+    #                     for the rest; if it fails, the local hits are returned
     name = (request.args.get("name") or "").strip()
     if not name:
         return jsonify({"error": "name is required"}), 400
@@ -296,6 +1234,43 @@ def search_off_by_name():
     if limit > 20:
         limit = 20
 
+    local = []
+    if _flag("local"):
+        local = [{**item, "source": "local"} for item in _SEARCH.search(name, limit)]
+        if len(local) == limit:
+            return jsonify(local), 200
+
+    normalized, err = _search_off(name, limit)
+    if local:
+        if err is not None:
+            return jsonify(local), 200
+        # OFF results for products we already have are dropped
+        have = {str(item.get("barcode")) for item in local}
+        remote = [{**p, "source": "openfoodfacts"} for p in normalized if str(p.get("barcode")) not in have]
+        return jsonify(local + remote[:limit - len(local)]), 200
+
+    unavailable = _off_unavailable(err)
+    if unavailable:
+        return unavailable
+    if err == "request":
+        return jsonify({"error": "upstream request failed"}), 502
+    if err == "status":
+        return jsonify({"error": "upstream returned non-200"}), 502
+    return jsonify(normalized), 200
+
+def _search_off(name, limit):
+    # (normalized products, None) or (None, error) like _fetch_off_product
+    # same query + limit --> same answer for a while, so serve it from the cache
+    cache_key = f"search:{name.lower()}:{limit}"
+    cached = _off_cache_get(cache_key)
+    if cached is not MISS:
+        return cached, None
+    return _or_stale(cache_key, _await_off(cache_key, _search_off_uncached, name, limit, cache_key))
+
+def _search_off_uncached(name, limit, cache_key):
+    # the upstream half of search_off_by_name, run on the upstream executor
+    # returns (normalized products, None) or (None, "request" / "status")
+
     # OpenFoodFacts search (v2) and only request only the fields we need for internal schema
     fields = "code,product_name,brands,product_quantity,quantity"
     qs = urllib.parse.urlencode({
@@ -303,53 +1278,90 @@ def search_off_by_name():
         "page_size": limit,
         "fields": fields,
     })
-    url = f"https://world.openfoodfacts.org/api/v2/search?{qs}"
-
     try:
-        resp = requests.get(url, headers={"User-Agent": "ims-lab/0.1"}, timeout=5)
+        resp = _OFF.get(f"/api/v2/search?{qs}")
+    except CircuitOpenError:
+        return None, "circuit"
     except Exception:
-        return jsonify({"error": "upstream request failed"}), 502
+        return None, "request"
 
     if resp.status_code != 200:
-        return jsonify({"error": "upstream returned non-200"}), 502
+        return None, "status"
 
     data = resp.json() or {}
     products = data.get("products") or []
-    normalized = [_normalize_off_product_from_list(p) for p in products]
-    return jsonify(normalized), 200
+    normalized = list(normalize_products(products))
+    _off_cache_set(cache_key, normalized, _OFF_SEARCH_TTL)
+    return normalized, None
 
 @app.post("/api/items/from_lookup")
 def create_item_from_lookup():
     barcode = (request.args.get("barcode") or "").strip()
     if not barcode:
         return jsonify({"error": "barcode required"}), 400
+    # same check as lookup_off: the cache also holds search results, under keys
+    # that aren't digits-only
+    if not _BARCODE_RE.match(barcode):
+        return jsonify({"error": "barcode must be digits only"}), 400
 
-    # reuse the lookup logic
-    url = f"https://world.openfoodfacts.org/api/v2/product/{barcode}.json"
-    try:
-        resp = requests.get(url, headers={"User-Agent": "ims-lab/0.1"}, timeout=5)
-    except Exception:
+    # reuse the lookup logic (and its cache)
+    item, err = _fetch_off_product(barcode)
+    unavailable = _off_unavailable(err)
+    if unavailable:
+        return unavailable
+    if err == "request":
         return jsonify({"error": "upstream failed"}), 502
-    if resp.status_code != 200:
+    if err == "status":
         return jsonify({"error": "upstream bad status"}), 502
-
-    data = resp.json() or {}
-    product = data.get("product")
-    if not product:
+    if item is None:
         return jsonify({"error": "not found"}), 404
 
-    item = _normalize_openfoodfacts_product({
-        "barcode": barcode,
-        "product": product
-    })
-
-    # assign id here too
-    global _NEXT_ID
-    item["id"] = _NEXT_ID
-    _NEXT_ID += 1
+    # store assigns the id here too; same duplicate/upsert rules as create_item.
+    # The product's quantity is its package size, only used as the stock of a
+    # new item: an upsert never writes it over an existing item's stock
+    if _flag("upsert"):
+        item, created = _STORE.upsert(item, keep=_STOCK)
+        return jsonify(item), 201 if created else 200
 
-    _DB.append(item)
+    try:
+        item = _STORE.create(item)
+    except DuplicateBarcodeError as err:
+        return _duplicate_barcode(err)
     return jsonify(item), 201
 
+# bulk variant of from_lookup: POST /api/items/from_lookup/batch
+# Same body as /api/lookup/batch; every product found is created in one
+# create_many call (?upsert=true updates items whose barcode already exists).
+# Per-barcode status: 201 created, 200 updated, 409 duplicate, or the lookup's
+# 400 / 404 / 502.
+@app.post("/api/items/from_lookup/batch")
+def create_items_from_lookup():
+    barcodes, error = _parse_barcodes()
+    if error:
+        return error
+
+    fetched = _fetch_off_products(barcodes)
+    found = [b for b in barcodes if _lookup_status(b, fetched)[0] == 200]
+    rows = [fetched[b][0] for b in found]
+    created = dict(zip(found, _STORE.create_many(rows, upsert=_flag("upsert"), keep=[_STOCK] * len(rows))))
+
+    counts = {"created": 0, "updated": 0, "failed": 0}
+    results = []
+    for barcode in barcodes:
+        if barcode not in created:
+            counts["failed"] += 1
+            status, message = _lookup_status(barcode, fetched)
+            results.append({"barcode": barcode, "status": status, "error": message})
+            continue
+        result = created[barcode]
+        if isinstance(result, DuplicateBarcodeError):
+            counts["failed"] += 1
+            results.append({"barcode": barcode, "status": 409, "error": "barcode already exists", "id": result.item_id})
+            continue
+        item, was_created = result
+        counts["created" if was_created else "updated"] += 1
+        results.append({"barcode": barcode, "status": 201 if was_created else 200, "item": item})
+    return jsonify({**counts, "results": results}), 200
+
 if __name__ == "__main__":
     app.run(debug=True, port=5555)
\ No newline at end of file
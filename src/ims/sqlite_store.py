@@ -0,0 +1,640 @@
+# SQLite item store
+#
+# Drop-in alternative to store.ItemStore that keeps items on disk, so several
+# Flask worker processes can share one inventory without loading it all into
+# RAM. Selected with IMS_STORE=sqlite (see server.py).
+#
+# - WAL journal mode: readers don't block the writer and vice versa
+# - one connection per thread at a time; each connection caches its compiled
+#   statements, and every query here is a constant SQL string so they are
+#   prepared once and reused. The threaded server starts a thread per client
+#   connection, so when a thread ends its connection goes back to a small idle
+#   pool (pool_size) for the next thread instead of staying open forever
+# - id is the INTEGER PRIMARY KEY (rowid) and barcode has a UNIQUE index
+# - restock/deduct are single UPDATE statements, so concurrent workers never
+#   lose an update
+#
+# product_name, barcode and product_quantity are real columns; any other item
+# fields (brand, product_quantity_unit from lookups) are kept as JSON in
+# `extra`, so items come back exactly as they went in.
+#
+# search() uses an FTS5 table over product_name, brand and barcode, kept in
+# sync by triggers (so every worker process sees the same index); same
+# prefix/AND semantics as search.SearchIndex, ranked by bm25.
+#
+# low_stock() reads a partial index on product_quantity - reorder_level
+# (reorder_level lives in `extra`), same ordering as lowstock.LowStockIndex.
+#
+# version()/item_version() are the change counters of versions.ItemVersions,
+# kept in store_version/item_versions by triggers, so they move with every
+# committed write from any worker process.
+#
+# The change feed (same methods as changes.ChangeLog) is the changes table:
+# triggers log every insert/update/delete of an item with the item's new
+# columns, so seqs are shared by every worker process and survive restarts.
+# The op is told apart from the columns: a change of product_quantity alone
+# is a restock or deduct, anything else an update. Only the newest
+# changes_size rows are kept (pruned every 100 inserts). Waiting readers are
+# woken by this process' own writes and poll for other processes' ones.
+#
+# Stock holds (same methods as holds.Reservations) live in the holds table,
+# so every worker sees the same reservations. Expired rows are reclaimed by
+# each reserve through the expires_at index, and ignored by reads until then.
+
+import itertools
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+from ims.changes import ChangesGone
+from ims.holds import InsufficientStockError, availability
+from ims.search import tokenize
+from ims.store import DuplicateBarcodeError, ItemNotFoundError, _barcode_key, _without
+
+_COLUMNS = ("product_name", "barcode", "product_quantity")
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        product_name TEXT,
+        barcode TEXT,
+        product_quantity INTEGER NOT NULL DEFAULT 0,
+        extra TEXT
+    )""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS items_barcode ON items(barcode)",
+    # only items with a reorder level; the expressions must match _LOW_STOCK
+    "CREATE INDEX IF NOT EXISTS items_shortfall ON items("
+    "product_quantity - json_extract(extra, '$.reorder_level'), id)"
+    " WHERE json_extract(extra, '$.reorder_level') IS NOT NULL",
+    "CREATE TABLE IF NOT EXISTS holds (id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " item_id INTEGER NOT NULL, quantity INTEGER NOT NULL, expires_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS holds_item ON holds(item_id, expires_at)",
+    "CREATE INDEX IF NOT EXISTS holds_expiry ON holds(expires_at)",
+    # holds go away with their item (and with clear())
+    "CREATE TRIGGER IF NOT EXISTS holds_item_delete AFTER DELETE ON items BEGIN"
+    " DELETE FROM holds WHERE item_id = old.id; END",
+)
+
+# full-text index, created (and filled from existing rows) on first open
+_FTS_VALUES = "(new.id, new.product_name, json_extract(new.extra, '$.brand'), new.barcode)"
+_FTS_SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(product_name, brand, barcode)",
+    "CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN"
+    " INSERT INTO items_fts (rowid, product_name, brand, barcode) VALUES " + _FTS_VALUES + "; END",
+    "CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN"
+    " DELETE FROM items_fts WHERE rowid = old.id; END",
+    # restock/deduct only touch product_quantity and don't fire this
+    "CREATE TRIGGER IF NOT EXISTS items_fts_update AFTER UPDATE OF product_name, barcode, extra ON items BEGIN"
+    " DELETE FROM items_fts WHERE rowid = old.id;"
+    " INSERT INTO items_fts (rowid, product_name, brand, barcode) VALUES " + _FTS_VALUES + "; END",
+    "INSERT INTO items_fts (rowid, product_name, brand, barcode)"
+    " SELECT id, product_name, json_extract(extra, '$.brand'), barcode FROM items",
+)
+
+# change versions, created on first open like the FTS table
+_NOW = "((julianday('now') - 2440587.5) * 86400.0)"
+_BUMP = f"UPDATE store_version SET version = version + 1, modified = {_NOW};"
+_SET_ITEM_VERSION = (
+    " INSERT OR REPLACE INTO item_versions (id, version, modified)"
+    " SELECT new.id, version, modified FROM store_version;"
+)
+_VERSION_SCHEMA = (
+    "CREATE TABLE store_version (id INTEGER PRIMARY KEY CHECK (id = 1),"
+    " version INTEGER NOT NULL, modified REAL NOT NULL, epoch TEXT NOT NULL)",
+    "CREATE TABLE item_versions (id INTEGER PRIMARY KEY, version INTEGER NOT NULL, modified REAL NOT NULL)",
+    f"INSERT INTO store_version VALUES (1, 0, {_NOW}, lower(hex(randomblob(4))))",
+    # items from before versions existed are at version 0
+    f"INSERT INTO item_versions SELECT id, 0, {_NOW} FROM items",
+    "CREATE TRIGGER items_version_insert AFTER INSERT ON items BEGIN " + _BUMP + _SET_ITEM_VERSION + " END",
+    "CREATE TRIGGER items_version_update AFTER UPDATE ON items BEGIN " + _BUMP + _SET_ITEM_VERSION + " END",
+    "CREATE TRIGGER items_version_delete AFTER DELETE ON items BEGIN " + _BUMP +
+    " DELETE FROM item_versions WHERE id = old.id; END",
+)
+
+# change feed, created on first open too; no backfill, the feed starts empty
+_CHANGE_COLUMNS = "(op, item_id, product_name, barcode, product_quantity, extra, ts)"
+_CHANGES_SCHEMA = (
+    "CREATE TABLE changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, op TEXT NOT NULL, item_id INTEGER,"
+    " product_name TEXT, barcode TEXT, product_quantity INTEGER, extra TEXT, ts REAL NOT NULL)",
+    "CREATE TABLE changes_size (id INTEGER PRIMARY KEY CHECK (id = 1), keep INTEGER NOT NULL)",
+    "INSERT INTO changes_size VALUES (1, 10000)",
+    "CREATE TRIGGER items_changes_insert AFTER INSERT ON items BEGIN"
+    f" INSERT INTO changes {_CHANGE_COLUMNS} VALUES ('create', new.id, new.product_name, new.barcode,"
+    f" new.product_quantity, new.extra, {_NOW}); END",
+    "CREATE TRIGGER items_changes_update AFTER UPDATE ON items BEGIN"
+    f" INSERT INTO changes {_CHANGE_COLUMNS} VALUES ("
+    " CASE WHEN new.product_name IS NOT old.product_name OR new.barcode IS NOT old.barcode"
+    " OR new.extra IS NOT old.extra OR new.product_quantity = old.product_quantity THEN 'update'"
+    " WHEN new.product_quantity > old.product_quantity THEN 'restock' ELSE 'deduct' END,"
+    f" new.id, new.product_name, new.barcode, new.product_quantity, new.extra, {_NOW}); END",
+    "CREATE TRIGGER items_changes_delete AFTER DELETE ON items BEGIN"
+    f" INSERT INTO changes (op, item_id, ts) VALUES ('delete', old.id, {_NOW}); END",
+    "CREATE TRIGGER changes_prune AFTER INSERT ON changes WHEN new.seq % 100 = 0 BEGIN"
+    " DELETE FROM changes WHERE seq <= new.seq - (SELECT keep FROM changes_size); END",
+)
+_LATEST_CHANGE = "SELECT seq FROM sqlite_sequence WHERE name = 'changes'"
+_CHANGES_SINCE = (
+    "SELECT seq, op, item_id, product_name, barcode, product_quantity, extra, ts"
+    " FROM changes WHERE seq > ? ORDER BY seq LIMIT ?"
+)
+# seconds between checks for other processes' changes while waiting
+_CHANGES_POLL = 0.2
+
+_SELECT = "SELECT id, product_name, barcode, product_quantity, extra FROM items"
+_GET = _SELECT + " WHERE id = ?"
+_GET_BY_BARCODE = _SELECT + " WHERE barcode = ?"
+_PAGE = _SELECT + " WHERE id > ? ORDER BY id LIMIT ?"
+_INSERT = (
+    "INSERT INTO items (product_name, barcode, product_quantity, extra) VALUES (?, ?, ?, ?)"
+    " RETURNING id, product_name, barcode, product_quantity, extra"
+)
+_UPDATE = (
+    "UPDATE items SET product_name = ?, barcode = ?, product_quantity = ?, extra = ? WHERE id = ?"
+    " RETURNING id, product_name, barcode, product_quantity, extra"
+)
+_RESTOCK = (
+    "UPDATE items SET product_quantity = product_quantity + ? WHERE id = ?"
+    " RETURNING id, product_name, barcode, product_quantity, extra"
+)
+# clamp at 0 so quantity is never negative
+_DEDUCT = (
+    "UPDATE items SET product_quantity = MAX(product_quantity - ?, 0) WHERE id = ?"
+    " RETURNING id, product_name, barcode, product_quantity, extra"
+)
+_SEARCH = (
+    "SELECT items.id, items.product_name, items.barcode, items.product_quantity, items.extra"
+    " FROM items_fts JOIN items ON items.id = items_fts.rowid"
+    " WHERE items_fts MATCH ? ORDER BY bm25(items_fts), items.id LIMIT ?"
+)
+_LOW_STOCK = (
+    _SELECT + " WHERE json_extract(extra, '$.reorder_level') IS NOT NULL"
+    " AND product_quantity - json_extract(extra, '$.reorder_level') <= 0"
+    " ORDER BY product_quantity - json_extract(extra, '$.reorder_level'), id LIMIT ?"
+)
+_DELETE = "DELETE FROM items WHERE id = ?"
+_OWNER = "SELECT id FROM items WHERE barcode = ?"
+
+_HOLD_COLUMNS = "id, item_id, quantity, expires_at"
+_AVAILABILITY = (
+    "SELECT id, product_quantity, (SELECT COALESCE(SUM(quantity), 0) FROM holds"
+    " WHERE item_id = items.id AND expires_at > ?) FROM items WHERE id = ?"
+)
+_INSERT_HOLD = "INSERT INTO holds (item_id, quantity, expires_at) VALUES (?, ?, ?) RETURNING " + _HOLD_COLUMNS
+_GET_HOLD = "SELECT " + _HOLD_COLUMNS + " FROM holds WHERE id = ? AND expires_at > ?"
+_TAKE_HOLD = "DELETE FROM holds WHERE id = ? AND expires_at > ? RETURNING " + _HOLD_COLUMNS
+_EXPIRE_HOLDS = "DELETE FROM holds WHERE expires_at <= ?"
+
+# rows fetched per query when iterating the whole table
+_ITER_BATCH = 500
+
+
+class _Lease:
+    # a thread's connection; dropped with the thread's locals when the thread
+    # ends, which hands the connection back to the store's pool
+
+    def __init__(self, store, conn, generation):
+        self.store = store
+        self.conn = conn
+        self.generation = generation
+
+    def __del__(self):
+        self.store._release(self.conn, self.generation)
+
+
+def _one(cursor):
+    # fetch a RETURNING row; fetchall() runs the statement to completion so
+    # the autocommit write is finished (and its lock released) right away
+    rows = cursor.fetchall()
+    return rows[0] if rows else None
+
+
+def _row_to_item(row):
+    if row is None:
+        return None
+    item = {"id": row[0], "product_name": row[1], "barcode": row[2], "product_quantity": row[3]}
+    if row[4]:
+        item.update(json.loads(row[4]))
+    return item
+
+
+def _row_to_hold(row):
+    if row is None:
+        return None
+    return {"id": row[0], "item_id": row[1], "quantity": row[2], "expires_at": row[3]}
+
+
+def _split(fields: dict):
+    # column values + JSON for everything else (None when there is nothing)
+    extra = {k: v for k, v in fields.items() if k not in _COLUMNS and k != "id"}
+    return (
+        fields.get("product_name"),
+        _barcode_key(fields.get("barcode")),
+        int(fields.get("product_quantity", 0) or 0),
+        json.dumps(extra) if extra else None,
+    )
+
+
+class SQLiteItemStore:
+
+    def __init__(self, path: str, timeout: float = 5.0, clock=time.time, pool_size: int = 8,
+                 changes_size: int = 10_000):
+        self.path = path
+        self.timeout = timeout
+        self._clock = clock
+        # holds reclaimed by this process
+        self.expired = 0
+        self._local = threading.local()
+        # connections of finished threads, waiting for the next thread
+        self._idle = queue.Queue(maxsize=pool_size)
+        # every open connection, so close() can reach other threads' ones
+        self._connections = set()
+        self._pool_lock = threading.Lock()
+        # bumped by close(), so leases from before it don't come back
+        self._generation = 0
+        self._listeners = []
+        # notified after every write of this process (see wait_for_change)
+        self._changed = threading.Condition()
+        conn = self._conn()
+        for stmt in _SCHEMA:
+            conn.execute(stmt)
+        self._write(conn, self._create_fts)
+        self._write(conn, self._create_versions)
+        self._write(conn, self._create_changes)
+        conn.execute("UPDATE changes_size SET keep = ?", (max(changes_size, 1),))
+        self.epoch = conn.execute("SELECT epoch FROM store_version").fetchone()[0]
+
+    @staticmethod
+    def _create_fts(conn):
+        # inside a write transaction, so only one worker process builds it
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'items_fts'").fetchone() is None:
+            for stmt in _FTS_SCHEMA:
+                conn.execute(stmt)
+
+    @staticmethod
+    def _create_versions(conn):
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'store_version'").fetchone() is None:
+            for stmt in _VERSION_SCHEMA:
+                conn.execute(stmt)
+
+    @staticmethod
+    def _create_changes(conn):
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'changes'").fetchone() is None:
+            for stmt in _CHANGES_SCHEMA:
+                conn.execute(stmt)
+
+    # connection pool
+
+    def _connect(self):
+        # autocommit; multi-statement changes use explicit BEGIN IMMEDIATE
+        conn = sqlite3.connect(
+            self.path, timeout=self.timeout, isolation_level=None,
+            check_same_thread=False, cached_statements=256,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with self._pool_lock:
+            self._connections.add(conn)
+        return conn
+
+    def _conn(self):
+        lease = getattr(self._local, "lease", None)
+        if lease is None:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            lease = self._local.lease = _Lease(self, conn, self._generation)
+        return lease.conn
+
+    def _release(self, conn, generation):
+        # the thread that had conn is gone: keep it for the next one, or close
+        # it when the pool is full (or the store was closed meanwhile)
+        with self._pool_lock:
+            if generation == self._generation:
+                try:
+                    self._idle.put_nowait(conn)
+                    return
+                except queue.Full:
+                    pass
+            self._connections.discard(conn)
+        conn.close()
+
+    def close(self):
+        with self._pool_lock:
+            self._generation += 1
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        while not self._idle.empty():
+            self._idle.get_nowait()
+        self._local = threading.local()
+
+    def _write(self, conn, fn):
+        # run fn(conn) in a write transaction, taking the write lock up front
+        # so a read-then-write can't be interleaved by another worker
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    # listeners, same contract as ItemStore
+
+    def add_listener(self, fn):
+        self._listeners.append(fn)
+
+    def _notify(self, op, item_id, item):
+        # no locks held here, so listener follow-ups can run straight away
+        with self._changed:
+            self._changed.notify_all()
+        for fn in self._listeners:
+            followup = fn(op, item_id, item)
+            if followup is not None:
+                followup()
+
+    # reads
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def __iter__(self):
+        return self.iter_after(0)
+
+    def __contains__(self, item_id):
+        return self._conn().execute("SELECT 1 FROM items WHERE id = ?", (item_id,)).fetchone() is not None
+
+    @property
+    def next_id(self) -> int:
+        row = self._conn().execute("SELECT seq FROM sqlite_sequence WHERE name = 'items'").fetchone()
+        return (row[0] if row else 0) + 1
+
+    def all(self) -> list:
+        return list(self.iter_after(0))
+
+    def iter_after(self, after: int = 0):
+        # walk the table in id order a batch at a time (no long-lived cursor)
+        conn = self._conn()
+        while True:
+            rows = conn.execute(_PAGE, (after, _ITER_BATCH)).fetchall()
+            for row in rows:
+                yield _row_to_item(row)
+            if len(rows) < _ITER_BATCH:
+                return
+            after = rows[-1][0]
+
+    def page(self, after: int = 0, limit: int = 100):
+        rows = self._conn().execute(_PAGE, (after, limit + 1)).fetchall()
+        items = [_row_to_item(r) for r in rows[:limit]]
+        next_after = items[-1]["id"] if len(rows) > limit else None
+        return items, next_after
+
+    def get(self, item_id: int):
+        return _row_to_item(self._conn().execute(_GET, (item_id,)).fetchone())
+
+    def get_by_barcode(self, barcode):
+        return _row_to_item(self._conn().execute(_GET_BY_BARCODE, (_barcode_key(barcode),)).fetchone())
+
+    def search(self, query: str, limit: int = 20) -> list:
+        # every query token must match, as a prefix; best matches first
+        terms = dict.fromkeys(tokenize(query))
+        if not terms:
+            return []
+        # tokens are letters/digits only, so quoting them is safe
+        match = " ".join(f'"{term}"*' for term in terms)
+        return [_row_to_item(r) for r in self._conn().execute(_SEARCH, (match, limit)).fetchall()]
+
+    def low_stock(self, limit: int = 50) -> list:
+        # items at or below their reorder level, furthest below first
+        return [_row_to_item(r) for r in self._conn().execute(_LOW_STOCK, (limit,)).fetchall()]
+
+    def version(self):
+        # (store version, time of the last write)
+        return tuple(self._conn().execute("SELECT version, modified FROM store_version").fetchone())
+
+    def item_version(self, item_id):
+        # (version, modified) of one item, or None if there is no such item
+        row = self._conn().execute("SELECT version, modified FROM item_versions WHERE id = ?", (item_id,)).fetchone()
+        return None if row is None else tuple(row)
+
+    # writes
+
+    def _duplicate(self, conn, barcode):
+        row = conn.execute(_OWNER, (_barcode_key(barcode),)).fetchone()
+        return DuplicateBarcodeError(barcode, row[0] if row else None)
+
+    def create(self, fields: dict) -> dict:
+        conn = self._conn()
+        try:
+            item = _row_to_item(_one(conn.execute(_INSERT, _split(fields))))
+        except sqlite3.IntegrityError:
+            raise self._duplicate(conn, fields.get("barcode")) from None
+        self._notify("create", item["id"], item)
+        return item
+
+    def upsert(self, fields: dict, keep=()):
+        def txn(conn):
+            row = conn.execute(_OWNER, (_barcode_key(fields.get("barcode")),)).fetchone()
+            if row is None:
+                return _row_to_item(_one(conn.execute(_INSERT, _split(fields)))), True
+            return self._update_in(conn, row[0], _without(fields, keep)), False
+
+        item, created = self._write(self._conn(), txn)
+        self._notify("create" if created else "update", item["id"], item)
+        return item, created
+
+    def create_many(self, rows, upsert: bool = False, keep=None) -> list:
+        # same contract as ItemStore.create_many; one transaction per batch
+        def txn(conn):
+            results = []
+            for fields, row_keep in zip(rows, keep or itertools.repeat(())):
+                row = conn.execute(_OWNER, (_barcode_key(fields.get("barcode")),)).fetchone() if upsert else None
+                try:
+                    if row is None:
+                        results.append((_row_to_item(_one(conn.execute(_INSERT, _split(fields)))), True))
+                    else:
+                        results.append((self._update_in(conn, row[0], _without(fields, row_keep)), False))
+                except sqlite3.IntegrityError:
+                    # only this statement is rolled back, the batch carries on
+                    results.append(self._duplicate(conn, fields.get("barcode")))
+            return results
+
+        results = self._write(self._conn(), txn)
+        for result in results:
+            if isinstance(result, tuple):
+                item, created = result
+                self._notify("create" if created else "update", item["id"], item)
+        return results
+
+    def _update_in(self, conn, item_id, fields):
+        current = _row_to_item(conn.execute(_GET, (item_id,)).fetchone())
+        if current is None:
+            return None
+        current.update(fields)
+        try:
+            return _row_to_item(_one(conn.execute(_UPDATE, _split(current) + (item_id,))))
+        except sqlite3.IntegrityError:
+            raise self._duplicate(conn, fields.get("barcode")) from None
+
+    def update(self, item_id: int, fields: dict):
+        item = self._write(self._conn(), lambda conn: self._update_in(conn, item_id, fields))
+        if item is not None:
+            self._notify("update", item_id, item)
+        return item
+
+    def delete(self, item_id: int) -> bool:
+        deleted = self._conn().execute(_DELETE, (item_id,)).rowcount > 0
+        if deleted:
+            self._notify("delete", item_id, None)
+        return deleted
+
+    def restock(self, item_id: int, delta: int):
+        item = _row_to_item(_one(self._conn().execute(_RESTOCK, (delta, item_id))))
+        if item is not None:
+            self._notify("restock", item_id, item)
+        return item
+
+    def deduct(self, item_id: int, delta: int):
+        item = _row_to_item(_one(self._conn().execute(_DEDUCT, (delta, item_id))))
+        if item is not None:
+            self._notify("deduct", item_id, item)
+        return item
+
+    def apply_movements(self, movements, atomic: bool = False) -> list:
+        # same contract as ItemStore.apply_movements; the whole batch is one
+        # transaction (one commit instead of one per movement)
+        def txn(conn):
+            items = []
+            for op, item_id, delta in movements:
+                sql = _RESTOCK if op == "restock" else _DEDUCT
+                items.append(_row_to_item(_one(conn.execute(sql, (delta, item_id)))))
+            if atomic:
+                missing = sorted({m[1] for m, item in zip(movements, items) if item is None})
+                if missing:
+                    # rolls the whole batch back
+                    raise ItemNotFoundError(missing)
+            return items
+
+        items = self._write(self._conn(), txn)
+        for (op, item_id, _), item in zip(movements, items):
+            if item is not None:
+                self._notify(op, item_id, item)
+        return items
+
+    def clear(self):
+        # drop every item and restart ids at 1 (used by tests/benchmarks)
+        def txn(conn):
+            # one "clear" change instead of a delete per item
+            row = conn.execute(_LATEST_CHANGE).fetchone()
+            conn.execute("DELETE FROM items")
+            conn.execute("DELETE FROM sqlite_sequence WHERE name = 'items'")
+            conn.execute("DELETE FROM changes WHERE seq > ?", (row[0] if row else 0,))
+            conn.execute(f"INSERT INTO changes (op, ts) VALUES ('clear', {_NOW})")
+
+        self._write(self._conn(), txn)
+        self._notify("clear", None, None)
+
+    # stock holds, same contract as holds.Reservations
+
+    def expire_holds(self) -> int:
+        count = self._conn().execute(_EXPIRE_HOLDS, (self._clock(),)).rowcount
+        self.expired += count
+        return count
+
+    def reserve(self, item_id: int, quantity: int, ttl: float):
+        def txn(conn):
+            now = self._clock()
+            expired = conn.execute(_EXPIRE_HOLDS, (now,)).rowcount
+            row = conn.execute(_AVAILABILITY, (now, item_id)).fetchone()
+            if row is None:
+                return expired, None
+            available = max(row[1] - row[2], 0)
+            if quantity > available:
+                raise InsufficientStockError(item_id, quantity, available)
+            return expired, _row_to_hold(_one(conn.execute(_INSERT_HOLD, (item_id, quantity, now + ttl))))
+
+        # expired holds only count once their delete is committed (a refused
+        # hold rolls it back, and the next call deletes them again)
+        expired, hold = self._write(self._conn(), txn)
+        self.expired += expired
+        return hold
+
+    def get_hold(self, hold_id: int):
+        return _row_to_hold(self._conn().execute(_GET_HOLD, (hold_id, self._clock())).fetchone())
+
+    def availability(self, item_id: int):
+        row = self._conn().execute(_AVAILABILITY, (self._clock(), item_id)).fetchone()
+        return None if row is None else availability({"id": row[0], "product_quantity": row[1]}, row[2])
+
+    def commit_hold(self, hold_id: int):
+        # dropping the hold and deducting its units is one transaction
+        def txn(conn):
+            hold = _row_to_hold(_one(conn.execute(_TAKE_HOLD, (hold_id, self._clock()))))
+            if hold is None:
+                return None
+            return hold, _row_to_item(_one(conn.execute(_DEDUCT, (hold["quantity"], hold["item_id"]))))
+
+        result = self._write(self._conn(), txn)
+        if result is None or result[1] is None:
+            return None
+        hold, item = result
+        self._notify("deduct", item["id"], item)
+        return hold, item
+
+    def release_hold(self, hold_id: int):
+        return _row_to_hold(_one(self._conn().execute(_TAKE_HOLD, (hold_id, self._clock()))))
+
+    def hold_stats(self) -> dict:
+        active, reserved = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(quantity), 0) FROM holds WHERE expires_at > ?", (self._clock(),)
+        ).fetchone()
+        return {"active": active, "reserved": reserved, "expired": self.expired}
+
+    # change feed, same contract as changes.ChangeLog
+
+    def latest_change(self) -> int:
+        row = self._conn().execute(_LATEST_CHANGE).fetchone()
+        return row[0] if row else 0
+
+    def changes_since(self, seq: int, limit: int = 1000) -> list:
+        conn = self._conn()
+        # one read transaction, so pruning can't slip in between the checks
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute(_LATEST_CHANGE).fetchone()
+            latest = row[0] if row else 0
+            if seq > latest:
+                raise ChangesGone(latest + 1, latest)
+            oldest = conn.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+            if oldest is not None and seq < oldest - 1:
+                raise ChangesGone(oldest, latest)
+            rows = conn.execute(_CHANGES_SINCE, (seq, limit)).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        events = []
+        for change_seq, op, item_id, *columns, ts in rows:
+            item = _row_to_item((item_id, *columns)) if op not in ("delete", "clear") else None
+            events.append({"seq": change_seq, "op": op, "id": item_id, "item": item, "ts": ts})
+        return events
+
+    def wait_for_change(self, seq: int, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while self.latest_change() <= seq:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+                self._changed.wait(min(left, _CHANGES_POLL))
+        return True
+
+    def change_stats(self) -> dict:
+        conn = self._conn()
+        oldest, buffered = conn.execute("SELECT MIN(seq), COUNT(*) FROM changes").fetchone()
+        latest = self.latest_change()
+        keep = conn.execute("SELECT keep FROM changes_size").fetchone()[0]
+        return {"latest": latest, "oldest": latest + 1 if oldest is None else oldest,
+                "buffered": buffered, "maxlen": keep}
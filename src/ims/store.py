@@ -0,0 +1,340 @@
+# Inventory item store
+#
+# id -> item dict. Python dicts keep insertion order, so list_items stays
+# stable (oldest first) without a separate list, while get/update/delete by
+# id are O(1) instead of walking every item.
+#
+# A secondary barcode -> id index is kept in sync on every mutation so
+# barcodes stay unique and scan lookups are O(1) too.
+#
+# Ids only ever increase, so a sorted list of ids doubles as a keyset cursor
+# index: bisect finds the first id after a cursor in O(log n). Deleted ids are
+# left in that list and skipped, and the list is rebuilt once more than half of
+# it is stale.
+#
+# Listeners (e.g. the write-ahead log in persistence.py) are called after every
+# mutation with (op, item_id, item), where op is one of "create", "update",
+# "restock", "deduct", "delete" or "clear" and item is None for the last two.
+# A listener may return a callable; it runs once the store's locks are
+# released (the WAL uses this to wait for its fsync without blocking others).
+#
+# Thread safety: items are copy-on-write. A mutation builds a new dict and
+# swaps it in, so readers never lock and never see a half-applied change, and
+# callers must treat returned items as read-only. Writers are serialized by
+#   - a striped per-item lock for restock/deduct (read-modify-write of one item)
+#   - one store lock for anything touching the indexes or allocating ids
+#     (create/update/delete/upsert); it is always taken before a stripe lock
+
+import itertools
+import threading
+from bisect import bisect_left, bisect_right
+
+# don't bother compacting the id list below this many stale entries
+_COMPACT_MIN = 1024
+# number of per-item lock stripes
+_STRIPES = 64
+
+
+class DuplicateBarcodeError(ValueError):
+    # raised when a create/update would give two items the same barcode
+
+    def __init__(self, barcode, item_id):
+        super().__init__(f"barcode {barcode!r} already used by item {item_id}")
+        self.barcode = barcode
+        self.item_id = item_id
+
+
+class ItemNotFoundError(LookupError):
+    # raised by all-or-nothing batch operations when some ids don't exist
+
+    def __init__(self, item_ids):
+        super().__init__(f"items not found: {item_ids}")
+        self.item_ids = item_ids
+
+
+def _barcode_key(barcode):
+    # barcodes may arrive as JSON numbers or strings; index them as strings
+    return None if barcode is None else str(barcode)
+
+
+def _without(fields, keys):
+    # fields minus keys (an upsert's update leaves those alone)
+    return {k: v for k, v in fields.items() if k not in keys} if keys else fields
+
+
+class ItemStore:
+
+    # container for the id list; CompactItemStore swaps in an int array
+    _order_type = list
+
+    def __init__(self):
+        self._items = {}
+        # barcode (str) -> id
+        self._by_barcode = {}
+        # ascending ids (may contain deleted ones) for cursor pagination
+        self._order = self._order_type()
+        self._stale = 0
+        # auto-increment id for new items, only advanced under _lock
+        self._next_id = 1
+        self._listeners = []
+        self._lock = threading.RLock()
+        self._stripes = [threading.Lock() for _ in range(_STRIPES)]
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        # items in insertion (= id) order
+        return self.iter_after(0)
+
+    def __contains__(self, item_id):
+        return item_id in self._items
+
+    @property
+    def next_id(self) -> int:
+        return self._next_id
+
+    def add_listener(self, fn):
+        # fn(op, item_id, item) runs after every mutation, under the store's locks
+        self._listeners.append(fn)
+
+    def _notify(self, op, item_id, item):
+        # returns the follow-up callables listeners handed back
+        followups = []
+        for fn in self._listeners:
+            followup = fn(op, item_id, item)
+            if followup is not None:
+                followups.append(followup)
+        return followups
+
+    @staticmethod
+    def _finish(followups, result):
+        # run listener follow-ups outside the locks, then return result
+        for followup in followups:
+            followup()
+        return result
+
+    def _stripe(self, item_id):
+        return self._stripes[item_id % _STRIPES]
+
+    def _allocate_id(self) -> int:
+        # caller holds _lock
+        item_id = self._next_id
+        self._next_id += 1
+        return item_id
+
+    def all(self) -> list:
+        return list(self.iter_after(0))
+
+    def iter_after(self, after: int = 0):
+        # yield items with id > after, in id order
+        # holds on to the current id list, so a compaction mid-iteration is safe
+        order = self._order
+        i = bisect_right(order, after)
+        while i < len(order):
+            item = self._items.get(order[i])
+            i += 1
+            if item is not None:
+                yield item
+
+    def page(self, after: int = 0, limit: int = 100):
+        # one page of items after the cursor
+        # returns (items, next_after); next_after is None on the last page
+        items = []
+        for item in self.iter_after(after):
+            if len(items) == limit:
+                return items, items[-1]["id"]
+            items.append(item)
+        return items, None
+
+    def get(self, item_id: int):
+        # returns None if not found
+        return self._items.get(item_id)
+
+    def get_by_barcode(self, barcode):
+        item_id = self._by_barcode.get(_barcode_key(barcode))
+        return None if item_id is None else self._items.get(item_id)
+
+    def _check_barcode(self, barcode, item_id=None):
+        # raise if barcode belongs to an item other than item_id
+        owner = self._by_barcode.get(_barcode_key(barcode))
+        if owner is not None and owner != item_id:
+            raise DuplicateBarcodeError(barcode, owner)
+
+    def _create(self, fields):
+        # caller holds _lock; returns (item, followups)
+        self._check_barcode(fields.get("barcode"))
+        item_id = self._allocate_id()
+        item = {"id": item_id, **fields}
+        # hold the new item's stripe too, so a restock racing in right after
+        # the insert can't notify listeners before this create does
+        with self._stripe(item_id):
+            self._items[item_id] = item
+            self._order.append(item_id)
+            key = _barcode_key(item.get("barcode"))
+            if key is not None:
+                self._by_barcode[key] = item_id
+            return item, self._notify("create", item_id, item)
+
+    def _update(self, item_id, fields):
+        # caller holds _lock; returns (item or None, followups)
+        with self._stripe(item_id):
+            old = self._items.get(item_id)
+            if old is None:
+                return None, []
+            item = {**old, **fields, "id": item_id}
+            if "barcode" in fields:
+                self._check_barcode(fields["barcode"], item_id)
+                old_key = _barcode_key(old.get("barcode"))
+                new_key = _barcode_key(item["barcode"])
+                if old_key != new_key:
+                    self._by_barcode.pop(old_key, None)
+                    if new_key is not None:
+                        self._by_barcode[new_key] = item_id
+            self._items[item_id] = item
+            return item, self._notify("update", item_id, item)
+
+    def create(self, fields: dict) -> dict:
+        # assigns the next id; id is always the first key in the item
+        # raises DuplicateBarcodeError if the barcode is already taken
+        with self._lock:
+            item, followups = self._create(fields)
+        return self._finish(followups, item)
+
+    def upsert(self, fields: dict, keep=()):
+        # create, or update the item that already has this barcode
+        # keys in keep are only set on create: an existing item keeps its own
+        # (e.g. product_quantity when the client didn't send one)
+        # returns (item, created)
+        with self._lock:
+            existing = self.get_by_barcode(fields.get("barcode"))
+            if existing is None:
+                item, followups = self._create(fields)
+            else:
+                item, followups = self._update(existing["id"], _without(fields, keep))
+        return self._finish(followups, (item, existing is None))
+
+    def create_many(self, rows, upsert: bool = False, keep=None) -> list:
+        # create (or upsert) a batch of items under one lock acquisition, with
+        # listener follow-ups run once at the end (one WAL group commit)
+        # keep: optional list with upsert's keep for each row
+        # returns per row either (item, created) or the DuplicateBarcodeError hit
+        results, followups = [], []
+        with self._lock:
+            for fields, row_keep in zip(rows, keep or itertools.repeat(())):
+                existing = self.get_by_barcode(fields.get("barcode")) if upsert else None
+                try:
+                    if existing is None:
+                        item, more = self._create(fields)
+                    else:
+                        item, more = self._update(existing["id"], _without(fields, row_keep))
+                except DuplicateBarcodeError as err:
+                    results.append(err)
+                    continue
+                results.append((item, existing is None))
+                followups.extend(more)
+        return self._finish(followups, results)
+
+    def update(self, item_id: int, fields: dict):
+        with self._lock:
+            item, followups = self._update(item_id, fields)
+        return self._finish(followups, item)
+
+    def delete(self, item_id: int) -> bool:
+        with self._lock, self._stripe(item_id):
+            item = self._items.pop(item_id, None)
+            if item is None:
+                return False
+            self._by_barcode.pop(_barcode_key(item.get("barcode")), None)
+            self._stale += 1
+            if self._stale > _COMPACT_MIN and self._stale * 2 > len(self._order):
+                # new list rather than in-place so running iterators aren't affected
+                self._order = self._order_type(i for i in self._order if i in self._items)
+                self._stale = 0
+            followups = self._notify("delete", item_id, None)
+        return self._finish(followups, True)
+
+    def _adjust(self, op, item_id, delta):
+        # atomic read-modify-write of product_quantity under the item's stripe
+        # returns (item or None, followups)
+        with self._stripe(item_id):
+            old = self._items.get(item_id)
+            if old is None:
+                return None, []
+            new_qty = int(old.get("product_quantity", 0)) + delta
+            # clamp at 0 so quantity is never negative
+            item = {**old, "product_quantity": new_qty if new_qty > 0 else 0}
+            self._items[item_id] = item
+            return item, self._notify(op, item_id, item)
+
+    def restock(self, item_id: int, delta: int):
+        item, followups = self._adjust("restock", item_id, delta)
+        return self._finish(followups, item)
+
+    def deduct(self, item_id: int, delta: int):
+        item, followups = self._adjust("deduct", item_id, -delta)
+        return self._finish(followups, item)
+
+    def apply_movements(self, movements, atomic: bool = False) -> list:
+        # apply [(op, item_id, delta), ...] with op "restock" or "deduct" in one
+        # pass; returns the resulting item (None if missing) per movement.
+        # atomic: raise ItemNotFoundError and apply nothing if any id is missing.
+        # Listener follow-ups (WAL fsync waits) run once at the end, so the whole
+        # batch shares a group commit.
+        items, followups = [], []
+        with self._lock:
+            # holding _lock keeps items from being deleted mid-batch
+            if atomic:
+                missing = sorted({item_id for _, item_id, _ in movements if item_id not in self._items})
+                if missing:
+                    raise ItemNotFoundError(missing)
+            for op, item_id, delta in movements:
+                item, more = self._adjust(op, item_id, delta if op == "restock" else -delta)
+                items.append(item)
+                followups.extend(more)
+        return self._finish(followups, items)
+
+    def clear(self):
+        # drop every item and restart ids at 1 (used by tests/benchmarks)
+        with self._lock:
+            self._items.clear()
+            self._by_barcode.clear()
+            self._order = self._order_type()
+            self._stale = 0
+            self._next_id = 1
+            followups = self._notify("clear", None, None)
+        self._finish(followups, None)
+
+    # replay helpers (used when loading persisted state, no listeners fire)
+
+    def restore(self, item: dict):
+        # insert or replace an item keeping its id
+        with self._lock:
+            item_id = item["id"]
+            old = self._items.get(item_id)
+            if old is not None:
+                self._by_barcode.pop(_barcode_key(old.get("barcode")), None)
+            elif not self._order or item_id > self._order[-1]:
+                self._order.append(item_id)
+            else:
+                # out of order (fuzzy snapshot + log replay); the id may still be
+                # in the list as a stale entry
+                i = bisect_left(self._order, item_id)
+                if self._order[i] != item_id:
+                    self._order.insert(i, item_id)
+            self._items[item_id] = item
+            key = _barcode_key(item.get("barcode"))
+            if key is not None:
+                self._by_barcode[key] = item_id
+            self.bump_next_id(item_id + 1)
+
+    def bump_next_id(self, next_id: int):
+        # ids are never reused, even for items deleted before a restart
+        with self._lock:
+            if next_id > self._next_id:
+                self._next_id = next_id
+
+    def snapshot_items(self):
+        # every item in id order; items are never modified in place, so these
+        # can be serialized while the store keeps changing
+        return self.iter_after(0)
@@ -0,0 +1,159 @@
+# Shared HTTP client for upstream APIs (OpenFoodFacts)
+#
+# One requests.Session per upstream, so connections are pooled and kept alive
+# instead of paying a fresh TCP + TLS handshake on every call. The session's
+# adapter sets:
+#   - pool_maxsize: connections kept per host (urllib3 keeps one pool per host);
+#     with pool_block=True it is also a hard cap on concurrent requests per host
+#   - retries with exponential backoff for connection errors, read errors and
+#     429/5xx answers (GET only, honouring Retry-After)
+#
+# An optional CircuitBreaker (breaker.py) sees every call's outcome and
+# latency, and makes get() fail fast with CircuitOpenError while it's open.
+# An optional on_call(seconds, status) callback sees them too (metrics);
+# status is the HTTP status code, or "error" when the request raised.
+#
+# SingleFlight puts those calls on a bounded executor with request coalescing,
+# see below.
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class UpstreamClient:
+
+    def __init__(self, base_url: str, timeout: float = 5, pool_connections: int = 4, pool_maxsize: int = 10,
+                 pool_block: bool = False, retries: int = 2, backoff_factor: float = 0.3,
+                 user_agent: str = "ims-lab/0.1", breaker=None, on_call=None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.breaker = breaker
+        self.on_call = on_call
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=_RETRY_STATUSES,
+            allowed_methods=frozenset({"GET"}),
+            # hand the last response back instead of raising, callers check status
+            raise_on_status=False,
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(
+            # number of hosts to keep pools for, and connections per host
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = user_agent
+
+    def url(self, path: str) -> str:
+        # absolute URLs pass through, paths are joined to base_url
+        if path.startswith(("http://", "https://")):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def get(self, path: str):
+        # raises requests exceptions on network failure (after retries), and
+        # CircuitOpenError without trying while the breaker is open
+        if self.breaker is None and self.on_call is None:
+            return self.session.get(self.url(path), timeout=self.timeout)
+        if self.breaker is not None:
+            self.breaker.before_call()
+        start = time.monotonic()
+        try:
+            resp = self.session.get(self.url(path), timeout=self.timeout)
+        except Exception:
+            self._record(False, time.monotonic() - start, "error")
+            raise
+        self._record(resp.status_code not in _RETRY_STATUSES, time.monotonic() - start, resp.status_code)
+        return resp
+
+    def _record(self, ok, elapsed, status):
+        if self.breaker is not None:
+            self.breaker.record(ok, elapsed)
+        if self.on_call is not None:
+            self.on_call(elapsed, status)
+
+    def close(self):
+        self.session.close()
+
+
+class UpstreamBusy(Exception):
+    # raised by SingleFlight.submit when too many upstream calls are pending
+    pass
+
+
+class SingleFlight:
+
+    # Runs upstream calls on an executor, coalescing concurrent calls for the
+    # same key: while a call for "3017620422003" is in flight, every other
+    # caller asking for it gets the same Future instead of a second request.
+    # At most max_pending distinct calls may be queued/running; beyond that
+    # submit() raises UpstreamBusy right away so request threads fail fast
+    # instead of piling up behind a slow upstream. Batches pass a timeout to
+    # wait (that long at most) for a slot instead.
+
+    def __init__(self, executor, max_pending: int = 64):
+        self._executor = executor
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        # notified whenever a call finishes and frees a slot
+        self._freed = threading.Condition(self._lock)
+        # key -> Future of the call in flight
+        self._inflight = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    def submit(self, key, fn, *args, timeout: float = 0):
+        # timeout: seconds to wait for a free slot before giving up
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                future = self._inflight.get(key)
+                # a finished call may not have been forgotten yet (done callbacks
+                # run after waiters wake up); it's stale either way
+                if future is not None and not future.done():
+                    self.coalesced += 1
+                    return future
+                if len(self._inflight) < self.max_pending:
+                    break
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    self.rejected += 1
+                    raise UpstreamBusy(key)
+                self._freed.wait(left)
+            future = self._executor.submit(fn, *args)
+            self._inflight[key] = future
+            self.calls += 1
+        future.add_done_callback(lambda f: self._forget(key, f))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+                self._freed.notify()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._inflight),
+                "max_pending": self.max_pending,
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "rejected": self.rejected,
+            }
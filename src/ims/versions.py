@@ -0,0 +1,64 @@
+# Change versions for conditional GETs
+#
+# Every write to the store bumps one counter, the store version; an item's
+# version is the store version of the last write to it. Together with an epoch
+# (random per process, since the counter restarts with it) they make the ETags
+# of /api/items and /api/items/<id>, so a client whose copy is still current
+# gets a 304 without the server reading or encoding any item.
+#
+# Kept up to date as a store listener, like search.py. Only items written since
+# attach() have an entry; older ones are at version 0, modified at attach time.
+# The SQLite backend keeps the same counters in the database, bumped by
+# triggers (sqlite_store.py), so all worker processes agree on them.
+#
+# Read the version before the data it describes: a write in between then
+# leaves an old ETag on new data (the next request just gets a 200), never the
+# other way round.
+
+import secrets
+import threading
+import time
+
+
+class ItemVersions:
+
+    def __init__(self, clock=time.time):
+        self.epoch = secrets.token_hex(4)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._version = 0
+        self._started = self._modified = clock()
+        # item id -> (version, modified) of its last write
+        self._items = {}
+        self._store = None
+
+    def attach(self, store):
+        self._store = store
+        store.add_listener(self._on_mutation)
+        return self
+
+    def _on_mutation(self, op, item_id, item):
+        with self._lock:
+            self._version += 1
+            self._modified = self._clock()
+            if op == "clear":
+                self._items.clear()
+            elif op == "delete":
+                self._items.pop(item_id, None)
+            else:
+                self._items[item_id] = (self._version, self._modified)
+
+    def version(self):
+        # (store version, time of the last write)
+        with self._lock:
+            return self._version, self._modified
+
+    def item_version(self, item_id):
+        # (version, modified) of one item, or None if there is no such item
+        entry = self._items.get(item_id)
+        if entry is not None:
+            return entry
+        if item_id not in self._store:
+            return None
+        # written before attach(), or in between the two lookups
+        return self._items.get(item_id, (0, self._started))
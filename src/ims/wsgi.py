@@ -0,0 +1,150 @@
+# Production entry point: app factory + multi-process launcher
+#
+#   python -m ims.wsgi --workers 4 --port 5555        # N processes, one shared socket
+#   gunicorn -w 4 "ims.wsgi:create_app(store='sqlite')"
+#
+# server.py builds the app and its state (store, caches, upstream client) at
+# import, from IMS_* env vars. create_app() applies its settings as those env
+# vars and then imports it, so it has to run in the process that serves, after
+# any fork: every worker gets its own connections, thread pools and caches.
+#
+# It is not a full app factory: there is one app per process (server.app,
+# module globals), so create_app() always returns that same app. Calling it
+# again with different settings once the app exists raises RuntimeError;
+# tests that need another store monkeypatch server._STORE instead.
+#
+# The launcher binds the listening socket once, then forks the workers, which
+# all accept() on it (the kernel hands each connection to one of them) and
+# serve it with werkzeug's threaded server. Workers that die are restarted;
+# SIGINT/SIGTERM stop them all.
+#
+# Workers share nothing in memory, so with more than one worker the store has
+# to be the SQLite one (the default here): every worker reads and writes the
+# same database file, ETag versions, stock holds and the change feed live in
+# it too (see sqlite_store.py), and IMS_OFF_DISK_CACHE shares OpenFoodFacts
+# lookups. The memory stores would give every worker its own inventory, so
+# the launcher refuses them.
+# /api/metrics and /api/cache/stats describe the worker that answered.
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+
+def create_app(**settings):
+    # settings are IMS_* env overrides: create_app(store="sqlite",
+    # sqlite_path="ims.sqlite3") sets IMS_STORE and IMS_SQLITE_PATH.
+    # Returns the process' one app (see above)
+    env = {f"IMS_{key.upper()}": str(value) for key, value in settings.items()}
+    if "ims.server" in sys.modules:
+        changed = [key for key, value in env.items() if os.environ.get(key) != value]
+        if changed:
+            raise RuntimeError(f"app already created, can't change {', '.join(sorted(changed))}")
+    os.environ.update(env)
+    from ims import server
+    return server.app
+
+
+def _listen(host, port, backlog=1024):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _worker(sock, host, port, settings, access_log):
+    # child: serve on the inherited socket until told to stop
+    from werkzeug.serving import make_server
+
+    if not access_log:
+        # werkzeug logs every request at INFO
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        app = create_app(**settings)
+        make_server(host, port, app, threaded=True, fd=sock.fileno()).serve_forever()
+    finally:
+        os._exit(1)
+
+
+def serve(host="127.0.0.1", port=5555, workers=None, access_log=False, **settings):
+    # blocks until SIGINT/SIGTERM; settings as for create_app()
+    workers = workers or os.cpu_count() or 1
+    settings.setdefault("store", os.environ.get("IMS_STORE", "sqlite"))
+    if workers > 1 and settings["store"] != "sqlite":
+        raise SystemExit(f"--workers {workers} needs the sqlite store (every worker would have its own "
+                         f"{settings['store']} inventory)")
+    if settings["store"] == "sqlite":
+        # create the schema once up front instead of in every worker at the same time
+        from ims.sqlite_store import SQLiteItemStore
+        SQLiteItemStore(settings.get("sqlite_path", os.environ.get("IMS_SQLITE_PATH", "ims.sqlite3"))).close()
+
+    sock = _listen(host, port)
+    children = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            _worker(sock, host, port, settings, access_log)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for _ in range(workers):
+        spawn()
+    print(f" * ims: {workers} worker(s) on http://{host}:{sock.getsockname()[1]} (store={settings['store']})",
+          flush=True)
+
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = children.pop(pid, None)
+        if started is not None and not stopping:
+            # don't spin if workers die right at startup (bad config...)
+            if time.monotonic() - started < 1:
+                time.sleep(1)
+            spawn()
+    sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m ims.wsgi", description="Serve the inventory API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--store", choices=["sqlite", "memory", "compact"], help="default: IMS_STORE or sqlite")
+    parser.add_argument("--sqlite-path", help="database file (default: IMS_SQLITE_PATH or ims.sqlite3)")
+    parser.add_argument("--access-log", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    settings = {}
+    if args.store:
+        settings["store"] = args.store
+    if args.sqlite_path:
+        settings["sqlite_path"] = args.sqlite_path
+    serve(args.host, args.port, args.workers, args.access_log, **settings)
+
+
+if __name__ == "__main__":
+    main()
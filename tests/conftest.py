@@ -0,0 +1,15 @@
+import pytest
+
+from ims import server
+
+# the API keeps its state in module globals; start every test from an empty
+# store, a cold OpenFoodFacts cache and a closed circuit breaker
+@pytest.fixture(autouse=True)
+def _reset_store():
+    server._STORE.clear()
+    server._OFF_CACHE.clear()
+    server._OFF_BREAKER.reset()
+    yield
+    server._STORE.clear()
+    server._OFF_CACHE.clear()
+    server._OFF_BREAKER.reset()
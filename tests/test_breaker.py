@@ -0,0 +1,58 @@
+import pytest
+
+from ims.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+def _breaker(clock, **kwargs):
+    options = dict(failure_rate=0.5, min_calls=4, window=4, slow_call=1.0, open_for=30, clock=clock)
+    options.update(kwargs)
+    return CircuitBreaker(**options)
+
+def test_opens_on_failure_rate():
+    breaker = _breaker(_FakeClock())
+    for ok in (True, False, True):
+        breaker.before_call()
+        breaker.record(ok)
+    # 1 of 3 failed and min_calls not reached yet
+    assert breaker.state == CLOSED
+    breaker.before_call()
+    breaker.record(False)
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpenError) as err:
+        breaker.before_call()
+    assert err.value.retry_after == 30
+    assert breaker.stats()["rejected"] == 1
+
+def test_slow_calls_count_as_failures():
+    breaker = _breaker(_FakeClock())
+    for _ in range(4):
+        breaker.record(True, elapsed=1.5)
+    assert breaker.state == OPEN
+
+def test_half_open_probe_closes_or_reopens():
+    clock = _FakeClock()
+    breaker = _breaker(clock)
+    for _ in range(4):
+        breaker.record(False)
+    clock.now += 30
+    assert breaker.state == HALF_OPEN
+
+    # one probe at a time
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert breaker.stats()["opened"] == 2
+
+    clock.now += 30
+    breaker.before_call()
+    breaker.record(True)
+    assert breaker.state == CLOSED
+    breaker.before_call()
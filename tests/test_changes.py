@@ -0,0 +1,161 @@
+import json
+import threading
+import time
+
+import pytest
+
+from ims import server
+from ims.changes import ChangeLog, ChangesGone
+from ims.server import app
+from ims.sqlite_store import SQLiteItemStore
+from ims.store import ItemStore
+
+def test_change_log_ring_buffer():
+    store = ItemStore()
+    log = ChangeLog(maxlen=3).attach(store)
+    item = store.create({"product_name": "Beans", "barcode": "CHG-0"})
+    store.restock(item["id"], 2)
+
+    events = log.changes_since(0)
+    assert [(e["seq"], e["op"]) for e in events] == [(1, "create"), (2, "restock")]
+    assert events[1]["item"]["product_quantity"] == 2
+    assert log.changes_since(2) == []
+
+    # only the last 3 events are kept
+    for _ in range(3):
+        store.deduct(item["id"], 1)
+    assert [e["seq"] for e in log.changes_since(2)] == [3, 4, 5]
+    with pytest.raises(ChangesGone) as err:
+        log.changes_since(1)
+    assert (err.value.oldest, err.value.latest) == (3, 5)
+
+def test_change_log_wait_wakes_up_on_write():
+    store = ItemStore()
+    log = ChangeLog().attach(store)
+    assert log.wait_for_change(0, 0.01) is False
+
+    timer = threading.Timer(0.05, store.create, [{"product_name": "Late", "barcode": "CHG-LATE"}])
+    timer.start()
+    assert log.wait_for_change(0, 5) is True
+    timer.join()
+
+def test_changes_endpoint_follows_writes():
+    client = app.test_client()
+    cursor = client.get("/api/changes").get_json()["next"]
+
+    item = client.post("/api/items", json={"product_name": "Beans", "barcode": "CHG-1"}).get_json()
+    client.post(f"/api/items/{item['id']}/deduct", json={"delta": 1})
+    client.delete(f"/api/items/{item['id']}")
+
+    body = client.get(f"/api/changes?since={cursor}").get_json()
+    assert [(e["op"], e["id"]) for e in body["events"]] == [
+        ("create", item["id"]), ("deduct", item["id"]), ("delete", item["id"])]
+    assert body["events"][2]["item"] is None
+    assert body["next"] == cursor + 3
+    assert client.get(f"/api/changes?since={body['next']}").get_json() == {"events": [], "next": body["next"]}
+
+    # the listing tells where to pick up the feed
+    assert client.get("/api/items").headers["X-Change-Seq"] == str(body["next"])
+
+def test_changes_long_poll_returns_on_first_write():
+    client = app.test_client()
+    cursor = server._CHANGES.latest_change()
+    timer = threading.Timer(0.05, server._STORE.create, [{"product_name": "Late", "barcode": "CHG-POLL"}])
+    timer.start()
+
+    start = time.monotonic()
+    body = client.get(f"/api/changes?since={cursor}&wait=10").get_json()
+    timer.join()
+    assert time.monotonic() - start < 5
+    assert [e["op"] for e in body["events"]] == ["create"]
+
+def test_changes_gone_and_bad_params(monkeypatch):
+    client = app.test_client()
+    monkeypatch.setattr(server, "_CHANGES", ChangeLog(maxlen=2).attach(ItemStore()))
+    assert client.get("/api/changes?since=abc").status_code == 400
+    assert client.get("/api/changes?since=0&wait=soon").status_code == 400
+    # a cursor ahead of the log (server restarted) can't be served either
+    resp = client.get("/api/changes?since=5")
+    assert resp.status_code == 410
+    assert resp.get_json()["latest"] == 0
+
+def test_changes_stream_sends_sse_events():
+    client = app.test_client()
+    cursor = server._CHANGES.latest_change()
+    item = client.post("/api/items", json={"product_name": "Beans", "barcode": "CHG-SSE"}).get_json()
+    client.post(f"/api/items/{item['id']}/restock", json={"delta": 4})
+
+    resp = client.get(f"/api/changes/stream?since={cursor}")
+    assert resp.mimetype == "text/event-stream"
+    chunks = (chunk.decode() for chunk in resp.response)
+    assert next(chunks).startswith("retry:")
+    first, second = next(chunks), next(chunks)
+    resp.close()
+
+    assert first.startswith(f"id: {cursor + 1}\nevent: create\n")
+    lines = second.strip().split("\n")
+    assert lines[:2] == [f"id: {cursor + 2}", "event: restock"]
+    assert json.loads(lines[2][len("data: "):])["item"]["product_quantity"] == 4
+
+@pytest.fixture
+def workers(tmp_path):
+    # two stores on one database file, like two wsgi worker processes
+    path = str(tmp_path / "ims.sqlite3")
+    stores = [SQLiteItemStore(path, changes_size=150), SQLiteItemStore(path, changes_size=150)]
+    yield stores
+    for store in stores:
+        store.close()
+
+def test_sqlite_changes_are_shared_between_workers(workers):
+    a, b = workers
+    item = a.create({"product_name": "Beans", "barcode": "CHG-S1", "product_quantity": 1})
+    b.restock(item["id"], 4)
+    a.deduct(item["id"], 2)
+    b.update(item["id"], {"brand": "Acme"})
+    a.delete(item["id"])
+
+    events = b.changes_since(0)
+    assert events == a.changes_since(0)
+    assert [(e["seq"], e["op"], e["id"]) for e in events] == [
+        (1, "create", item["id"]), (2, "restock", item["id"]), (3, "deduct", item["id"]),
+        (4, "update", item["id"]), (5, "delete", item["id"])]
+    assert events[3]["item"] == {**item, "product_quantity": 3, "brand": "Acme"}
+    assert events[4]["item"] is None
+    assert a.latest_change() == b.latest_change() == 5
+    with pytest.raises(ChangesGone):
+        a.changes_since(6)
+
+    # clear is one event
+    a.create({"product_name": "Rice", "barcode": "CHG-S2"})
+    b.clear()
+    assert [e["op"] for e in a.changes_since(5)] == ["create", "clear"]
+
+def test_sqlite_changes_are_pruned(workers):
+    a, _ = workers
+    a.create_many([{"product_name": f"Item {n}", "barcode": f"CHG-P{n}"} for n in range(300)])
+    stats = a.change_stats()
+    assert stats["latest"] == 300 and 150 <= stats["buffered"] < 250
+    with pytest.raises(ChangesGone) as err:
+        a.changes_since(1)
+    assert err.value.oldest == stats["oldest"]
+    assert [e["seq"] for e in a.changes_since(298)] == [299, 300]
+
+def test_sqlite_wait_sees_other_workers_writes(workers):
+    a, b = workers
+    assert a.wait_for_change(0, 0.01) is False
+    timer = threading.Timer(0.05, b.create, [{"product_name": "Late", "barcode": "CHG-SW"}])
+    timer.start()
+    assert a.wait_for_change(0, 5) is True
+    timer.join()
+
+def test_changes_routes_on_sqlite_backend(workers, monkeypatch):
+    a, b = workers
+    monkeypatch.setattr(server, "_STORE", a)
+    monkeypatch.setattr(server, "_CHANGES", a)
+    client = app.test_client()
+    item = client.post("/api/items", json={"product_name": "Beans", "barcode": "CHG-SR"}).get_json()
+    b.restock(item["id"], 3)
+
+    assert client.get("/api/items").headers["X-Change-Seq"] == "2"
+    body = client.get("/api/changes?since=0").get_json()
+    assert [e["op"] for e in body["events"]] == ["create", "restock"] and body["next"] == 2
@@ -0,0 +1,86 @@
+import threading
+
+from ims.compact_store import CompactItemStore
+from ims.persistence import WriteAheadLog
+from ims.store import ItemStore
+
+def test_items_round_trip_exactly():
+    store = CompactItemStore()
+    rows = [
+        {"product_name": "Nutella", "barcode": "3017620422003", "product_quantity": 400,
+         "brand": "Ferrero", "product_quantity_unit": "g"},
+        # None values, int barcodes and unknown fields don't fit a column
+        {"product_name": "Beans", "barcode": 12345, "product_quantity": 2, "brand": None,
+         "product_quantity_unit": None, "reorder_level": 5, "note": {"shelf": 3}},
+        {"product_name": "Bare", "barcode": "B"},
+    ]
+    for row in rows:
+        created = store.create(row)
+        assert created == {"id": created["id"], **row}
+        assert store.get(created["id"]) == created
+    assert store.get_by_barcode(12345)["note"] == {"shelf": 3}
+
+    # brand strings are interned: one copy however many items use it
+    other = store.create({"product_name": "Nutella 2", "barcode": "2", "brand": "".join(["Ferr", "ero"])})
+    assert store.get(other["id"])["brand"] is store.get(1)["brand"]
+
+    assert store.restock(3, 4)["product_quantity"] == 4
+    assert store.update(2, {"brand": "Goya", "reorder_level": None}) == {
+        "id": 2, "product_name": "Beans", "barcode": 12345, "product_quantity": 2, "brand": "Goya",
+        "product_quantity_unit": None, "reorder_level": None, "note": {"shelf": 3},
+    }
+    assert store.delete(1) is True and store.get(1) is None and 1 not in store
+    assert len(store) == 3
+    assert [item["id"] for item in store] == [2, 3, 4]
+
+def test_ints_past_int64_are_kept_exactly():
+    store = CompactItemStore()
+    big = store.create({"product_name": "Rice", "barcode": "R", "product_quantity": 10 ** 20})
+    assert store.get(big["id"])["product_quantity"] == 10 ** 20
+    assert len(store) == 1
+
+    # a restock past 2**63 and a deduct back into range
+    item = store.create({"product_name": "Oats", "barcode": "O", "product_quantity": 2 ** 63 - 10})
+    assert store.restock(item["id"], 20)["product_quantity"] == 2 ** 63 + 10
+    assert store.deduct(item["id"], 2 ** 63)["product_quantity"] == 10
+    assert store.get(item["id"]) == {"id": item["id"], "product_name": "Oats", "barcode": "O", "product_quantity": 10}
+    assert len(store) == 2
+
+def test_wal_replays_into_compact_store(tmp_path):
+    store = ItemStore()
+    wal = WriteAheadLog(str(tmp_path), sync="batch")
+    wal.attach(store)
+    for n in range(50):
+        store.create({"product_name": f"Item {n}", "barcode": f"W-{n}", "product_quantity": n})
+    store.delete(10)
+    store.restock(20, 5)
+    wal.compact()
+    store.deduct(30, 100)
+    wal.close()
+
+    compact = CompactItemStore()
+    WriteAheadLog(str(tmp_path), sync="batch").replay(compact)
+    assert compact.all() == store.all()
+    assert compact.next_id == 51
+
+def test_readers_never_see_half_an_update():
+    store = CompactItemStore()
+    store.create({"product_name": "v0", "barcode": "X", "product_quantity": 0})
+    stop = threading.Event()
+    torn = []
+
+    def writer():
+        n = 0
+        while not stop.is_set():
+            n += 1
+            store.update(1, {"product_name": f"v{n}", "product_quantity": n})
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    for _ in range(20_000):
+        item = store.get(1)
+        if item["product_name"] != f"v{item['product_quantity']}":
+            torn.append(item)
+    stop.set()
+    thread.join()
+    assert torn == []
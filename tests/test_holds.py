@@ -0,0 +1,185 @@
+import threading
+
+import pytest
+
+from ims.compact_store import CompactItemStore
+from ims.holds import InsufficientStockError, Reservations
+from ims.server import app
+from ims.sqlite_store import SQLiteItemStore
+from ims.store import ItemStore
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def _item(store, qty=10, n=1):
+    return store.create({"product_name": f"Item {n}", "barcode": f"HOLD-{n}", "product_quantity": qty})
+
+@pytest.fixture(params=["memory", "compact", "sqlite"])
+def holds(request, tmp_path):
+    # (store, holds, clock) for every backend
+    clock = FakeClock()
+    if request.param != "sqlite":
+        store = ItemStore() if request.param == "memory" else CompactItemStore()
+        yield store, Reservations(clock).attach(store), clock
+    else:
+        store = SQLiteItemStore(str(tmp_path / "ims.sqlite3"), clock=clock)
+        yield store, store, clock
+        store.close()
+
+def test_holds_lifecycle(holds):
+    store, holds, clock = holds
+    item = _item(store, qty=10)
+
+    a = holds.reserve(item["id"], 6, ttl=60)
+    assert a == {"id": a["id"], "item_id": item["id"], "quantity": 6, "expires_at": 1060.0}
+    assert holds.availability(item["id"]) == {"id": item["id"], "product_quantity": 10, "reserved": 6, "available": 4}
+    with pytest.raises(InsufficientStockError) as err:
+        holds.reserve(item["id"], 5, ttl=60)
+    assert err.value.available == 4
+    assert holds.reserve(999, 1, ttl=60) is None
+
+    # commit deducts, release gives the units back
+    b = holds.reserve(item["id"], 4, ttl=60)
+    hold, committed = holds.commit_hold(a["id"])
+    assert hold["id"] == a["id"] and committed["product_quantity"] == 4
+    assert holds.commit_hold(a["id"]) is None
+    assert holds.release_hold(b["id"])["quantity"] == 4
+    assert holds.release_hold(b["id"]) is None
+    assert holds.get_hold(b["id"]) is None
+    assert holds.availability(item["id"])["available"] == 4
+    assert store.get(item["id"])["product_quantity"] == 4
+
+def test_holds_expire(holds):
+    store, holds, clock = holds
+    item = _item(store, qty=5)
+    short = holds.reserve(item["id"], 3, ttl=10)
+    long = holds.reserve(item["id"], 2, ttl=100)
+
+    clock.now += 10
+    assert holds.get_hold(short["id"]) is None
+    assert holds.availability(item["id"])["available"] == 3
+    assert holds.commit_hold(short["id"]) is None
+    assert holds.hold_stats()["active"] == 1
+    assert holds.get_hold(long["id"]) == long
+
+    clock.now += 100
+    holds.expire_holds()
+    assert holds.hold_stats() == {"active": 0, "reserved": 0, "expired": 2}
+    assert store.get(item["id"])["product_quantity"] == 5
+
+def test_refused_hold_counts_expired_holds_once(holds):
+    store, holds, clock = holds
+    item = _item(store, qty=5)
+    holds.reserve(item["id"], 4, ttl=10)
+    clock.now += 10
+
+    # the reserve that reclaims the expired hold is refused and rolled back
+    with pytest.raises(InsufficientStockError):
+        holds.reserve(item["id"], 6, ttl=10)
+    holds.expire_holds()
+    assert holds.hold_stats()["expired"] == 1
+
+def test_holds_go_away_with_the_item(holds):
+    store, holds, clock = holds
+    item = _item(store)
+    hold = holds.reserve(item["id"], 1, ttl=60)
+    store.delete(item["id"])
+    assert holds.get_hold(hold["id"]) is None
+    assert holds.hold_stats()["active"] == 0
+
+def test_expiry_only_pops_due_holds():
+    clock = FakeClock()
+    store = ItemStore()
+    holds = Reservations(clock).attach(store)
+    items = [_item(store, qty=1000, n=n) for n in range(100)]
+    for i in range(10_000):
+        holds.reserve(items[i % 100]["id"], 1, ttl=1 + i % 2)
+
+    clock.now += 1
+    assert holds.expire_holds() == 5000
+    assert holds.availability(items[0]["id"])["reserved"] == 0
+    assert holds.availability(items[1]["id"])["reserved"] == 100
+    clock.now += 1
+    assert holds.expire_holds() == 5000
+    assert len(holds) == 0
+
+def test_concurrent_reserves_never_oversell():
+    store = ItemStore()
+    holds = Reservations().attach(store)
+    item = _item(store, qty=100)
+    granted = []
+
+    def worker():
+        for _ in range(50):
+            try:
+                granted.append(holds.reserve(item["id"], 1, ttl=60))
+            except InsufficientStockError:
+                pass
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(granted) == 100
+    assert holds.availability(item["id"])["available"] == 0
+
+def test_reserve_routes():
+    client = app.test_client()
+    item = client.post("/api/items", json={"product_name": "Beans", "barcode": "HOLD-R", "product_quantity": 5}).get_json()
+
+    resp = client.post(f"/api/items/{item['id']}/reserve", json={"quantity": 3, "ttl": 30})
+    assert resp.status_code == 201
+    body = resp.get_json()
+    assert body["available"] == 2 and body["hold"]["quantity"] == 3
+    hold_id = body["hold"]["id"]
+    assert client.get(f"/api/holds/{hold_id}").get_json()["item_id"] == item["id"]
+
+    resp = client.post(f"/api/items/{item['id']}/reserve", json={"quantity": 3})
+    assert resp.status_code == 409 and resp.get_json()["available"] == 2
+    assert client.post("/api/items/999/reserve", json={"quantity": 1}).status_code == 404
+    assert client.post(f"/api/items/{item['id']}/reserve", json={"quantity": 0}).status_code == 400
+    assert client.post(f"/api/items/{item['id']}/reserve", json={"quantity": 1, "ttl": 0}).status_code == 400
+
+    committed = client.post(f"/api/holds/{hold_id}/commit").get_json()
+    assert committed["item"]["product_quantity"] == 2
+    assert client.post(f"/api/holds/{hold_id}/commit").status_code == 404
+
+    other = client.post(f"/api/items/{item['id']}/reserve", json={"quantity": 2}).get_json()["hold"]["id"]
+    assert client.get(f"/api/items/{item['id']}/availability").get_json()["available"] == 0
+    assert client.post(f"/api/holds/{other}/release").get_json() == {"released": other}
+    assert client.get(f"/api/items/{item['id']}/availability").get_json() == {
+        "id": item["id"], "product_quantity": 2, "reserved": 0, "available": 2}
+    assert client.get(f"/api/holds/{other}").status_code == 404
+    assert "ims_holds_active 0" in client.get("/api/metrics").get_data(as_text=True)
+
+@pytest.mark.parametrize("store_type", [ItemStore, CompactItemStore])
+def test_reserve_racing_deletes_does_not_deadlock(store_type):
+    # delete notifies under the item's stripe lock while reserve reads the
+    # item (the compact store locks the stripe) under the holds lock
+    store = store_type()
+    holds = Reservations().attach(store)
+
+    def churn():
+        for i in range(2000):
+            item = _item(store, qty=5, n=i)
+            store.delete(item["id"])
+
+    def reserve():
+        for i in range(20_000):
+            try:
+                holds.reserve(i % 2000 + 1, 1, ttl=60)
+            except InsufficientStockError:
+                pass
+
+    threads = [threading.Thread(target=churn, daemon=True), threading.Thread(target=reserve, daemon=True)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=60)
+    assert not any(t.is_alive() for t in threads)
+    assert holds.hold_stats()["active"] == 0
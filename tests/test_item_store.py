@@ -0,0 +1,71 @@
+import pytest
+
+from ims.compact_store import CompactItemStore
+from ims.store import ItemStore
+
+# every test runs against both in-memory stores, they share one contract
+@pytest.fixture(params=[ItemStore, CompactItemStore])
+def store_cls(request):
+    return request.param
+
+def _fill(store, n):
+    return [store.create({"product_name": f"Item {i}", "barcode": f"BC-{i}", "product_quantity": i}) for i in range(n)]
+
+def test_store_keeps_insertion_order_after_delete(store_cls):
+    store = store_cls()
+    items = _fill(store, 5)
+
+    # delete from the middle, remaining items keep their order
+    assert store.delete(items[2]["id"]) is True
+    assert [it["id"] for it in store] == [1, 2, 4, 5]
+    assert len(store) == 4
+
+    # deleting twice --> False (route turns this into a 404)
+    assert store.delete(items[2]["id"]) is False
+
+def test_store_ids_are_never_reused(store_cls):
+    store = store_cls()
+    items = _fill(store, 3)
+    store.delete(items[-1]["id"])
+
+    new = store.create({"product_name": "New", "barcode": "BC-NEW", "product_quantity": 0})
+    assert new["id"] == 4
+    assert list(new)[0] == "id"
+
+def test_store_get_update_restock_deduct(store_cls):
+    store = store_cls()
+    item = _fill(store, 1)[0]
+
+    assert store.get(item["id"])["barcode"] == "BC-0"
+    assert store.get(999) is None
+
+    assert store.update(item["id"], {"product_quantity": 10})["product_quantity"] == 10
+    assert store.restock(item["id"], 5)["product_quantity"] == 15
+    # deduct clamps at 0
+    assert store.deduct(item["id"], 100)["product_quantity"] == 0
+
+    # missing ids return None for every mutation
+    assert store.update(999, {"product_quantity": 1}) is None
+    assert store.restock(999, 1) is None
+    assert store.deduct(999, 1) is None
+
+def test_store_cursor_survives_compaction(store_cls):
+    store = store_cls()
+    _fill(store, 3000)
+
+    # start iterating, then delete enough items to trigger an id list rebuild
+    it = store.iter_after(0)
+    assert next(it)["id"] == 1
+    for item_id in range(2, 2500):
+        store.delete(item_id)
+
+    assert [item["id"] for item in it] == list(range(2500, 3001))
+
+    items, next_after = store.page(2990, 5)
+    assert [item["id"] for item in items] == [2991, 2992, 2993, 2994, 2995]
+    assert next_after == 2995
+
+    # last page has no cursor
+    items, next_after = store.page(2998, 5)
+    assert [item["id"] for item in items] == [2999, 3000]
+    assert next_after is None
@@ -0,0 +1,71 @@
+import json
+from ims.server import app
+
+def _post_json(client, url, body):
+    return client.post(url, data=json.dumps(body), content_type="application/json")
+
+def _payload(barcode="BEANS-400G", qty=10, name="Black Beans"):
+    return {"product_name": name, "barcode": barcode, "product_quantity": qty}
+
+def test_lookup_by_barcode():
+    client = app.test_client()
+    created = _post_json(client, "/api/items", _payload()).get_json()
+
+    resp = client.get("/api/items/by_barcode/BEANS-400G")
+    assert resp.status_code == 200
+    assert resp.get_json()["id"] == created["id"]
+
+    # unknown barcode --> 404
+    resp = client.get("/api/items/by_barcode/NOPE")
+    assert resp.status_code == 404
+
+def test_duplicate_barcode_rejected():
+    client = app.test_client()
+    first = _post_json(client, "/api/items", _payload()).get_json()
+
+    resp = _post_json(client, "/api/items", _payload(qty=3))
+    assert resp.status_code == 409
+    assert resp.get_json()["id"] == first["id"]
+
+    # only one item made it into the store
+    assert len(client.get("/api/items").get_json()) == 1
+
+def test_upsert_updates_existing_item():
+    client = app.test_client()
+    first = _post_json(client, "/api/items", _payload()).get_json()
+
+    resp = _post_json(client, "/api/items?upsert=true", _payload(qty=25, name="Black Beans XL"))
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data["id"] == first["id"]
+    assert data["product_quantity"] == 25
+    assert data["product_name"] == "Black Beans XL"
+
+    # no product_quantity sent --> the stock count is left alone
+    resp = _post_json(client, "/api/items?upsert=true", {"product_name": "Black Beans", "barcode": "BEANS-400G"})
+    assert resp.status_code == 200
+    assert resp.get_json()["product_quantity"] == 25
+    assert resp.get_json()["product_name"] == "Black Beans"
+
+    # upsert of a new barcode still creates
+    resp = _post_json(client, "/api/items?upsert=true", _payload(barcode="RICE-1KG"))
+    assert resp.status_code == 201
+
+def test_index_follows_update_and_delete():
+    client = app.test_client()
+    a = _post_json(client, "/api/items", _payload(barcode="A-1")).get_json()
+    b = _post_json(client, "/api/items", _payload(barcode="B-1")).get_json()
+
+    # can't move B onto A's barcode
+    resp = client.patch(f"/api/items/{b['id']}", json={"barcode": "A-1"})
+    assert resp.status_code == 409
+
+    # renaming A frees its old barcode
+    client.patch(f"/api/items/{a['id']}", json={"barcode": "A-2"})
+    assert client.get("/api/items/by_barcode/A-1").status_code == 404
+    assert client.get("/api/items/by_barcode/A-2").get_json()["id"] == a["id"]
+
+    # deleting B frees B-1 for a new item
+    client.delete(f"/api/items/{b['id']}")
+    assert client.get("/api/items/by_barcode/B-1").status_code == 404
+    assert _post_json(client, "/api/items", _payload(barcode="B-1")).status_code == 201
@@ -0,0 +1,56 @@
+from ims.server import app
+from ims.store import ItemStore
+from ims.versions import ItemVersions
+
+def _create(client, n):
+    return client.post("/api/items", json={"product_name": f"Item {n}", "barcode": f"ETAG-{n}"}).get_json()
+
+def test_list_answers_304_until_the_store_changes():
+    client = app.test_client()
+    _create(client, 1)
+
+    first = client.get("/api/items")
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"') and "Last-Modified" in first.headers
+
+    again = client.get("/api/items", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.get_data() == b""
+    assert again.headers["ETag"] == etag
+
+    _create(client, 2)
+    changed = client.get("/api/items", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert len(changed.get_json()) == 2
+    assert changed.headers["ETag"] != etag
+
+def test_item_etag_only_changes_with_that_item():
+    client = app.test_client()
+    a, b = _create(client, 1), _create(client, 2)
+    etag = client.get(f"/api/items/{a['id']}").headers["ETag"]
+
+    # writes to another item don't invalidate this one
+    client.post(f"/api/items/{b['id']}/restock", json={"delta": 1})
+    assert client.get(f"/api/items/{a['id']}", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post(f"/api/items/{a['id']}/restock", json={"delta": 1})
+    resp = client.get(f"/api/items/{a['id']}", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.get_json()["product_quantity"] == 1
+
+    client.delete(f"/api/items/{a['id']}")
+    assert client.get(f"/api/items/{a['id']}", headers={"If-None-Match": etag}).status_code == 404
+
+def test_item_versions_tracker():
+    store = ItemStore()
+    old = store.create({"product_name": "Old", "barcode": "V-0"})
+    versions = ItemVersions(clock=lambda: 1000.0).attach(store)
+
+    # items from before attach() are at version 0
+    assert versions.item_version(old["id"]) == (0, 1000.0)
+    new = store.create({"product_name": "New", "barcode": "V-1"})
+    store.deduct(old["id"], 1)
+    assert versions.version() == (2, 1000.0)
+    assert versions.item_version(new["id"]) == (1, 1000.0)
+    assert versions.item_version(old["id"]) == (2, 1000.0)
+    assert versions.item_version(999) is None
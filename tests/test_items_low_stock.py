@@ -0,0 +1,70 @@
+import random
+
+from ims.lowstock import LowStockIndex
+from ims.server import app
+from ims.store import ItemStore
+
+def _ids(items):
+    return [item["id"] for item in items]
+
+def test_index_follows_quantity_changes():
+    store = ItemStore()
+    a = store.create({"product_name": "A", "barcode": "A", "product_quantity": 3, "reorder_level": 5})
+    index = LowStockIndex().attach(store)
+    b = store.create({"product_name": "B", "barcode": "B", "product_quantity": 10, "reorder_level": 5})
+    # no reorder level --> never low, even at 0
+    store.create({"product_name": "C", "barcode": "C", "product_quantity": 0})
+
+    assert _ids(index.low_stock()) == [a["id"]]
+    store.deduct(b["id"], 9)
+    # b is 4 below its level, a only 2
+    assert _ids(index.low_stock()) == [b["id"], a["id"]]
+    assert _ids(index.low_stock(limit=1)) == [b["id"]]
+
+    # at the level still counts; above it doesn't
+    store.restock(a["id"], 2)
+    store.restock(b["id"], 9)
+    assert _ids(index.low_stock()) == [a["id"]]
+    store.update(a["id"], {"reorder_level": None})
+    assert index.low_stock() == [] and len(index) == 1
+
+    # back to an earlier key: reported once
+    store.deduct(b["id"], 6)
+    store.restock(b["id"], 1)
+    store.deduct(b["id"], 1)
+    assert _ids(index.low_stock()) == [b["id"]]
+    store.delete(b["id"])
+    assert index.low_stock() == []
+
+def test_index_matches_full_scan():
+    rng = random.Random(0)
+    store = ItemStore()
+    index = LowStockIndex().attach(store)
+    for n in range(200):
+        store.create({"product_name": f"I{n}", "barcode": f"I{n}", "product_quantity": rng.randint(0, 20),
+                      "reorder_level": rng.randint(0, 10)})
+    for _ in range(2000):
+        item_id = rng.randint(1, 200)
+        if rng.random() < 0.5:
+            store.restock(item_id, rng.randint(1, 5))
+        else:
+            store.deduct(item_id, rng.randint(1, 5))
+
+    expected = sorted(
+        (i["product_quantity"] - i["reorder_level"], i["id"]) for i in store.all()
+        if i["product_quantity"] <= i["reorder_level"]
+    )
+    assert _ids(index.low_stock(limit=1000)) == [item_id for _, item_id in expected]
+
+def test_low_stock_endpoint():
+    client = app.test_client()
+    client.post("/api/items", json={"product_name": "Milk", "barcode": "1", "product_quantity": 2, "reorder_level": 4})
+    client.post("/api/items", json={"product_name": "Eggs", "barcode": "2", "product_quantity": 12, "reorder_level": 6})
+    assert client.post("/api/items", json={"product_name": "X", "barcode": "3", "reorder_level": -1}).status_code == 400
+
+    assert [i["product_name"] for i in client.get("/api/items/low_stock").get_json()] == ["Milk"]
+    client.post("/api/items/2/deduct", json={"delta": 10})
+    assert [i["product_name"] for i in client.get("/api/items/low_stock?limit=5").get_json()] == ["Eggs", "Milk"]
+    client.patch("/api/items/2", json={"reorder_level": 1})
+    assert [i["product_name"] for i in client.get("/api/items/low_stock").get_json()] == ["Milk"]
+    assert client.patch("/api/items/2", json={"reorder_level": "lots"}).status_code == 400
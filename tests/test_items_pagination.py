@@ -0,0 +1,46 @@
+import json
+from ims.server import app
+
+def _create_items(client, n):
+    ids = []
+    for i in range(n):
+        resp = client.post("/api/items", json={"product_name": f"Item {i}", "barcode": f"PAGE-{i}", "product_quantity": i})
+        ids.append(resp.get_json()["id"])
+    return ids
+
+def test_cursor_pagination_walks_every_item():
+    client = app.test_client()
+    ids = _create_items(client, 7)
+    # delete one in the middle, pages should just skip it
+    client.delete(f"/api/items/{ids[3]}")
+
+    seen = []
+    after = 0
+    while True:
+        resp = client.get(f"/api/items?after={after}&limit=3")
+        assert resp.status_code == 200
+        page = resp.get_json()
+        seen.extend(it["id"] for it in page)
+        if "X-Next-After" not in resp.headers:
+            break
+        after = int(resp.headers["X-Next-After"])
+        assert after == page[-1]["id"]
+
+    assert seen == ids[:3] + ids[4:]
+
+def test_ndjson_stream():
+    client = app.test_client()
+    ids = _create_items(client, 3)
+
+    resp = client.get(f"/api/items?format=ndjson&after={ids[0]}")
+    assert resp.status_code == 200
+    assert resp.mimetype == "application/x-ndjson"
+
+    lines = resp.get_data(as_text=True).splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ids[1:]
+
+def test_pagination_validation():
+    client = app.test_client()
+    assert client.get("/api/items?limit=abc").status_code == 400
+    assert client.get("/api/items?after=xyz").status_code == 400
+    assert client.get("/api/items?format=xml").status_code == 400
@@ -0,0 +1,77 @@
+from ims import server
+from ims.search import SearchIndex
+from ims.server import app
+from ims.store import ItemStore
+
+# mock response object
+class _MockResp:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self._payload = payload
+    def json(self):
+        return self._payload
+
+def _names(items):
+    return [item["product_name"] for item in items]
+
+def test_index_follows_store_changes():
+    store = ItemStore()
+    store.create({"product_name": "Old Oats", "barcode": "1"})
+    # items already in the store are indexed on attach
+    index = SearchIndex().attach(store)
+    nutella = store.create({"product_name": "Nutella Spread", "barcode": "3017620422003", "brand": "Ferrero"})
+    peanut = store.create({"product_name": "Peanut Butter", "barcode": "PB-2"})
+    store.create({"product_name": "Nut Mix", "barcode": "3"})
+
+    assert _names(index.search("oats")) == ["Old Oats"]
+    # exact token ranks above prefix matches, then older first
+    assert _names(index.search("nut")) == ["Nut Mix", "Nutella Spread"]
+    # every word must match
+    assert _names(index.search("nut ferr")) == ["Nutella Spread"]
+    assert index.search("30176") == [nutella]
+    assert index.search("pb-2") == [peanut]
+
+    store.update(peanut["id"], {"product_name": "Almond Butter"})
+    assert index.search("peanut") == []
+    assert _names(index.search("butter")) == ["Almond Butter"]
+    store.delete(peanut["id"])
+    assert index.search("butter") == []
+    assert len(index) == 3
+
+    store.clear()
+    assert index.search("nut") == [] and len(index) == 0
+
+def test_search_items_endpoint():
+    client = app.test_client()
+    for name in ("Choco Spread", "Choco Bar", "Milk"):
+        client.post("/api/items", json={"product_name": name, "barcode": name.upper()})
+
+    resp = client.get("/api/items/search?q=cho&limit=1")
+    assert resp.status_code == 200
+    assert _names(resp.get_json()) == ["Choco Spread"]
+    assert _names(client.get("/api/items/search?q=bar").get_json()) == ["Choco Bar"]
+    assert client.get("/api/items/search").status_code == 400
+
+def test_off_search_merges_local_hits(monkeypatch):
+    calls = []
+
+    def fake_get(url, headers=None, timeout=5):
+        calls.append(url)
+        return _MockResp(200, {"products": [
+            {"code": "111", "product_name": "Choco Spread"},
+            {"code": "222", "product_name": "Choco Bar"},
+        ]})
+
+    monkeypatch.setattr(server._OFF.session, "get", fake_get)
+    client = app.test_client()
+    client.post("/api/items", json={"product_name": "Choco Spread", "barcode": "111"})
+
+    data = client.get("/api/search?name=choco&limit=2&local=true").get_json()
+    # our item first; OFF's copy of the same barcode is dropped
+    assert [(p["barcode"], p["source"]) for p in data] == [("111", "local"), ("222", "openfoodfacts")]
+    assert data[0]["id"] == 1
+
+    # enough local hits --> OpenFoodFacts isn't asked at all
+    calls.clear()
+    data = client.get("/api/search?name=choco&limit=1&local=true").get_json()
+    assert len(data) == 1 and calls == []
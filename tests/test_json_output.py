@@ -0,0 +1,111 @@
+import json
+
+import pytest
+
+from ims import jsonout, server
+from ims.jsonout import ItemJSONCache, JSONProvider
+from ims.server import app
+from ims.store import ItemStore
+
+_ENCODERS = ["stdlib"] + (["orjson"] if jsonout.orjson is not None else [])
+
+@pytest.mark.parametrize("encoder", _ENCODERS)
+def test_provider_writes_compact_sorted_json(encoder):
+    provider = JSONProvider(app, encoder)
+    obj = {"b": 1, "a": ["x", None, 2.5], "c": {"z": True, "y": "Crème"}}
+
+    data = provider.dumps_bytes(obj)
+    assert json.loads(data) == obj
+    assert data.startswith(b'{"a":["x",null,2.5],"b":1')
+    assert json.loads(provider.dumps(obj)) == obj
+
+    with app.test_request_context():
+        resp = provider.response(obj)
+    assert resp.mimetype == "application/json"
+    assert json.loads(resp.get_data()) == obj
+
+def test_provider_falls_back_to_stdlib_for_huge_ints():
+    provider = JSONProvider(app)
+    assert json.loads(provider.dumps_bytes({"n": 2 ** 70})) == {"n": 2 ** 70}
+
+def test_listing_reuses_encoded_items_until_they_change():
+    client = app.test_client()
+    for i in range(3):
+        client.post("/api/items", json={"product_name": f"Item {i}", "barcode": f"JSON-{i}"})
+
+    first = client.get("/api/items").get_json()
+    hits = server._ITEM_JSON.hits
+    assert client.get("/api/items").get_json() == first
+    assert server._ITEM_JSON.hits == hits + 3
+
+    # a write drops the item's bytes, the next listing sees the new values
+    client.post(f"/api/items/{first[1]['id']}/restock", json={"delta": 5})
+    items = client.get("/api/items?format=ndjson").get_data(as_text=True).splitlines()
+    assert json.loads(items[1])["product_quantity"] == 5
+
+def test_cache_does_not_keep_items_read_before_a_write():
+    store = ItemStore()
+    cache = ItemJSONCache(JSONProvider(app).dumps_bytes).attach(store)
+    item = store.create({"product_name": "Old", "barcode": "STALE-1"})
+
+    # a listing reads the item, then a write lands before it is encoded
+    encode = cache.encoder()
+    stale = store.get(item["id"])
+    store.update(item["id"], {"product_name": "New"})
+    assert json.loads(encode(stale))["product_name"] == "Old"
+    assert len(cache) == 0
+
+    # the next listing caches the new version
+    encode = cache.encoder()
+    assert json.loads(encode(store.get(item["id"])))["product_name"] == "New"
+    assert json.loads(encode({"id": item["id"]}))["product_name"] == "New"
+
+def test_cache_drops_everything_when_another_process_wrote():
+    store = ItemStore()
+    version = [1]
+    cache = ItemJSONCache(JSONProvider(app).dumps_bytes, version=lambda: version[0]).attach(store)
+    item = store.create({"product_name": "Old", "barcode": "SHARED-1"})
+    cache.encoder()(item)
+    assert len(cache) == 1
+
+    # same version: reused; version moved without a local write: dropped
+    cache.encoder()
+    assert len(cache) == 1
+    version[0] = 2
+    cache.encoder()
+    assert len(cache) == 0
+
+def test_cache_is_a_bounded_lru():
+    store = ItemStore()
+    cache = ItemJSONCache(JSONProvider(app).dumps_bytes, maxsize=3).attach(store)
+    items = [store.create({"product_name": f"Item {n}", "barcode": f"LRU-{n}"}) for n in range(5)]
+
+    encode = cache.encoder()
+    for item in items[:3]:
+        encode(item)
+    encode(items[0])
+    # new items still get cached, the least recently used one makes room
+    encode(items[3])
+    assert len(cache) == 3 and len(cache._entries) == 3
+    assert items[1]["id"] not in cache._entries and items[0]["id"] in cache._entries
+
+    # writes to ids that were never cached don't pile up either
+    for n in range(100):
+        store.create({"product_name": f"More {n}", "barcode": f"LRU-M{n}"})
+    assert len(cache._entries) == 3
+    store.delete(items[4]["id"])
+    assert items[4]["id"] not in cache._entries
+
+def test_evicted_write_marker_keeps_older_listings_from_filling():
+    store = ItemStore()
+    cache = ItemJSONCache(JSONProvider(app).dumps_bytes, maxsize=2).attach(store)
+    item = store.create({"product_name": "Old", "barcode": "LRU-S"})
+
+    encode = cache.encoder()
+    stale = store.get(item["id"])
+    store.update(item["id"], {"product_name": "New"})
+    # the update's marker is pushed out by writes to other items
+    store.create({"product_name": "A", "barcode": "LRU-A"})
+    store.create({"product_name": "B", "barcode": "LRU-B"})
+    encode(stale)
+    assert len(cache) == 0
@@ -0,0 +1,62 @@
+from ims import server
+from ims.metrics import Registry
+from ims.server import app
+
+class _MockResp:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self._payload = payload
+    def json(self):
+        return self._payload
+
+def _samples(text):
+    # "name{labels}" -> value
+    return {line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1])
+            for line in text.splitlines() if line and not line.startswith("#")}
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    hist = registry.histogram("req_seconds", "Latency", ("route",), buckets=(0.1, 1))
+    counter = registry.counter("writes_total", "Writes", ("op",))
+    registry.gauge_callback("items", "Items", lambda: 3)
+
+    for value in (0.05, 0.5, 5):
+        hist.observe(value, '/a"b')
+    counter.inc("create")
+    counter.inc("create")
+
+    text = registry.render()
+    assert "# TYPE req_seconds histogram" in text
+    samples = _samples(text)
+    # buckets are cumulative, label values escaped
+    assert samples['req_seconds_bucket{route="/a\\"b",le="0.1"}'] == 1
+    assert samples['req_seconds_bucket{route="/a\\"b",le="1"}'] == 2
+    assert samples['req_seconds_bucket{route="/a\\"b",le="+Inf"}'] == 3
+    assert samples['req_seconds_count{route="/a\\"b"}'] == 3
+    assert samples['req_seconds_sum{route="/a\\"b"}'] == 5.55
+    assert samples['writes_total{op="create"}'] == 2
+    assert samples["items"] == 3
+
+def test_metrics_endpoint_covers_routes_store_and_upstream(monkeypatch):
+    monkeypatch.setattr(server._OFF.session, "get", lambda url, timeout=5: _MockResp(
+        200, {"status": 1, "product": {"product_name": "Nutella", "brands": "Ferrero"}}))
+    client = app.test_client()
+    before = server._HTTP_LATENCY.count("GET", "/api/items/<int:item_id>", "200")
+
+    item = client.post("/api/items", json={"product_name": "Beans", "barcode": "METRICS-1"}).get_json()
+    client.get(f"/api/items/{item['id']}")
+    client.post(f"/api/items/{item['id']}/restock", json={"delta": 2})
+    assert client.get("/api/lookup/3017620422003").status_code == 200
+
+    resp = client.get("/api/metrics")
+    assert resp.status_code == 200
+    assert resp.content_type.startswith("text/plain; version=0.0.4")
+    samples = _samples(resp.get_data(as_text=True))
+
+    # one series per url rule, not per item id
+    assert samples['ims_http_request_duration_seconds_count{method="GET",route="/api/items/<int:item_id>",status="200"}'] == before + 1
+    assert samples['ims_http_upstream_wait_seconds_count{route="/api/lookup/<barcode>"}'] >= 1
+    assert samples['ims_upstream_request_duration_seconds_count{status="200"}'] >= 1
+    assert samples['ims_store_mutations_total{op="restock"}'] >= 1
+    assert samples["ims_store_items"] == 1
+    assert samples['ims_cache_misses_total{cache="memory"}'] >= 1
@@ -0,0 +1,35 @@
+from ims.normalize import _parse_quantity, normalize_product, normalize_products
+
+def test_search_products_use_code_field():
+    # /api/v2/search returns the barcode as "code"
+    raw = [
+        {"code": "3017620422003", "product_name": " Nutella ", "brands": "Ferrero, Nutella", "quantity": "400 g"},
+        {"_id": "111", "product_name": "Beans"},
+    ]
+    first, second = normalize_products(raw)
+    assert first == {
+        "barcode": "3017620422003",
+        "product_name": "Nutella",
+        "brand": "Ferrero",
+        "product_quantity": 400,
+        "product_quantity_unit": "g",
+    }
+    assert second["barcode"] == "111"
+    assert (second["brand"], second["product_quantity"], second["product_quantity_unit"]) == (None, 0, None)
+
+def test_quantity_parsing():
+    # numeric product_quantity wins, unit is the first word of the text
+    assert normalize_product({"product_quantity": "6", "quantity": "6 x 33 cl"})["product_quantity_unit"] == "x"
+    # otherwise the leading number + the word right after it
+    item = normalize_product({"product_quantity": "", "quantity": "1.5 L"})
+    assert (item["product_quantity"], item["product_quantity_unit"]) == (1, None)
+    item = normalize_product({"product_quantity": "n/a", "quantity": "330ML"})
+    assert (item["product_quantity"], item["product_quantity_unit"]) == (330, "ml")
+
+def test_lookup_barcode_overrides_and_quantity_memo():
+    _parse_quantity.cache_clear()
+    for _ in range(3):
+        item = normalize_product({"code": "other", "quantity": "400 g"}, "123")
+    assert item["barcode"] == "123"
+    info = _parse_quantity.cache_info()
+    assert (info.hits, info.misses) == (2, 1)
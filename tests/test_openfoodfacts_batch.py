@@ -0,0 +1,87 @@
+import threading
+
+from ims import server
+from ims.server import app
+
+# mock response object
+class _MockResp:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self._payload = payload
+    def json(self):
+        return self._payload
+
+def _fake_upstream(monkeypatch, calls, barrier=None):
+    # 000... barcodes are unknown, 999... make OpenFoodFacts fail, anything else is Nutella
+    def fake_get(url, headers=None, timeout=5):
+        calls.append(url)
+        if barrier is not None:
+            barrier.wait(timeout=5)
+        if "/000" in url:
+            return _MockResp(404, {"status": 0})
+        if "/999" in url:
+            return _MockResp(500, {})
+        return _MockResp(200, {"status": 1, "product": {"product_name": "Nutella", "brands": "Ferrero", "quantity": "400 g"}})
+    monkeypatch.setattr(server._OFF.session, "get", fake_get)
+
+def test_batch_lookup_results_in_order(monkeypatch):
+    calls = []
+    _fake_upstream(monkeypatch, calls)
+    client = app.test_client()
+
+    resp = client.post("/api/lookup/batch", json={"barcodes": ["111", "000", "abc", "999", "111", 222]})
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert (body["found"], body["not_found"], body["failed"]) == (2, 1, 2)
+    # duplicates dropped, ints accepted, invalid barcodes never sent upstream
+    assert [(r["barcode"], r["status"]) for r in body["results"]] == [
+        ("111", 200), ("000", 404), ("abc", 400), ("999", 502), ("222", 200),
+    ]
+    assert body["results"][0]["product"]["product_name"] == "Nutella"
+    assert len(calls) == 4
+
+def test_batch_lookup_uses_cache_and_fetches_misses_concurrently(monkeypatch):
+    calls = []
+    # both misses have to be in flight at the same time to get past the barrier
+    _fake_upstream(monkeypatch, calls, barrier=threading.Barrier(2))
+    client = app.test_client()
+    server._OFF_CACHE.set("333", {"barcode": "333", "product_name": "Cached"})
+
+    resp = client.post("/api/lookup/batch", json=["111", "222", "333"])
+    results = resp.get_json()["results"]
+    assert [r["status"] for r in results] == [200, 200, 200]
+    assert results[2]["product"]["product_name"] == "Cached"
+    assert len(calls) == 2
+
+def test_batch_larger_than_max_pending_waits_for_slots(monkeypatch):
+    calls = []
+    _fake_upstream(monkeypatch, calls)
+    monkeypatch.setattr(server._OFF_FLIGHTS, "max_pending", 4)
+    barcodes = [str(1000 + n) for n in range(server._OFF_BATCH_MAX)]
+
+    body = app.test_client().post("/api/lookup/batch", json=barcodes).get_json()
+    assert (body["found"], body["failed"]) == (server._OFF_BATCH_MAX, 0)
+    assert len(calls) == server._OFF_BATCH_MAX
+
+def test_batch_lookup_bad_payload():
+    client = app.test_client()
+    assert client.post("/api/lookup/batch", json={"barcode": "111"}).status_code == 400
+    too_many = [str(n) for n in range(server._OFF_BATCH_MAX + 1)]
+    assert client.post("/api/lookup/batch", json=too_many).status_code == 400
+
+def test_create_items_from_lookup_batch(monkeypatch):
+    _fake_upstream(monkeypatch, [])
+    client = app.test_client()
+    client.post("/api/items", json={"product_name": "Mine", "barcode": "222", "product_quantity": 7})
+
+    resp = client.post("/api/items/from_lookup/batch", json=["111", "222", "000"])
+    body = resp.get_json()
+    assert (body["created"], body["updated"], body["failed"]) == (1, 0, 2)
+    assert [r["status"] for r in body["results"]] == [201, 409, 404]
+    assert body["results"][0]["item"]["id"] == 2
+
+    resp = client.post("/api/items/from_lookup/batch?upsert=true", json=["111", "222"])
+    body = resp.get_json()
+    assert (body["created"], body["updated"]) == (0, 2)
+    assert server._STORE.get_by_barcode("222")["product_name"] == "Nutella"
+    assert server._STORE.get_by_barcode("222")["product_quantity"] == 7
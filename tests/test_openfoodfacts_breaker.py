@@ -0,0 +1,95 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ims import server
+from ims.breaker import CircuitBreaker
+from ims.server import app
+from ims.upstream import UpstreamClient
+
+_PRODUCT = {"status": 1, "product": {"product_name": "Nutella", "brands": "Ferrero", "quantity": "400 g"}}
+
+@pytest.fixture
+def upstream(monkeypatch):
+    # local fake OpenFoodFacts; set .status / .delay on the returned handler
+    # class to inject errors and latency
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        status = 200
+        delay = 0.0
+        calls = 0
+
+        def do_GET(self):
+            Handler.calls += 1
+            time.sleep(Handler.delay)
+            body = json.dumps(_PRODUCT if Handler.status == 200 else {}).encode()
+            self.send_response(Handler.status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    breaker = CircuitBreaker(failure_rate=0.5, min_calls=2, window=4, slow_call=0.2, open_for=0.3)
+    client = UpstreamClient(f"http://127.0.0.1:{httpd.server_address[1]}", retries=0, breaker=breaker)
+    monkeypatch.setattr(server, "_OFF_BREAKER", breaker)
+    monkeypatch.setattr(server, "_OFF", client)
+    yield Handler
+    client.close()
+    httpd.shutdown()
+    httpd.server_close()
+
+def _state(client):
+    return client.get("/api/upstream/status").get_json()["breaker"]["state"]
+
+def test_errors_open_the_circuit_then_probe_recovers(upstream):
+    client = app.test_client()
+    upstream.status = 500
+    assert client.get("/api/lookup/111").status_code == 502
+    assert client.get("/api/lookup/222").status_code == 502
+    assert _state(client) == "open"
+
+    # fails fast without calling upstream
+    resp = client.get("/api/lookup/333")
+    assert resp.status_code == 503
+    assert int(resp.headers["Retry-After"]) >= 1
+    assert upstream.calls == 2
+
+    # after open_for one probe goes through; upstream is back, so it closes
+    upstream.status = 200
+    time.sleep(0.35)
+    assert _state(client) == "half_open"
+    assert client.get("/api/lookup/333").status_code == 200
+    assert _state(client) == "closed"
+
+def test_slow_upstream_opens_the_circuit(upstream):
+    client = app.test_client()
+    upstream.delay = 0.3
+    # answers arrive, but over the latency budget
+    assert client.get("/api/lookup/111").status_code == 200
+    assert client.get("/api/lookup/222").status_code == 200
+    assert _state(client) == "open"
+    upstream.delay = 0
+    assert client.get("/api/lookup/333").status_code == 503
+
+def test_stale_entry_served_while_upstream_down(upstream):
+    client = app.test_client()
+    stale = {"barcode": "111", "product_name": "Old Nutella"}
+    server._OFF_CACHE.set("111", stale, ttl=0.01)
+    time.sleep(0.02)
+
+    upstream.status = 503
+    resp = client.get("/api/lookup/111")
+    assert resp.status_code == 200
+    assert resp.get_json()["product_name"] == "Old Nutella"
+    # no stale copy for this one
+    assert client.get("/api/lookup/222").status_code == 502
+    assert server._OFF_CACHE.stats()["stale_hits"] == 1
@@ -0,0 +1,166 @@
+from ims import server
+from ims.cache import MISS, TTLCache
+from ims.server import app
+
+# mock response object
+class _MockResp:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self._payload = payload
+    def json(self):
+        return self._payload
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+def test_ttl_and_negative_ttl():
+    clock = _FakeClock()
+    cache = TTLCache(maxsize=10, ttl=60, negative_ttl=5, clock=clock)
+    cache.set("a", {"name": "A"})
+    cache.set("missing", None)
+
+    assert cache.get("a") == {"name": "A"}
+    # None is a real cached value ("not found"), unlike MISS
+    assert cache.get("missing") is None
+    assert cache.get("nope") is MISS
+
+    clock.now += 10
+    assert cache.get("missing") is MISS
+    assert cache.get("a") == {"name": "A"}
+
+    clock.now += 60
+    assert cache.get("a") is MISS
+    assert cache.stats()["expirations"] == 2
+
+def test_lru_eviction():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")          # a is now the most recently used
+    cache.set("c", 3)       # evicts b
+
+    assert cache.get("b") is MISS
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert (stats["hits"], stats["misses"]) == (3, 1)
+
+def test_lookup_served_from_cache(monkeypatch):
+    calls = []
+
+    def fake_get(url, headers=None, timeout=5):
+        calls.append(url)
+        if "000" in url:
+            return _MockResp(404, {"status": 0})
+        return _MockResp(200, {"status": 1, "product": {"product_name": "Nutella", "brands": "Ferrero", "quantity": "400 g"}})
+
+    # patch the pooled session used by the server for OpenFoodFacts calls
+    monkeypatch.setattr(server._OFF.session, "get", fake_get)
+    client = app.test_client()
+
+    first = client.get("/api/lookup/3017620422003")
+    second = client.get("/api/lookup/3017620422003")
+    assert first.status_code == second.status_code == 200
+    assert first.get_json() == second.get_json()
+
+    # from_lookup shares the same cache
+    assert client.post("/api/items/from_lookup?barcode=3017620422003").status_code == 201
+
+    # 404s are cached too (negative caching)
+    assert client.get("/api/lookup/000").status_code == 404
+    assert client.get("/api/lookup/000").status_code == 404
+
+    assert len(calls) == 2
+
+    stats = client.get("/api/cache/stats").get_json()["openfoodfacts"]
+    assert (stats["hits"], stats["misses"], stats["size"]) == (3, 2, 2)
+
+def test_upstream_failures_not_cached(monkeypatch):
+    calls = []
+
+    def fake_get(url, headers=None, timeout=5):
+        calls.append(url)
+        return _MockResp(500, {})
+
+    # patch the pooled session used by the server for OpenFoodFacts calls
+    monkeypatch.setattr(server._OFF.session, "get", fake_get)
+    client = app.test_client()
+
+    assert client.get("/api/lookup/123").status_code == 502
+    assert client.get("/api/lookup/123").status_code == 502
+    assert len(calls) == 2
+
+def test_disk_cache_survives_reopen(tmp_path):
+    from ims.cache import DiskCache
+
+    clock = _FakeClock()
+    path = str(tmp_path / "off.sqlite3")
+    cache = DiskCache(path, ttl=60, negative_ttl=5, clock=clock)
+    cache.set("123", {"product_name": "Beans"})
+    cache.set("000", None)
+    cache.close()
+
+    cache = DiskCache(path, ttl=60, negative_ttl=5, clock=clock)
+    assert cache.get("123") == {"product_name": "Beans"}
+    assert cache.get("000") is None
+    clock.now += 1
+    assert cache.get("123", with_ttl=True) == ({"product_name": "Beans"}, 59)
+
+    # compaction drops expired rows
+    clock.now += 10
+    assert cache.get("000") is MISS
+    assert cache.compact() == 1
+    assert len(cache) == 1
+    cache.close()
+
+def test_lookup_falls_back_to_disk_cache(tmp_path, monkeypatch):
+    from ims.cache import DiskCache
+
+    disk = DiskCache(str(tmp_path / "off.sqlite3"))
+    monkeypatch.setattr(server, "_OFF_DISK_CACHE", disk)
+    calls = []
+
+    def fake_get(url, headers=None, timeout=5):
+        calls.append(url)
+        return _MockResp(200, {"status": 1, "product": {"product_name": "Nutella"}})
+
+    # patch the pooled session used by the server for OpenFoodFacts calls
+    monkeypatch.setattr(server._OFF.session, "get", fake_get)
+    client = app.test_client()
+
+    assert client.get("/api/lookup/3017620422003").status_code == 200
+    # a "restart": memory cache is cold, the disk copy answers
+    server._OFF_CACHE.clear()
+    resp = client.get("/api/lookup/3017620422003")
+    assert resp.get_json()["product_name"] == "Nutella"
+    assert len(calls) == 1
+
+    # search results are cached as well
+    client.get("/api/search?name=nutella&limit=2")
+    server._OFF_CACHE.clear()
+    client.get("/api/search?name=Nutella&limit=2")
+    assert len(calls) == 2
+
+    stats = client.get("/api/cache/stats").get_json()
+    assert stats["openfoodfacts_disk"]["size"] == 2
+    disk.close()
+
+def test_disk_hit_keeps_its_expiry_in_memory(tmp_path, monkeypatch):
+    from ims.cache import DiskCache
+
+    clock = _FakeClock()
+    disk = DiskCache(str(tmp_path / "off.sqlite3"), ttl=60, clock=clock)
+    monkeypatch.setattr(server, "_OFF_DISK_CACHE", disk)
+    monkeypatch.setattr(server, "_OFF_CACHE", TTLCache(ttl=3600, clock=clock))
+    disk.set("123", {"product_name": "Beans"})
+
+    # promoted with the 10 seconds the disk row has left, not a fresh hour
+    clock.now += 50
+    assert server._off_cache_get("123") == {"product_name": "Beans"}
+    clock.now += 11
+    assert server._OFF_CACHE.get("123") is MISS
+    assert server._off_cache_get("123") is MISS
+    disk.close()
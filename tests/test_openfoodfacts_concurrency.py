@@ -0,0 +1,100 @@
+import os
+import subprocess
+import sys
+import threading
+
+from ims import server
+from ims.server import app
+
+# mock response object
+class _MockResp:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self._payload = payload
+    def json(self):
+        return self._payload
+
+def _blocking_upstream(monkeypatch, calls, release):
+    # every upstream call waits for `release`, like a slow OpenFoodFacts
+    def fake_get(url, headers=None, timeout=5):
+        calls.append(url)
+        release.wait(timeout=5)
+        return _MockResp(200, {"status": 1, "product": {"product_name": "Nutella", "brands": "Ferrero", "quantity": "400 g"}})
+    monkeypatch.setattr(server._OFF.session, "get", fake_get)
+
+def _in_threads(n, fn):
+    results = [None] * n
+    def run(i):
+        results[i] = fn()
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    return threads, results
+
+def _wait_for(predicate):
+    event = threading.Event()
+    for _ in range(500):
+        if predicate():
+            return
+        event.wait(0.01)
+    raise AssertionError("timed out")
+
+def test_concurrent_lookups_share_one_upstream_call(monkeypatch):
+    calls, release = [], threading.Event()
+    _blocking_upstream(monkeypatch, calls, release)
+
+    def lookup():
+        resp = app.test_client().get("/api/lookup/3017620422003")
+        return resp.status_code, resp.get_json()["product_name"]
+
+    coalesced = server._OFF_FLIGHTS.stats()["coalesced"]
+    threads, results = _in_threads(5, lookup)
+    _wait_for(lambda: server._OFF_FLIGHTS.stats()["coalesced"] - coalesced == 4)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert results == [(200, "Nutella")] * 5
+    assert len(calls) == 1
+
+def test_saturated_upstream_fails_fast(monkeypatch):
+    calls, release = [], threading.Event()
+    _blocking_upstream(monkeypatch, calls, release)
+    monkeypatch.setattr(server._OFF_FLIGHTS, "max_pending", 1)
+    client = app.test_client()
+
+    threads, results = _in_threads(1, lambda: app.test_client().get("/api/lookup/111").status_code)
+    _wait_for(lambda: calls)
+
+    # another barcode can't queue behind the slow one: 503 right away
+    resp = client.get("/api/lookup/222")
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "1"
+    # the rest of the API is unaffected
+    assert client.get("/api/health").status_code == 200
+
+    release.set()
+    threads[0].join()
+    assert results == [200]
+
+def test_slow_upstream_times_out_and_still_fills_cache(monkeypatch):
+    calls, release = [], threading.Event()
+    _blocking_upstream(monkeypatch, calls, release)
+    monkeypatch.setattr(server, "_OFF_WAIT", 0.05)
+    client = app.test_client()
+
+    assert client.get("/api/lookup/111").status_code == 504
+    release.set()
+    _wait_for(lambda: server._OFF_FLIGHTS.stats()["in_flight"] == 0)
+    assert client.get("/api/lookup/111").status_code == 200
+    assert len(calls) == 1
+
+def test_off_wait_is_capped_at_the_slowest_upstream_call():
+    # 3 attempts of 1s, plus 0.1 + 0.2 of backoff between them
+    env = {**os.environ, "IMS_OFF_TIMEOUT": "1", "IMS_OFF_RETRIES": "2", "IMS_OFF_BACKOFF": "0.1"}
+    wait = lambda value: float(subprocess.run(
+        [sys.executable, "-c", "from ims import server; print(server._OFF_WAIT)"],
+        env={**env, "IMS_OFF_WAIT": value}, capture_output=True, text=True, check=True,
+    ).stdout)
+    assert round(wait("600"), 6) == 3.3
+    assert wait("2") == 2
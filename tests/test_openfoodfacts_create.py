@@ -1,3 +1,4 @@
+from ims import server
 from ims.server import app
 
 # mocked response data
@@ -20,8 +21,8 @@ def test_create_from_lookup(monkeypatch):
             }
         })
 
-    import requests
-    monkeypatch.setattr(requests, "get", fake_get)
+    # patch the pooled session used by the server for OpenFoodFacts calls
+    monkeypatch.setattr(server._OFF.session, "get", fake_get)
 
     client = app.test_client()
     resp = client.post("/api/items/from_lookup?barcode=12345")
@@ -33,4 +34,35 @@ def test_create_from_lookup(monkeypatch):
 
     assert data["barcode"] == "12345"
     assert data["product_name"] == "Mock Item"
-    assert data["brand"] == "BrandX"
\ No newline at end of file
+    assert data["brand"] == "BrandX"
+
+def test_create_from_lookup_duplicate_barcode(monkeypatch):
+    def fake_get(url, headers=None, timeout=5):
+        return _MockResp(200, {"product": {"product_name": "Mock Item", "brands": "BrandX", "quantity": "10 g"}})
+
+    # patch the pooled session used by the server for OpenFoodFacts calls
+    monkeypatch.setattr(server._OFF.session, "get", fake_get)
+
+    client = app.test_client()
+    created = client.post("/api/items/from_lookup?barcode=12345").get_json()
+    client.patch(f"/api/items/{created['id']}", json={"product_quantity": 3})
+
+    # second scan of the same barcode --> 409, or 200 with ?upsert=true
+    assert client.post("/api/items/from_lookup?barcode=12345").status_code == 409
+    resp = client.post("/api/items/from_lookup?barcode=12345&upsert=true")
+    assert resp.status_code == 200
+    # the product's package size never replaces the item's stock
+    assert resp.get_json()["product_quantity"] == 3
+    assert len(client.get("/api/items").get_json()) == 1
+
+def test_create_from_lookup_rejects_non_digit_barcode(monkeypatch):
+    calls = []
+    monkeypatch.setattr(server._OFF.session, "get", lambda *a, **kw: calls.append(a))
+    # a cached search list lives under a key like this one
+    server._OFF_CACHE.set("search:nutella:5", [{"product_name": "Nutella"}])
+
+    client = app.test_client()
+    for barcode in ("search:nutella:5", "abc"):
+        resp = client.post(f"/api/items/from_lookup?barcode={barcode}")
+        assert resp.status_code == 400
+    assert calls == [] and client.get("/api/items").get_json() == []
@@ -1,4 +1,5 @@
 import json
+from ims import server
 from ims.server import app
 
 def _get(client, url):
@@ -30,9 +31,8 @@ def test_expected_lookup_path(monkeypatch):
             }
         })
 
-    # patch requests.get used by server
-    import requests
-    monkeypatch.setattr(requests, "get", fake_get)
+    # patch the pooled session used by server
+    monkeypatch.setattr(server._OFF.session, "get", fake_get)
 
     client = app.test_client()
     resp = _get(client, "/api/lookup/3017620422003")
@@ -53,8 +53,8 @@ def test_lookup_not_found(monkeypatch):
     # if OpenFoodFacts returns status=0 (not found), the API should return 404
     def fake_get(url, headers=None, timeout=5):
         return _MockResp(200, {"status": 0, "status_verbose": "product not found", "code": "000"})
-    import requests
-    monkeypatch.setattr(requests, "get", fake_get)
+    # patch the pooled session used by the server for OpenFoodFacts calls
+    monkeypatch.setattr(server._OFF.session, "get", fake_get)
 
     client = app.test_client()
     resp = client.get("/api/lookup/000")
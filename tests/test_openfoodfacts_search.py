@@ -1,4 +1,5 @@
 import json
+from ims import server
 from ims.server import app
 
 def _get(client, url):
@@ -37,8 +38,8 @@ def test_search_expected_path(monkeypatch):
             ],
         })
 
-    import requests
-    monkeypatch.setattr(requests, "get", fake_get)
+    # patch the pooled session used by the server for OpenFoodFacts calls
+    monkeypatch.setattr(server._OFF.session, "get", fake_get)
 
     client = app.test_client()
     resp = _get(client, "/api/search?name=choco&limit=2")
@@ -71,8 +72,8 @@ def test_search_limit_validation(monkeypatch):
     def fake_get(url, headers=None, timeout=5):
         return _MockResp(200, {"count": 0, "products": []})
 
-    import requests
-    monkeypatch.setattr(requests, "get", fake_get)
+    # patch the pooled session used by the server for OpenFoodFacts calls
+    monkeypatch.setattr(server._OFF.session, "get", fake_get)
 
     client = app.test_client()
     resp = client.get("/api/search?name=beans&limit=abc")
@@ -0,0 +1,108 @@
+import os
+import threading
+
+from ims.persistence import WriteAheadLog
+from ims.store import ItemStore
+
+def _open(path, **kwargs):
+    # fresh store with persisted state replayed into it
+    store = ItemStore()
+    wal = WriteAheadLog(str(path), **kwargs)
+    wal.attach(store)
+    return store, wal
+
+def _item(n, qty=10):
+    return {"product_name": f"Item {n}", "barcode": f"WAL-{n}", "product_quantity": qty}
+
+def test_replay_after_restart(tmp_path):
+    store, wal = _open(tmp_path)
+    a = store.create(_item(1))
+    b = store.create(_item(2))
+    c = store.create(_item(3))
+    store.restock(a["id"], 5)
+    store.deduct(b["id"], 3)
+    store.update(c["id"], {"product_name": "Renamed"})
+    store.delete(b["id"])
+    wal.close()
+
+    store, wal = _open(tmp_path)
+    assert [it["id"] for it in store] == [a["id"], c["id"]]
+    assert store.get(a["id"])["product_quantity"] == 15
+    assert store.get(c["id"])["product_name"] == "Renamed"
+    assert store.get_by_barcode("WAL-3")["id"] == c["id"]
+
+    # deleted ids are not handed out again
+    assert store.create(_item(4))["id"] == 4
+    wal.close()
+
+def test_snapshot_compacts_log(tmp_path):
+    store, wal = _open(tmp_path, sync="batch", snapshot_every=10**9)
+    for n in range(50):
+        store.create(_item(n, qty=n))
+    wal.compact()
+
+    # everything before the compaction lives in the snapshot only
+    names = sorted(os.listdir(tmp_path))
+    assert [n for n in names if n.startswith("snapshot-")] == ["snapshot-00000001.jsonl"]
+    assert [n for n in names if n.startswith("wal-")] == ["wal-00000002.log"]
+
+    # later changes go to the new segment and replay on top of the snapshot
+    store.restock(1, 100)
+    store.delete(2)
+    wal.close()
+
+    store, wal = _open(tmp_path)
+    assert len(store) == 49
+    assert store.get(1)["product_quantity"] == 100
+    assert store.get(2) is None
+    assert store.next_id == 51
+    wal.close()
+
+def test_torn_last_record_is_ignored(tmp_path):
+    store, wal = _open(tmp_path)
+    store.create(_item(1))
+    wal.close()
+
+    # simulate a crash halfway through writing the next record
+    segment = next(n for n in os.listdir(tmp_path) if n.startswith("wal-"))
+    with open(tmp_path / segment, "ab") as f:
+        f.write(b'{"op":"create","id":2,"item":{"id":2')
+
+    store, wal = _open(tmp_path)
+    assert [it["id"] for it in store] == [1]
+    wal.close()
+
+def test_periodic_snapshots_keep_state(tmp_path):
+    # tiny snapshot interval so several compactions happen while writing
+    store, wal = _open(tmp_path, snapshot_every=10)
+    for n in range(40):
+        item = store.create(_item(n))
+        store.restock(item["id"], n)
+    wal.close()
+
+    store, wal = _open(tmp_path)
+    assert len(store) == 40
+    assert all(it["product_quantity"] == 10 + it["id"] - 1 for it in store)
+    wal.close()
+
+def test_failed_rotation_fails_writers_instead_of_hanging(tmp_path, monkeypatch):
+    store, wal = _open(tmp_path, snapshot_every=5)
+
+    def disk_full(n):
+        raise OSError(28, "No space left on device")
+    monkeypatch.setattr(wal, "_open_segment", disk_full)
+
+    errors = []
+    def writer():
+        try:
+            for n in range(20):
+                store.create(_item(n))
+        except OSError as err:
+            errors.append(err)
+
+    thread = threading.Thread(target=writer, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    assert errors and errors[0].errno == 28
+    wal.close()
@@ -0,0 +1,199 @@
+import os
+import sqlite3
+import threading
+
+import pytest
+
+from ims import server
+from ims.sqlite_store import SQLiteItemStore
+from ims.store import DuplicateBarcodeError, ItemNotFoundError
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteItemStore(str(tmp_path / "ims.sqlite3"))
+    yield store
+    store.close()
+
+def _item(n, qty=10, **extra):
+    return {"product_name": f"Item {n}", "barcode": f"SQL-{n}", "product_quantity": qty, **extra}
+
+def test_crud_matches_memory_store(store):
+    a = store.create(_item(1))
+    b = store.create(_item(2, brand="BrandX", product_quantity_unit=None))
+
+    assert a == {"id": 1, "product_name": "Item 1", "barcode": "SQL-1", "product_quantity": 10}
+    # non-column fields round trip as-is, including None
+    assert store.get(b["id"])["brand"] == "BrandX"
+    assert "product_quantity_unit" in store.get(b["id"])
+
+    assert store.update(a["id"], {"product_name": "Renamed"})["product_name"] == "Renamed"
+    assert store.restock(a["id"], 5)["product_quantity"] == 15
+    # deduct clamps at 0
+    assert store.deduct(a["id"], 100)["product_quantity"] == 0
+    assert store.get_by_barcode("SQL-2")["id"] == b["id"]
+
+    assert store.delete(a["id"]) is True
+    assert store.delete(a["id"]) is False
+    assert store.get(a["id"]) is None
+    assert store.restock(a["id"], 1) is None
+    assert len(store) == 1
+
+    # AUTOINCREMENT: ids are never reused
+    assert store.create(_item(3))["id"] == 3
+
+def test_duplicate_barcode_and_upsert(store):
+    a = store.create(_item(1))
+    with pytest.raises(DuplicateBarcodeError) as exc:
+        store.create(_item(1, qty=3))
+    assert exc.value.item_id == a["id"]
+
+    b = store.create(_item(2))
+    with pytest.raises(DuplicateBarcodeError):
+        store.update(b["id"], {"barcode": "SQL-1"})
+
+    item, created = store.upsert(_item(1, qty=42))
+    assert created is False
+    assert item["id"] == a["id"] and item["product_quantity"] == 42
+    item, _ = store.upsert(_item(1, qty=7), keep=("product_quantity",))
+    assert item["product_quantity"] == 42
+
+def test_pagination(store):
+    for n in range(7):
+        store.create(_item(n))
+    store.delete(4)
+
+    items, next_after = store.page(0, 3)
+    assert [it["id"] for it in items] == [1, 2, 3] and next_after == 3
+    items, next_after = store.page(3, 3)
+    assert [it["id"] for it in items] == [5, 6, 7] and next_after is None
+    assert [it["id"] for it in store.iter_after(5)] == [6, 7]
+
+def test_concurrent_restock_and_deduct_are_atomic(store):
+    item = store.create(_item(1, qty=1000))
+
+    def worker():
+        for _ in range(50):
+            store.restock(item["id"], 2)
+            store.deduct(item["id"], 1)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert store.get(item["id"])["product_quantity"] == 1000 + 8 * 50
+
+def test_routes_on_sqlite_backend(store, monkeypatch):
+    monkeypatch.setattr(server, "_STORE", store)
+    client = server.app.test_client()
+
+    created = client.post("/api/items", json={"product_name": "Beans", "barcode": "B-1", "product_quantity": 3}).get_json()
+    assert client.post("/api/items", json={"product_name": "Beans", "barcode": "B-1"}).status_code == 409
+    assert client.post(f"/api/items/{created['id']}/restock", json={"delta": 4}).get_json()["product_quantity"] == 7
+    assert client.get("/api/items/by_barcode/B-1").get_json()["id"] == created["id"]
+    assert client.get("/api/items").get_json() == [store.get(created["id"])]
+    assert client.delete(f"/api/items/{created['id']}").status_code == 200
+
+def test_apply_movements(store):
+    a = store.create(_item(1, qty=10))
+    items = store.apply_movements([("restock", a["id"], 5), ("deduct", a["id"], 20), ("restock", 999, 1)])
+    assert [it and it["product_quantity"] for it in items] == [15, 0, None]
+
+    # atomic batch with a missing id rolls back
+    with pytest.raises(ItemNotFoundError):
+        store.apply_movements([("restock", a["id"], 5), ("restock", 999, 1)], atomic=True)
+    assert store.get(a["id"])["product_quantity"] == 0
+
+def test_create_many(store):
+    store.create(_item(1, qty=1))
+    results = store.create_many([_item(1, qty=5), _item(2)])
+    assert isinstance(results[0], DuplicateBarcodeError)
+    assert results[1][1] is True
+
+    results = store.create_many([_item(1, qty=5)], upsert=True)
+    assert results[0][0]["product_quantity"] == 5 and results[0][1] is False
+    results = store.create_many([_item(1, qty=8), _item(4, qty=8)], upsert=True,
+                                keep=[("product_quantity",)] * 2)
+    assert [r[0]["product_quantity"] for r in results] == [5, 8]
+
+def test_search_uses_fts_index(store, tmp_path):
+    store.create({"product_name": "Nutella Spread", "barcode": "3017620422003", "brand": "Ferrero"})
+    b = store.create({"product_name": "Peanut Butter", "barcode": "111"})
+    store.create({"product_name": "Nut Mix", "barcode": "222"})
+
+    assert [i["product_name"] for i in store.search("nut")] == ["Nut Mix", "Nutella Spread"]
+    assert [i["id"] for i in store.search("nut fer")] == [1]
+    assert [i["id"] for i in store.search("30176")] == [1]
+    # the index follows updates and deletes, but not quantity changes
+    store.update(b["id"], {"product_name": "Almond Butter"})
+    store.restock(b["id"], 5)
+    assert [i["id"] for i in store.search("butter")] == [b["id"]]
+    assert store.search("peanut") == []
+    store.delete(b["id"])
+    assert store.search("butter") == []
+
+    # a database created before the index existed gets backfilled on open
+    old = str(tmp_path / "old.sqlite3")
+    SQLiteItemStore(old).close()
+    conn = sqlite3.connect(old)
+    conn.executescript("DROP TABLE items_fts; DROP TRIGGER items_fts_insert;"
+                       " DROP TRIGGER items_fts_delete; DROP TRIGGER items_fts_update;"
+                       " INSERT INTO items (product_name, barcode) VALUES ('Old Oats', '9');")
+    conn.close()
+    reopened = SQLiteItemStore(old)
+    assert [i["product_name"] for i in reopened.search("oat")] == ["Old Oats"]
+    reopened.close()
+
+def test_low_stock(store):
+    a = store.create(_item(1, qty=3, reorder_level=5))
+    b = store.create(_item(2, qty=10, reorder_level=5))
+    store.create(_item(3, qty=0))
+    assert [i["id"] for i in store.low_stock()] == [a["id"]]
+    store.deduct(b["id"], 9)
+    assert [i["id"] for i in store.low_stock()] == [b["id"], a["id"]]
+    assert [i["id"] for i in store.low_stock(1)] == [b["id"]]
+
+def test_versions_follow_writes_from_any_connection(store, tmp_path):
+    version, _ = store.version()
+    a = store.create(_item(1))
+    assert store.version()[0] == version + 1
+    assert store.item_version(a["id"])[0] == version + 1
+
+    # a second store on the same file (another worker) sees and bumps the same counters
+    other = SQLiteItemStore(str(tmp_path / "ims.sqlite3"))
+    assert other.epoch == store.epoch
+    other.restock(a["id"], 1)
+    assert store.item_version(a["id"])[0] == version + 2
+    other.close()
+
+    store.delete(a["id"])
+    assert store.item_version(a["id"]) is None
+    assert store.version()[0] == version + 3
+
+def _open_fds():
+    return len(os.listdir("/proc/self/fd"))
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="needs /proc")
+def test_short_lived_threads_dont_leak_connections(store, monkeypatch):
+    # the threaded server runs every client connection on a new thread
+    monkeypatch.setattr(server, "_STORE", store)
+    client = server.app.test_client()
+    item = client.post("/api/items", json={"product_name": "Beans", "barcode": "FD-1"}).get_json()
+
+    def request():
+        assert client.post(f"/api/items/{item['id']}/restock", json={"delta": 1}).status_code == 200
+
+    def burst(n):
+        for _ in range(n):
+            thread = threading.Thread(target=request)
+            thread.start()
+            thread.join()
+
+    burst(20)
+    before = _open_fds()
+    burst(500)
+    assert _open_fds() <= before + 2
+    assert store.get(item["id"])["product_quantity"] == 520
+    # finished threads' connections are reused, not reopened
+    assert len(store._connections) <= store._idle.maxsize + 1
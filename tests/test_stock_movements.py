@@ -0,0 +1,73 @@
+import time
+
+from ims.server import app
+
+def _create_item(client, barcode, qty=10):
+    resp = client.post("/api/items", json={"product_name": "Beans", "barcode": barcode, "product_quantity": qty})
+    return resp.get_json()["id"]
+
+def test_batch_applies_in_order():
+    client = app.test_client()
+    a = _create_item(client, "MOVE-A", qty=10)
+    b = _create_item(client, "MOVE-B", qty=2)
+
+    resp = client.post("/api/items/stock_movements", json=[
+        {"id": a, "op": "restock", "delta": 5},
+        {"id": b, "op": "deduct", "delta": 5},   # clamps at 0
+        {"id": a, "op": "deduct", "delta": "3"},  # same coercion as /deduct
+        {"id": 999, "op": "restock", "delta": 1},
+    ])
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data["applied"] == 3 and data["failed"] == 1
+    assert [r["status"] for r in data["results"]] == [200, 200, 200, 404]
+    assert data["results"][2]["item"]["product_quantity"] == 12
+
+    assert client.get(f"/api/items/{a}").get_json()["product_quantity"] == 12
+    assert client.get(f"/api/items/{b}").get_json()["product_quantity"] == 0
+
+def test_batch_validation_rejects_everything():
+    client = app.test_client()
+    a = _create_item(client, "MOVE-V", qty=10)
+
+    resp = client.post("/api/items/stock_movements", json={"movements": [
+        {"id": a, "op": "restock", "delta": 5},
+        {"id": a, "op": "restock", "delta": -1},
+        {"id": a, "op": "explode", "delta": 1},
+        {"id": a, "op": "deduct"},
+    ]})
+    assert resp.status_code == 400
+    assert [e["index"] for e in resp.get_json()["errors"]] == [1, 2, 3]
+    # the valid first line was not applied either
+    assert client.get(f"/api/items/{a}").get_json()["product_quantity"] == 10
+
+    assert client.post("/api/items/stock_movements", json={"nope": 1}).status_code == 400
+
+def test_atomic_batch_all_or_nothing():
+    client = app.test_client()
+    a = _create_item(client, "MOVE-T", qty=10)
+    body = [{"id": a, "op": "restock", "delta": 5}, {"id": 999, "op": "restock", "delta": 1}]
+
+    resp = client.post("/api/items/stock_movements?atomic=true", json=body)
+    assert resp.status_code == 404
+    assert resp.get_json()["missing"] == [999]
+    assert client.get(f"/api/items/{a}").get_json()["product_quantity"] == 10
+
+    resp = client.post("/api/items/stock_movements", json={"movements": body[:1], "atomic": True})
+    assert resp.status_code == 200
+    assert client.get(f"/api/items/{a}").get_json()["product_quantity"] == 15
+
+def test_ten_thousand_movements_in_one_request():
+    client = app.test_client()
+    ids = [_create_item(client, f"BULK-{n}", qty=0) for n in range(100)]
+    body = [{"id": ids[n % 100], "op": "restock", "delta": 1} for n in range(10_000)]
+
+    start = time.perf_counter()
+    resp = client.post("/api/items/stock_movements", json=body)
+    elapsed = time.perf_counter() - start
+
+    assert resp.status_code == 200
+    assert resp.get_json()["applied"] == 10_000
+    assert client.get(f"/api/items/{ids[0]}").get_json()["product_quantity"] == 100
+    # generous bound so slow CI machines don't flake
+    assert elapsed < 5
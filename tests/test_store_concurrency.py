@@ -0,0 +1,88 @@
+import threading
+
+from ims.server import app
+from ims.store import ItemStore
+
+# threads x iterations per stress test
+_THREADS = 16
+_ROUNDS = 200
+
+def _run(target, n=_THREADS):
+    # start every thread behind a barrier so they really overlap
+    barrier = threading.Barrier(n)
+    errors = []
+
+    def wrapped(i):
+        barrier.wait()
+        try:
+            target(i)
+        except Exception as e:  # surfaced below, threads swallow exceptions
+            errors.append(e)
+
+    threads = [threading.Thread(target=wrapped, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+def test_concurrent_restock_deduct_exact_totals():
+    store = ItemStore()
+    # start high enough that deduct never clamps
+    items = [store.create({"product_name": f"I{n}", "barcode": f"C-{n}", "product_quantity": 100_000}) for n in range(4)]
+
+    def worker(i):
+        for r in range(_ROUNDS):
+            item_id = items[(i + r) % len(items)]["id"]
+            store.restock(item_id, 3)
+            store.deduct(item_id, 1)
+
+    _run(worker)
+
+    # every item got the same number of +3/-1 pairs
+    per_item = _THREADS * _ROUNDS // len(items)
+    for item in items:
+        assert store.get(item["id"])["product_quantity"] == 100_000 + per_item * 2
+
+def test_concurrent_creates_get_unique_ids():
+    store = ItemStore()
+    created = [[] for _ in range(_THREADS)]
+
+    def worker(i):
+        for r in range(_ROUNDS):
+            created[i].append(store.create({"product_name": "x", "barcode": f"T{i}-{r}", "product_quantity": 0})["id"])
+
+    _run(worker)
+
+    ids = [item_id for chunk in created for item_id in chunk]
+    assert len(set(ids)) == len(ids) == _THREADS * _ROUNDS
+    assert [it["id"] for it in store] == sorted(ids)
+
+def test_concurrent_duplicate_barcode_only_one_wins():
+    store = ItemStore()
+    winners = []
+
+    def worker(i):
+        try:
+            winners.append(store.create({"product_name": "x", "barcode": "SAME", "product_quantity": i}))
+        except ValueError:
+            pass
+
+    _run(worker)
+    assert len(winners) == 1
+    assert len(store) == 1
+
+def test_concurrent_routes_exact_quantity():
+    # same hammering through the Flask routes, one test client per thread
+    item_id = app.test_client().post(
+        "/api/items", json={"product_name": "Beans", "barcode": "HAMMER", "product_quantity": 10_000}
+    ).get_json()["id"]
+
+    def worker(i):
+        client = app.test_client()
+        for _ in range(50):
+            assert client.post(f"/api/items/{item_id}/restock", json={"delta": 2}).status_code == 200
+            assert client.post(f"/api/items/{item_id}/deduct", json={"delta": 1}).status_code == 200
+
+    _run(worker, n=8)
+    assert app.test_client().get(f"/api/items/{item_id}").get_json()["product_quantity"] == 10_000 + 8 * 50
@@ -0,0 +1,112 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ims.upstream import SingleFlight, UpstreamBusy, UpstreamClient
+
+
+@pytest.fixture
+def stub():
+    # local keep-alive server: first `fail` requests get a 503, then 200
+    calls = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        fail = 0
+
+        def do_GET(self):
+            calls.append((self.path, self.client_address[1]))
+            status = 503 if len(calls) <= Handler.fail else 200
+            body = b'{"status": 1}'
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", Handler, calls
+    server.shutdown()
+    server.server_close()
+
+
+def test_url_joins_paths():
+    client = UpstreamClient("https://example.org/")
+    assert client.url("/api/v2/x.json") == "https://example.org/api/v2/x.json"
+    assert client.url("api/v2/x.json") == "https://example.org/api/v2/x.json"
+    assert client.url("http://other/x") == "http://other/x"
+
+
+def test_connection_reused(stub):
+    base, _, calls = stub
+    client = UpstreamClient(base)
+    for _ in range(3):
+        assert client.get("/ping").status_code == 200
+    # same client port every time = one kept-alive connection
+    assert len({port for _, port in calls}) == 1
+    client.close()
+
+
+def test_retries_5xx_then_gives_last_response(stub):
+    base, handler, calls = stub
+    handler.fail = 1
+    client = UpstreamClient(base, retries=2, backoff_factor=0)
+    assert client.get("/ping").status_code == 200
+    assert len(calls) == 2
+
+    calls.clear()
+    handler.fail = 10
+    # out of retries: the last 503 is handed back rather than raised
+    assert client.get("/ping").status_code == 503
+    assert len(calls) == 3
+    client.close()
+
+
+def test_single_flight_coalesces_and_rejects():
+    release = threading.Event()
+    runs = []
+
+    def slow(key):
+        runs.append(key)
+        release.wait(timeout=5)
+        return key.upper()
+
+    with ThreadPoolExecutor(4) as pool:
+        flights = SingleFlight(pool, max_pending=2)
+        first = flights.submit("a", slow, "a")
+        # same key while in flight --> same future, no second call
+        assert flights.submit("a", slow, "a") is first
+        second = flights.submit("b", slow, "b")
+        with pytest.raises(UpstreamBusy):
+            flights.submit("c", slow, "c")
+
+        release.set()
+        assert (first.result(timeout=5), second.result(timeout=5)) == ("A", "B")
+        # done calls are forgotten, so the next one runs again
+        assert flights.submit("a", slow, "a").result(timeout=5) == "A"
+
+    assert runs == ["a", "b", "a"]
+    stats = flights.stats()
+    assert (stats["calls"], stats["coalesced"], stats["rejected"], stats["in_flight"]) == (3, 1, 1, 0)
+
+def test_single_flight_waits_for_a_free_slot():
+    release = threading.Event()
+
+    def slow(key):
+        release.wait(timeout=5)
+        return key
+
+    with ThreadPoolExecutor(2) as pool:
+        flights = SingleFlight(pool, max_pending=1)
+        first = flights.submit("a", slow, "a")
+        with pytest.raises(UpstreamBusy):
+            flights.submit("b", slow, "b", timeout=0.05)
+        threading.Timer(0.05, release.set).start()
+        # gets the slot "a" frees up
+        assert flights.submit("b", slow, "b", timeout=5).result(timeout=5) == "b"
+        assert first.result() == "a"
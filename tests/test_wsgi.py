@@ -0,0 +1,103 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+import requests
+
+from ims import server
+from ims.wsgi import create_app
+
+def test_create_app_returns_the_configured_app():
+    assert create_app() is server.app
+    # the app is built once per process, its settings can't change afterwards
+    with pytest.raises(RuntimeError):
+        create_app(store="something-else")
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _launch(tmp_path, workers=2):
+    # start python -m ims.wsgi on a free port; returns (process, api base url)
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}/api"
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "ims.wsgi", "--workers", str(workers), "--port", str(port),
+         "--sqlite-path", str(tmp_path / "ims.sqlite3")],
+        env={**os.environ, "IMS_STORE": "sqlite"}, stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            requests.get(f"{base}/health", timeout=1)
+            return proc, base
+        except requests.ConnectionError:
+            if time.monotonic() > deadline or proc.poll() is not None:
+                proc.kill()
+                raise AssertionError("launcher did not start")
+            time.sleep(0.1)
+
+def _stop(proc):
+    proc.send_signal(signal.SIGTERM)
+    proc.wait(timeout=10)
+
+def test_workers_share_one_sqlite_inventory(tmp_path):
+    proc, base = _launch(tmp_path)
+    try:
+        item = requests.post(f"{base}/items", json={"product_name": "Beans", "barcode": "WSGI-1"}).json()
+        etag = requests.get(f"{base}/items/{item['id']}").headers["ETag"]
+        # whichever worker answers (new connection each time), it sees the same item and version
+        for _ in range(10):
+            resp = requests.get(f"{base}/items/{item['id']}", headers={"Connection": "close"})
+            assert resp.json()["barcode"] == "WSGI-1"
+            assert resp.headers["ETag"] == etag
+    finally:
+        _stop(proc)
+
+def _workers(proc):
+    with open(f"/proc/{proc.pid}/task/{proc.pid}/children") as f:
+        return sorted(int(pid) for pid in f.read().split())
+
+def _open_fds(pid):
+    return len(os.listdir(f"/proc/{pid}/fd"))
+
+@pytest.mark.skipif(not os.path.exists(f"/proc/{os.getpid()}/task/{os.getpid()}/children"), reason="needs /proc")
+def test_workers_survive_sustained_load(tmp_path):
+    # every request on a new connection, so every one is a new server thread
+    proc, base = _launch(tmp_path)
+    try:
+        item = requests.post(f"{base}/items", json={"product_name": "Beans", "barcode": "WSGI-L"}).json()
+        url = f"{base}/items/{item['id']}"
+
+        def hammer(n):
+            for i in range(n):
+                if i % 10:
+                    resp = requests.get(url, headers={"Connection": "close"}, timeout=10)
+                else:
+                    resp = requests.post(f"{url}/restock", json={"delta": 1}, headers={"Connection": "close"},
+                                         timeout=10)
+                assert resp.status_code == 200
+
+        hammer(200)
+        workers = _workers(proc)
+        before = {pid: _open_fds(pid) for pid in workers}
+        hammer(2000)
+
+        # the same workers are still serving (none died and got respawned)
+        assert _workers(proc) == workers
+        for pid in workers:
+            assert _open_fds(pid) <= before[pid] + 10
+        assert requests.get(url).json()["product_quantity"] == 220
+    finally:
+        _stop(proc)
+
+def test_launcher_refuses_memory_store_with_several_workers():
+    result = subprocess.run([sys.executable, "-m", "ims.wsgi", "--workers", "2", "--store", "memory"],
+                            capture_output=True, text=True, timeout=30)
+    assert result.returncode != 0
+    assert "sqlite" in result.stderr